@@ -8,10 +8,14 @@ import json
 import os
 import secrets
 import hashlib
+import tempfile
+import threading
 import time
 import logging
+from collections import OrderedDict
 from typing import Optional, Dict, List
 import folder_paths
+from app.write_behind import WriteBehindQueue, get_write_behind_queue
 
 
 class APIKey:
@@ -59,11 +63,28 @@ class APIKey:
 
 
 class APIKeyManager:
-    """Manages API keys for external API access"""
+    """Manages API keys for external API access
 
-    def __init__(self):
+    Keys are looked up through a hash -> key_id index, and recently validated
+    plaintext keys are remembered so repeated requests skip hashing entirely.
+    ``last_used`` updates only mark the manager dirty; the write-behind queue
+    writes them out within ``flush_interval`` seconds (and at exit), so
+    validation never touches the disk.
+    """
+
+    # Number of recently validated plaintext keys remembered
+    VALIDATION_CACHE_SIZE = 1024
+
+    def __init__(self, flush_interval: float = 30.0,
+                 write_queue: Optional[WriteBehindQueue] = None):
         self.keys_file = os.path.join(folder_paths.get_user_directory(), "api_keys.json")
         self.keys: Dict[str, APIKey] = {}
+        self.flush_interval = flush_interval
+        self._hash_index: Dict[str, str] = {}
+        self._validation_cache: OrderedDict[str, str] = OrderedDict()
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        self._write_queue = write_queue or get_write_behind_queue()
         self.load_keys()
 
     def load_keys(self):
@@ -82,19 +103,49 @@ class APIKeyManager:
                 self.keys = {}
         else:
             self.keys = {}
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Rebuild the hash -> key_id index and drop cached validations"""
+        self._hash_index = {key.key_hash: key_id for key_id, key in self.keys.items()}
+        self._validation_cache.clear()
 
     def save_keys(self):
-        """Save API keys to disk"""
-        try:
-            os.makedirs(os.path.dirname(self.keys_file), exist_ok=True)
-            data = {
-                key_id: key.to_dict(include_hash=True)
-                for key_id, key in self.keys.items()
-            }
-            with open(self.keys_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            logging.error("Failed to save API keys: %s", e)
+        """Save API keys to disk
+
+        The file is written to a temporary file next to it and renamed into
+        place, so a crash mid-write never leaves a truncated keys file.
+        """
+        with self._save_lock:
+            self._dirty = False
+            tmp_path = None
+            try:
+                directory = os.path.dirname(self.keys_file)
+                os.makedirs(directory, exist_ok=True)
+                data = {
+                    key_id: key.to_dict(include_hash=True)
+                    for key_id, key in list(self.keys.items())
+                }
+                fd, tmp_path = tempfile.mkstemp(prefix=".api_keys.", suffix=".tmp", dir=directory)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.keys_file)
+                tmp_path = None
+            except Exception as e:
+                self._dirty = True
+                logging.error("Failed to save API keys: %s", e)
+            finally:
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def flush(self):
+        """Write pending last_used updates to disk, if any"""
+        if self._dirty:
+            self.save_keys()
+
+    def close(self):
+        """Write pending updates now"""
+        self.flush()
 
     def generate_key(self, name: str, rate_limit: int = 100,
                     metadata: Optional[Dict] = None) -> tuple[str, str]:
@@ -125,6 +176,7 @@ class APIKeyManager:
         )
 
         self.keys[key_id] = api_key
+        self._hash_index[key_hash] = key_id
         self.save_keys()
 
         logging.info("Generated new API key: %s (ID: %s)", name, key_id)
@@ -140,16 +192,27 @@ class APIKeyManager:
         Returns:
             APIKey object if valid, None otherwise
         """
-        key_hash = hashlib.sha256(api_key.encode()).hexdigest()
-
-        for key in self.keys.values():
-            if key.key_hash == key_hash and key.is_active:
-                # Update last used timestamp
-                key.last_used = time.time()
-                self.save_keys()
-                return key
-
-        return None
+        key_id = self._validation_cache.get(api_key)
+        if key_id is not None:
+            self._validation_cache.move_to_end(api_key)
+        else:
+            key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+            key_id = self._hash_index.get(key_hash)
+            if key_id is None:
+                return None
+            self._validation_cache[api_key] = key_id
+            if len(self._validation_cache) > self.VALIDATION_CACHE_SIZE:
+                self._validation_cache.popitem(last=False)
+
+        key = self.keys.get(key_id)
+        if key is None or not key.is_active:
+            return None
+
+        # Update last used timestamp; persisted by the background flush
+        key.last_used = time.time()
+        self._dirty = True
+        self._write_queue.submit(("api_keys", self.keys_file), self.flush, delay=self.flush_interval)
+        return key
 
     def get_key(self, key_id: str) -> Optional[APIKey]:
         """Get an API key by ID"""
@@ -162,7 +225,12 @@ class APIKeyManager:
     def delete_key(self, key_id: str) -> bool:
         """Delete an API key"""
         if key_id in self.keys:
-            del self.keys[key_id]
+            key = self.keys.pop(key_id)
+            self._hash_index.pop(key.key_hash, None)
+            self._validation_cache = OrderedDict(
+                (plaintext, cached_id) for plaintext, cached_id in self._validation_cache.items()
+                if cached_id != key_id
+            )
             self.save_keys()
             logging.info("Deleted API key: %s", key_id)
             return True
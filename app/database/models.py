@@ -1,3 +1,4 @@
+from sqlalchemy import Boolean, Column, Float, Index, Integer, JSON, String, Text
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -11,4 +12,66 @@ def to_dict(obj):
         if (val := getattr(obj, field))
     }
 
-# TODO: Define models here
+
+
+class UsageEvent(Base):
+    """A single API request made with an API key. Rows are only ever appended."""
+    __tablename__ = "usage_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key_id = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False)
+    timestamp = Column(Float, nullable=False)
+    duration = Column(Float, nullable=False)
+    success = Column(Boolean, nullable=False)
+    metadata_ = Column("metadata", JSON, nullable=True)
+
+    __table_args__ = (
+        Index("ix_usage_events_key_id_timestamp", "key_id", "timestamp"),
+        Index("ix_usage_events_timestamp", "timestamp"),
+    )
+
+
+class UsageDailyRollup(Base):
+    """Per key, per (local) day request totals, updated together with the events."""
+    __tablename__ = "usage_daily_rollups"
+
+    key_id = Column(String, primary_key=True)
+    day = Column(String, primary_key=True)  # ISO date, e.g. 2025-01-31
+    total_requests = Column(Integer, nullable=False, default=0)
+    successful_requests = Column(Integer, nullable=False, default=0)
+    total_duration = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        Index("ix_usage_daily_rollups_day", "day"),
+    )
+
+
+class QueuedPrompt(Base):
+    """A prompt waiting in (or taken from) the queue, removed once it is in the history."""
+    __tablename__ = "queued_prompts"
+
+    prompt_id = Column(String, primary_key=True)
+    number = Column(Float, nullable=False)
+    running = Column(Boolean, nullable=False, default=False)
+    item = Column(Text, nullable=False)  # JSON queue item, without sensitive data
+
+
+class HistoryEntry(Base):
+    """A completed prompt. Rows are ordered by id, the order they were added in."""
+    __tablename__ = "job_history"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, nullable=False, unique=True)
+    # Job listing columns, NULL when the item can't be listed as a job
+    status = Column(String, nullable=True)
+    create_time = Column(Float, nullable=True)
+    workflow_id = Column(String, nullable=True)
+    item = Column(Text, nullable=False)  # JSON history item
+    job = Column(Text, nullable=True)  # JSON normalized job summary
+
+    __table_args__ = (
+        Index("ix_job_history_create_time", "create_time", "prompt_id"),
+        Index("ix_job_history_status_create_time", "status", "create_time", "prompt_id"),
+        Index("ix_job_history_workflow_id_create_time", "workflow_id", "create_time", "prompt_id"),
+    )
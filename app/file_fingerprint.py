@@ -0,0 +1,129 @@
+"""Content hashes of files, cached by file metadata.
+
+Nodes such as LoadImage hash their input file on every prompt submission to
+find out whether it changed. FileFingerprintCache remembers each hash along
+with the file's size, modification and change times and inode, and only reads
+the file again when one of those changes.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.write_behind import get_write_behind_queue
+
+CHUNK_SIZE = 1024 * 1024
+
+# A file modified this recently may be modified again without its mtime
+# changing on filesystems with coarse timestamps, so its hash isn't cached.
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+def hash_stream(f, algorithm="sha256", chunk_size=CHUNK_SIZE):
+    """Hash a binary file object in chunks and return the hex digest."""
+    h = hashlib.new(algorithm)
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+class FileFingerprintCache:
+    """LRU cache of file content hashes keyed by path and stat metadata.
+
+    Args:
+        max_entries: Number of hashes kept
+        index_path: Optional JSON file the hashes are persisted to so they
+            survive restarts. Writes go through the write-behind queue.
+    """
+
+    def __init__(self, max_entries=4096, index_path=None):
+        self.max_entries = max_entries
+        self.index_path = index_path
+        self.entries = OrderedDict()  # (path, algorithm) -> (size, mtime_ns, ctime_ns, inode, digest)
+        self.lock = threading.Lock()
+        self.loaded = index_path is None
+        self.hits = 0
+        self.misses = 0
+
+    def _load_index(self):
+        self.loaded = True
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable file hash index %s: %s", self.index_path, e)
+            return
+        for path, algorithm, *value in records[-self.max_entries:]:
+            self.entries[(path, algorithm)] = tuple(value)
+
+    def _save_index(self):
+        with self.lock:
+            records = [[path, algorithm, *value] for (path, algorithm), value in self.entries.items()]
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(records, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _schedule_save(self):
+        if self.index_path is None:
+            return
+        get_write_behind_queue().submit(("file_fingerprint", self.index_path), self._save_index, delay=5.0)
+
+    def hash_file(self, path, algorithm="sha256"):
+        """Return the hex digest of the file at path, reading it only if it changed."""
+        path = os.path.abspath(path)
+        key = (path, algorithm)
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino)
+        with self.lock:
+            if not self.loaded:
+                self._load_index()
+            cached = self.entries.get(key)
+            if cached is not None and cached[:-1] == stamp:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return cached[-1]
+            self.misses += 1
+
+        with open(path, "rb") as f:
+            digest = hash_stream(f, algorithm)
+
+        if time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+            return digest
+        with self.lock:
+            self.entries[key] = (*stamp, digest)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._schedule_save()
+        return digest
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_file_fingerprint_cache():
+    """Return the process-wide cache, persisted in the system cache directory."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            import folder_paths
+            index_path = os.path.join(folder_paths.get_system_user_directory("cache"), "file_hashes.json")
+            _default_cache = FileFingerprintCache(index_path=index_path)
+    return _default_cache
+
+
+def hash_file(path, algorithm="sha256"):
+    """Hash a file through the process-wide FileFingerprintCache."""
+    return get_file_fingerprint_cache().hash_file(path, algorithm)
@@ -0,0 +1,308 @@
+"""
+Persistent Job Store
+
+Keeps the prompt queue and history in the ComfyUI database (see app/database)
+so queued work and finished jobs survive a restart.
+
+Writes are buffered and applied in batches through the write-behind queue
+(within ``flush_interval`` seconds, or sooner once ``batch_size`` writes are
+pending), so queueing or finishing a prompt never waits for the disk. Reads
+flush first, so they always see the latest state.
+
+The history is not held in memory: DatabaseHistoryStore answers the same
+queries as comfy_execution.jobs.HistoryStore from indexed columns of the
+``job_history`` table.
+"""
+from __future__ import annotations
+import json
+import logging
+import threading
+from collections.abc import Mapping
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from app.write_behind import WriteBehindQueue, get_write_behind_queue
+from comfy_execution.jobs import JobStatus, job_sort_key, normalize_history_item
+
+
+def _dumps(value) -> str:
+    # Outputs of custom nodes may hold values JSON can't encode, keep their text
+    return json.dumps(value, default=str)
+
+
+class JobStore:
+    """Batched persistence of the prompt queue and history"""
+
+    def __init__(self, session_factory, batch_size: int = 100, flush_interval: float = 1.0,
+                 write_queue: Optional[WriteBehindQueue] = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Callable] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._write_queue = write_queue or get_write_behind_queue()
+
+    def submit(self, write: Callable):
+        """Queue write(session) to run in the next batch"""
+        with self._pending_lock:
+            self._pending.append(write)
+            pending = len(self._pending)
+        self._write_queue.submit(
+            ("jobs", id(self)), self.flush,
+            delay=0 if pending >= self.batch_size else self.flush_interval
+        )
+
+    def flush(self):
+        """Apply all pending writes in one transaction"""
+        with self._flush_lock:
+            with self._pending_lock:
+                writes, self._pending = self._pending, []
+            if not writes:
+                return
+            try:
+                with self.session_factory() as session, session.begin():
+                    for write in writes:
+                        write(session)
+            except Exception as e:
+                logging.error("Failed to save jobs: %s", e)
+
+    def history(self, max_size: Optional[int] = None) -> DatabaseHistoryStore:
+        return DatabaseHistoryStore(self, max_size)
+
+    def queue_put(self, item: tuple):
+        """Persist a queue item. Sensitive data (item[5]) is never written."""
+        from sqlalchemy.dialects.sqlite import insert
+        from app.database.models import QueuedPrompt
+
+        values = {"prompt_id": item[1], "number": item[0], "running": False, "item": _dumps(item[:5])}
+
+        def write(session):
+            stmt = insert(QueuedPrompt).values(**values)
+            session.execute(stmt.on_conflict_do_update(index_elements=["prompt_id"], set_=values))
+        self.submit(write)
+
+    def queue_started(self, prompt_id: str):
+        from sqlalchemy import update
+        from app.database.models import QueuedPrompt
+
+        self.submit(lambda session: session.execute(
+            update(QueuedPrompt).where(QueuedPrompt.prompt_id == prompt_id).values(running=True)
+        ))
+
+    def queue_remove(self, prompt_id: str):
+        from sqlalchemy import delete
+        from app.database.models import QueuedPrompt
+
+        self.submit(lambda session: session.execute(
+            delete(QueuedPrompt).where(QueuedPrompt.prompt_id == prompt_id)
+        ))
+
+    def queue_clear(self):
+        """Remove every queued prompt that hasn't started running"""
+        from sqlalchemy import delete
+        from app.database.models import QueuedPrompt
+
+        self.submit(lambda session: session.execute(
+            delete(QueuedPrompt).where(QueuedPrompt.running.is_(False))
+        ))
+
+    def load_queue(self) -> Tuple[List[tuple], List[tuple]]:
+        """
+        Read back the persisted queue
+
+        Returns:
+            tuple: (queued, interrupted), the queue items that were waiting
+                and those that were running when the process stopped. Items
+                have an empty sensitive data dict.
+        """
+        from sqlalchemy import select
+        from app.database.models import QueuedPrompt
+
+        self.flush()
+        queued, interrupted = [], []
+        with self.session_factory() as session:
+            rows = session.execute(
+                select(QueuedPrompt.item, QueuedPrompt.running).order_by(QueuedPrompt.number)
+            )
+            for item, running in rows:
+                item = tuple(json.loads(item)) + ({},)
+                (interrupted if running else queued).append(item)
+        return queued, interrupted
+
+
+class JobQuery:
+    """SortedKeyIndex over the rows of ``job_history`` matching a filter"""
+
+    def __init__(self, store: DatabaseHistoryStore, statuses: List[str], workflow_id: Optional[str] = None):
+        from app.database.models import HistoryEntry
+
+        statuses = [s for s in (JobStatus.COMPLETED, JobStatus.FAILED) if s in statuses]
+        self.store = store
+        self.empty = not statuses
+        self.conditions = [HistoryEntry.status.in_(statuses)]
+        if workflow_id is not None:
+            self.conditions.append(HistoryEntry.workflow_id == workflow_id)
+
+    def count(self, key: Optional[tuple] = None, inclusive: bool = False) -> int:
+        from sqlalchemy import func, select, tuple_
+        from app.database.models import HistoryEntry
+
+        if self.empty:
+            return 0
+        query = select(func.count()).select_from(HistoryEntry).where(*self.conditions)
+        if key is not None:
+            columns = tuple_(HistoryEntry.create_time, HistoryEntry.prompt_id)
+            query = query.where(columns <= tuple_(*key) if inclusive else columns < tuple_(*key))
+        with self.store.session() as session:
+            return session.execute(query).scalar_one()
+
+    def range(self, start: int, stop: int) -> List[tuple]:
+        from sqlalchemy import select
+        from app.database.models import HistoryEntry
+
+        if self.empty or stop <= start:
+            return []
+        query = (
+            select(HistoryEntry.create_time, HistoryEntry.prompt_id)
+            .where(*self.conditions)
+            .order_by(HistoryEntry.create_time, HistoryEntry.prompt_id)
+            .offset(start).limit(stop - start)
+        )
+        with self.store.session() as session:
+            return [tuple(row) for row in session.execute(query)]
+
+
+class DatabaseHistoryStore(Mapping):
+    """
+    Completed prompts keyed by prompt_id, oldest first, bounded to max_size.
+
+    Drop-in replacement for comfy_execution.jobs.HistoryStore that keeps the
+    items in the ``job_history`` table. Each read returns freshly decoded
+    objects, JSON encoding turns the tuples of an item into lists.
+
+    Reads and writes go through their own database sessions, so the store
+    can be read without holding the prompt queue's mutex.
+    """
+    thread_safe = True
+
+    def __init__(self, job_store: JobStore, max_size: Optional[int] = None):
+        self.job_store = job_store
+        self.max_size = max_size
+
+    def session(self):
+        """Session for a read, after the pending writes have been applied"""
+        self.job_store.flush()
+        return self.job_store.session_factory()
+
+    def __getitem__(self, prompt_id: str) -> dict:
+        from sqlalchemy import select
+        from app.database.models import HistoryEntry
+
+        with self.session() as session:
+            item = session.execute(
+                select(HistoryEntry.item).where(HistoryEntry.prompt_id == prompt_id)
+            ).scalar_one_or_none()
+        if item is None:
+            raise KeyError(prompt_id)
+        return json.loads(item)
+
+    def __contains__(self, prompt_id) -> bool:
+        from sqlalchemy import select
+        from app.database.models import HistoryEntry
+
+        with self.session() as session:
+            return session.execute(
+                select(HistoryEntry.id).where(HistoryEntry.prompt_id == prompt_id)
+            ).first() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.page(0, None))
+
+    def __len__(self) -> int:
+        from sqlalchemy import func, select
+        from app.database.models import HistoryEntry
+
+        with self.session() as session:
+            return session.execute(select(func.count()).select_from(HistoryEntry)).scalar_one()
+
+    def add(self, prompt_id: str, history_item: dict):
+        from sqlalchemy import delete, insert, select
+        from app.database.models import HistoryEntry
+
+        values = {"prompt_id": prompt_id, "item": _dumps(history_item)}
+        try:
+            job = normalize_history_item(prompt_id, history_item)
+        except Exception as e:
+            logging.warning("History item %s can't be listed as a job: %s", prompt_id, e)
+        else:
+            values.update(
+                status=job['status'], create_time=job_sort_key(job)[0],
+                workflow_id=job.get('workflow_id'), job=_dumps(job),
+            )
+        max_size = self.max_size
+
+        def write(session):
+            session.execute(delete(HistoryEntry).where(HistoryEntry.prompt_id == prompt_id))
+            session.execute(insert(HistoryEntry).values(**values))
+            if max_size is not None:
+                # Oldest row to keep; everything before it is dropped
+                first_kept = select(HistoryEntry.id).order_by(HistoryEntry.id.desc()).offset(max_size - 1).limit(1)
+                session.execute(delete(HistoryEntry).where(HistoryEntry.id < first_kept.scalar_subquery()))
+        self.job_store.submit(write)
+
+    def remove(self, prompt_id: str):
+        from sqlalchemy import delete
+        from app.database.models import HistoryEntry
+
+        self.job_store.submit(lambda session: session.execute(
+            delete(HistoryEntry).where(HistoryEntry.prompt_id == prompt_id)
+        ))
+
+    def clear(self):
+        from sqlalchemy import delete
+        from app.database.models import HistoryEntry
+
+        self.job_store.submit(lambda session: session.execute(delete(HistoryEntry)))
+
+    def page(self, offset: int, max_items: Optional[int]) -> List[str]:
+        """Prompt ids in insertion order, starting at offset."""
+        from sqlalchemy import select
+        from app.database.models import HistoryEntry
+
+        query = select(HistoryEntry.prompt_id).order_by(HistoryEntry.id).offset(offset)
+        if max_items is not None:
+            query = query.limit(max_items)
+        with self.session() as session:
+            return list(session.execute(query).scalars())
+
+    def job_index(self, statuses: List[str], workflow_id: Optional[str] = None) -> JobQuery:
+        """Index of the matching jobs in job_sort_key order."""
+        return JobQuery(self, statuses, workflow_id)
+
+    def get_jobs(self, prompt_ids: List[str]) -> dict:
+        """Job summaries of the given prompts, keyed by prompt_id."""
+        from sqlalchemy import select
+        from app.database.models import HistoryEntry
+
+        if not prompt_ids:
+            return {}
+        with self.session() as session:
+            rows = session.execute(
+                select(HistoryEntry.prompt_id, HistoryEntry.job).where(HistoryEntry.prompt_id.in_(prompt_ids))
+            )
+            return {prompt_id: json.loads(job) for prompt_id, job in rows}
+
+    def list_jobs(self, statuses: List[str], workflow_id: Optional[str] = None) -> List[dict]:
+        """Job summaries of all matching jobs in job_sort_key order."""
+        from sqlalchemy import select
+        from app.database.models import HistoryEntry
+
+        index = self.job_index(statuses, workflow_id)
+        if index.empty:
+            return []
+        query = (
+            select(HistoryEntry.job).where(*index.conditions)
+            .order_by(HistoryEntry.create_time, HistoryEntry.prompt_id)
+        )
+        with self.session() as session:
+            return [json.loads(job) for job in session.execute(query).scalars()]
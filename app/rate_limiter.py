@@ -0,0 +1,442 @@
+"""
+Rate Limiting Engine for API Keys
+
+Decides whether a request made with an API key is within its limit. Two
+algorithms are available:
+
+- ``sliding-window``: a log of the request times in the last window; a request
+  is allowed while fewer than ``limit`` requests happened in the window.
+- ``token-bucket``: a bucket of ``limit`` tokens refilled continuously over the
+  window; every request takes one token, so short bursts up to the limit are
+  allowed as long as the average rate stays below it.
+
+Limiter state lives in a backend. The default keeps it in process memory.
+Several ComfyUI processes behind one load balancer can share a SQLite file
+(``sqlite:///path/to/rate_limits.db``) or a Redis-protocol server
+(``redis://[:password@]host[:port][/db]``) so a key gets one limit across
+all of them.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import math
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+SLIDING_WINDOW = "sliding-window"
+TOKEN_BUCKET = "token-bucket"
+ALGORITHMS = (SLIDING_WINDOW, TOKEN_BUCKET)
+
+
+class RateLimitResult:
+    """Outcome of a rate limit check"""
+    def __init__(self, allowed: bool, limit: int, remaining: int,
+                 reset_at: float, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at  # when the key is back to its full limit
+        self.retry_after = retry_after  # seconds until the next request is allowed
+
+    def headers(self) -> Dict[str, str]:
+        """X-RateLimit-* response headers for this result"""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(0, self.remaining)),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_at)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+def _token_bucket(tokens: Optional[float], updated_at: Optional[float], limit: int,
+                  window: float, now: float) -> Tuple[float, RateLimitResult]:
+    """Apply one request to a token bucket, returning its new token count and the result"""
+    rate = limit / window
+    if tokens is None:
+        tokens = float(limit)
+    else:
+        tokens = min(float(limit), tokens + max(0.0, now - updated_at) * rate)
+
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    result = RateLimitResult(
+        allowed=allowed,
+        limit=limit,
+        remaining=int(tokens),
+        reset_at=now + (limit - tokens) / rate,
+        retry_after=0.0 if allowed else (1 - tokens) / rate,
+    )
+    return tokens, result
+
+
+def _sliding_window_result(allowed: bool, count: int, oldest: Optional[float], limit: int,
+                           window: float, now: float) -> RateLimitResult:
+    """Build the result of a sliding window check from the number of requests in the window"""
+    reset_at = oldest + window if oldest is not None else now
+    return RateLimitResult(
+        allowed=allowed,
+        limit=limit,
+        remaining=limit - count,
+        reset_at=reset_at,
+        retry_after=0.0 if allowed else max(0.0, reset_at - now),
+    )
+
+
+class RateLimitBackend:
+    """Interface for rate limiter state storage"""
+
+    shared = False
+
+    def token_bucket(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        raise NotImplementedError
+
+    def sliding_window(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Keeps limiter state in this process
+
+    Both algorithms are O(1) per request: a bucket is two numbers, and each
+    request time enters and leaves a key's log exactly once.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._logs: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def token_bucket(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (None, None))
+            tokens, result = _token_bucket(tokens, updated_at, limit, window, now)
+            self._buckets[key] = (tokens, now)
+        return result
+
+    def sliding_window(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        with self._lock:
+            log = self._logs.get(key)
+            if log is None:
+                log = self._logs[key] = deque()
+            cutoff = now - window
+            while log and log[0] <= cutoff:
+                log.popleft()
+            allowed = len(log) < limit
+            if allowed:
+                log.append(now)
+            return _sliding_window_result(allowed, len(log), log[0] if log else None, limit, window, now)
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """Shares limiter state between processes through a SQLite file
+
+    Each check runs in an immediate transaction, so concurrent processes see
+    each other's requests.
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_hits (key TEXT NOT NULL, ts REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_rate_limit_hits_key_ts ON rate_limit_hits (key, ts)"
+        )
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def token_bucket(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        def check(conn):
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, result = _token_bucket(row[0] if row else None, row[1] if row else None,
+                                           limit, window, now)
+            conn.execute(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now),
+            )
+            return result
+        return self._transaction(check)
+
+    def sliding_window(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        def check(conn):
+            conn.execute("DELETE FROM rate_limit_hits WHERE key = ? AND ts <= ?", (key, now - window))
+            count, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(ts) FROM rate_limit_hits WHERE key = ?", (key,)
+            ).fetchone()
+            allowed = count < limit
+            if allowed:
+                conn.execute("INSERT INTO rate_limit_hits (key, ts) VALUES (?, ?)", (key, now))
+                count += 1
+                oldest = now if oldest is None else oldest
+            return _sliding_window_result(allowed, count, oldest, limit, window, now)
+        return self._transaction(check)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RespConnection:
+    """Minimal client for the Redis serialization protocol (RESP2)"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None,
+                 timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._file = None
+
+    def execute(self, *args):
+        """Send one command and return its reply, reconnecting if needed"""
+        if self._sock is None:
+            self._connect()
+        try:
+            return self._call(*args)
+        except (OSError, EOFError):
+            self.close()
+            raise
+
+    def _call(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise EOFError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Shares limiter state between processes through a Redis-protocol server
+
+    Only plain commands with MULTI/EXEC and WATCH are used (no scripting), so
+    any server speaking the Redis protocol works.
+    """
+
+    shared = True
+    # Optimistic retries for a token bucket update that raced with another process
+    MAX_RETRIES = 10
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, prefix: str = "comfyui:ratelimit:"):
+        self.prefix = prefix
+        self._conn = RespConnection(host, port, db, password)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _reset_on_error(self):
+        # A failure can leave the connection inside WATCH/MULTI; start over on a new one
+        try:
+            yield
+        except Exception:
+            self._conn.close()
+            raise
+
+    def token_bucket(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        redis_key = f"{self.prefix}tb:{key}"
+        with self._lock, self._reset_on_error():
+            for _ in range(self.MAX_RETRIES):
+                self._conn.execute("WATCH", redis_key)
+                tokens, updated_at = self._conn.execute("HMGET", redis_key, "tokens", "updated_at")
+                tokens, result = _token_bucket(
+                    float(tokens) if tokens is not None else None,
+                    float(updated_at) if updated_at is not None else None,
+                    limit, window, now,
+                )
+                self._conn.execute("MULTI")
+                self._conn.execute("HSET", redis_key, "tokens", repr(tokens), "updated_at", repr(now))
+                self._conn.execute("PEXPIRE", redis_key, int(window * 1000))
+                if self._conn.execute("EXEC") is not None:
+                    return result
+            raise RedisError(f"Token bucket update for {key} kept conflicting")
+
+    def sliding_window(self, key: str, limit: int, window: float, now: float) -> RateLimitResult:
+        redis_key = f"{self.prefix}sw:{key}"
+        member = f"{now!r}:{uuid.uuid4().hex[:8]}"
+        with self._lock, self._reset_on_error():
+            self._conn.execute("MULTI")
+            self._conn.execute("ZREMRANGEBYSCORE", redis_key, "-inf", repr(now - window))
+            self._conn.execute("ZADD", redis_key, repr(now), member)
+            self._conn.execute("ZCARD", redis_key)
+            self._conn.execute("ZRANGE", redis_key, 0, 0, "WITHSCORES")
+            self._conn.execute("PEXPIRE", redis_key, int(window * 1000))
+            replies = self._conn.execute("EXEC")
+            count = replies[2]
+            oldest = float(replies[3][1]) if replies[3] else now
+            allowed = count <= limit
+            if not allowed:
+                # The request is not counted; take it back out of the log
+                self._conn.execute("ZREM", redis_key, member)
+                count -= 1
+        return _sliding_window_result(allowed, count, oldest, limit, window, now)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend(url: Optional[str]) -> RateLimitBackend:
+    """
+    Create a limiter backend from a URL
+
+    Args:
+        url: None or "memory" for in-process state, "sqlite:///path" for a
+            shared SQLite file, "redis://[:password@]host[:port][/db]" for a
+            Redis-protocol server
+
+    Returns:
+        The backend
+    """
+    if not url or url == "memory":
+        return MemoryRateLimitBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteRateLimitBackend(url[len("sqlite:///"):])
+    parsed = urlparse(url)
+    if parsed.scheme == "redis":
+        db = parsed.path.lstrip("/")
+        return RedisRateLimitBackend(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(db) if db else 0,
+            password=parsed.password,
+        )
+    raise ValueError(f"Unsupported rate limit backend '{url}'.")
+
+
+class RateLimiter:
+    """Checks API key requests against their per-window limits"""
+
+    def __init__(self, algorithm: str = SLIDING_WINDOW, backend: Optional[RateLimitBackend] = None,
+                 window: float = 3600.0):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm '{algorithm}'.")
+        self.algorithm = algorithm
+        self.backend = backend or MemoryRateLimitBackend()
+        self.window = window
+        # Used when a shared backend can't be reached, so limits still apply per process
+        self._fallback = MemoryRateLimitBackend() if self.backend.shared else None
+
+    def check(self, key_id: str, limit: int, now: Optional[float] = None) -> RateLimitResult:
+        """
+        Count a request for a key and decide whether it is allowed
+
+        Args:
+            key_id: The API key ID
+            limit: Requests allowed per window
+            now: Current time, defaults to time.time()
+
+        Returns:
+            RateLimitResult for the request
+        """
+        now = time.time() if now is None else now
+        try:
+            return self._check(self.backend, key_id, limit, now)
+        except Exception as e:
+            if self._fallback is None:
+                raise
+            logging.error("Rate limit backend failed, using local limits: %s", e)
+            return self._check(self._fallback, key_id, limit, now)
+
+    def _check(self, backend: RateLimitBackend, key_id: str, limit: int, now: float) -> RateLimitResult:
+        if self.algorithm == TOKEN_BUCKET:
+            return backend.token_bucket(key_id, limit, self.window, now)
+        return backend.sliding_window(key_id, limit, self.window, now)
+
+    async def check_async(self, key_id: str, limit: int) -> RateLimitResult:
+        """check() that keeps shared backend I/O off the event loop"""
+        if not self.backend.shared:
+            return self.check(key_id, limit)
+        return await asyncio.to_thread(self.check, key_id, limit)
+
+    def close(self):
+        self.backend.close()
+
+
+def create_rate_limiter(algorithm: str = SLIDING_WINDOW, backend_url: Optional[str] = None,
+                        window: float = 3600.0) -> RateLimiter:
+    """Create a RateLimiter from the --rate-limit-* options"""
+    return RateLimiter(algorithm, create_backend(backend_url), window)
+
@@ -2,16 +2,23 @@
 Usage Tracking System for API Requests
 
 Tracks API usage per key for billing and analytics.
+
+Usage records are kept by a storage backend. When the ComfyUI database is
+available (see app/database) records are appended to SQLite in batches and
+per key/day totals are maintained alongside them, so statistics are indexed
+queries. Otherwise they are kept in memory and saved to a JSON file.
 """
 from __future__ import annotations
 import json
 import os
+import threading
 import time
 import logging
 from typing import Dict, List, Optional
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta
 import folder_paths
+from app.write_behind import WriteBehindQueue, get_write_behind_queue
 
 
 class UsageRecord:
@@ -36,14 +43,56 @@ class UsageRecord:
         }
 
 
-class UsageTracker:
-    """Tracks API usage for billing and analytics"""
+def _empty_stats() -> Dict:
+    return {
+        "total_requests": 0,
+        "successful_requests": 0,
+        "failed_requests": 0,
+        "total_duration": 0,
+        "average_duration": 0,
+        "requests_per_day": {}
+    }
 
-    def __init__(self, max_records: int = 10000):
-        self.usage_file = os.path.join(folder_paths.get_user_directory(), "api_usage.json")
+
+def _finish_stats(stats: Dict) -> Dict:
+    """Fill in the derived fields of a stats dict built from totals"""
+    stats["failed_requests"] = stats["total_requests"] - stats["successful_requests"]
+    stats["average_duration"] = (
+        stats["total_duration"] / stats["total_requests"] if stats["total_requests"] else 0
+    )
+    return stats
+
+
+def _day_of(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).date().isoformat()
+
+
+class UsageStorage:
+    """Interface for usage record storage backends"""
+
+    def append(self, records: List[UsageRecord]):
+        """Persist newly recorded usage"""
+        raise NotImplementedError
+
+    def get_usage_stats(self, key_id: str, since: float) -> Dict:
+        """Get usage statistics for a key from records at or after ``since``"""
+        raise NotImplementedError
+
+    def get_all_usage_stats(self, since: float) -> Dict[str, Dict]:
+        """Get usage statistics for every key, from records at or after ``since``"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Write any buffered records"""
+
+
+class JsonUsageStorage(UsageStorage):
+    """Keeps the last ``max_records`` records in memory and saves them to a JSON file"""
+
+    def __init__(self, usage_file: str, max_records: int = 10000):
+        self.usage_file = usage_file
         self.max_records = max_records
         self.records: List[UsageRecord] = []
-        self.hourly_counts: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
         self.load_usage()
 
     def load_usage(self):
@@ -72,9 +121,199 @@ class UsageTracker:
         except Exception as e:
             logging.error("Failed to save usage records: %s", e)
 
+    def append(self, records: List[UsageRecord]):
+        self.records.extend(records)
+        if len(self.records) > self.max_records:
+            self.records = self.records[-self.max_records:]
+        self.save_usage()
+
+    def _stats_for(self, records: List[UsageRecord]) -> Dict:
+        if not records:
+            return _empty_stats()
+        requests_per_day = defaultdict(int)
+        for record in records:
+            requests_per_day[_day_of(record.timestamp)] += 1
+        return _finish_stats({
+            "total_requests": len(records),
+            "successful_requests": sum(1 for r in records if r.success),
+            "total_duration": sum(r.duration for r in records),
+            "requests_per_day": dict(requests_per_day)
+        })
+
+    def get_usage_stats(self, key_id: str, since: float) -> Dict:
+        return self._stats_for([
+            r for r in self.records
+            if r.key_id == key_id and r.timestamp >= since
+        ])
+
+    def get_all_usage_stats(self, since: float) -> Dict[str, Dict]:
+        by_key: Dict[str, List[UsageRecord]] = defaultdict(list)
+        for record in self.records:
+            by_key[record.key_id].append(record)
+        return {
+            key_id: self._stats_for([r for r in records if r.timestamp >= since])
+            for key_id, records in by_key.items()
+        }
+
+
+class DatabaseUsageStorage(UsageStorage):
+    """Stores usage in the ComfyUI database
+
+    Every record becomes a row in ``usage_events`` and is added to its key's
+    row in ``usage_daily_rollups`` in the same transaction. Statistics read the
+    rollups for whole days and only touch ``usage_events`` (by index) for the
+    partial first day of the requested window.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def append(self, records: List[UsageRecord]):
+        from sqlalchemy.dialects.sqlite import insert
+        from app.database.models import UsageDailyRollup, UsageEvent
+
+        rollups: Dict[tuple, List] = {}
+        for record in records:
+            totals = rollups.setdefault((record.key_id, _day_of(record.timestamp)), [0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += 1 if record.success else 0
+            totals[2] += record.duration
+
+        with self.session_factory() as session, session.begin():
+            session.execute(insert(UsageEvent), [
+                {
+                    "key_id": record.key_id,
+                    "endpoint": record.endpoint,
+                    "timestamp": record.timestamp,
+                    "duration": record.duration,
+                    "success": record.success,
+                    "metadata_": record.metadata,
+                }
+                for record in records
+            ])
+            for (key_id, day), (total, successful, duration) in rollups.items():
+                stmt = insert(UsageDailyRollup).values(
+                    key_id=key_id, day=day, total_requests=total,
+                    successful_requests=successful, total_duration=duration,
+                )
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=["key_id", "day"],
+                    set_={
+                        "total_requests": UsageDailyRollup.total_requests + stmt.excluded.total_requests,
+                        "successful_requests": UsageDailyRollup.successful_requests + stmt.excluded.successful_requests,
+                        "total_duration": UsageDailyRollup.total_duration + stmt.excluded.total_duration,
+                    },
+                ))
+
+    def _query_stats(self, since: float, key_id: Optional[str] = None) -> Dict[str, Dict]:
+        from sqlalchemy import case, func, select
+        from app.database.models import UsageDailyRollup, UsageEvent
+
+        first_day = datetime.fromtimestamp(since).date()
+        next_day_start = datetime.combine(first_day + timedelta(days=1), datetime.min.time()).timestamp()
+
+        # Whole days after the first one come straight from the rollups
+        rollup_query = select(
+            UsageDailyRollup.key_id, UsageDailyRollup.day, UsageDailyRollup.total_requests,
+            UsageDailyRollup.successful_requests, UsageDailyRollup.total_duration,
+        ).where(UsageDailyRollup.day > first_day.isoformat())
+        # The first day is partial, count its events from `since` onwards
+        event_query = select(
+            UsageEvent.key_id,
+            func.count(),
+            func.sum(case((UsageEvent.success, 1), else_=0)),
+            func.sum(UsageEvent.duration),
+        ).where(
+            UsageEvent.timestamp >= since, UsageEvent.timestamp < next_day_start
+        ).group_by(UsageEvent.key_id)
+        if key_id is not None:
+            rollup_query = rollup_query.where(UsageDailyRollup.key_id == key_id)
+            event_query = event_query.where(UsageEvent.key_id == key_id)
+
+        results: Dict[str, Dict] = {}
+
+        def add(row_key_id, day, total, successful, duration):
+            stats = results.setdefault(row_key_id, _empty_stats())
+            stats["total_requests"] += total
+            stats["successful_requests"] += successful or 0
+            stats["total_duration"] += duration or 0
+            stats["requests_per_day"][day] = stats["requests_per_day"].get(day, 0) + total
+
+        with self.session_factory() as session:
+            for row_key_id, total, successful, duration in session.execute(event_query):
+                add(row_key_id, first_day.isoformat(), total, successful, duration)
+            for row_key_id, day, total, successful, duration in session.execute(rollup_query):
+                add(row_key_id, day, total, successful, duration)
+
+        return {row_key_id: _finish_stats(stats) for row_key_id, stats in results.items()}
+
+    def get_usage_stats(self, key_id: str, since: float) -> Dict:
+        return self._query_stats(since, key_id=key_id).get(key_id, _empty_stats())
+
+    def get_all_usage_stats(self, since: float) -> Dict[str, Dict]:
+        return self._query_stats(since)
+
+
+class UsageTracker:
+    """Tracks API usage for billing and analytics
+
+    Recorded usage is buffered and handed to the storage backend through the
+    write-behind queue in batches (within ``flush_interval`` seconds, or sooner
+    once ``batch_size`` records are pending), so recording a request never
+    writes to disk on the event loop. Statistics queries flush first.
+    """
+
+    def __init__(self, max_records: int = 10000, storage: Optional[UsageStorage] = None,
+                 batch_size: int = 100, flush_interval: float = 5.0,
+                 write_queue: Optional[WriteBehindQueue] = None):
+        self.usage_file = os.path.join(folder_paths.get_user_directory(), "api_usage.json")
+        self.max_records = max_records
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # The database is initialized after the server is created, so the
+        # default backend is picked on first use
+        self._storage = storage
+        self._pending: List[UsageRecord] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._write_queue = write_queue or get_write_behind_queue()
+
+    @property
+    def storage(self) -> UsageStorage:
+        if self._storage is None:
+            self._storage = self._create_default_storage()
+        return self._storage
+
+    def _create_default_storage(self) -> UsageStorage:
+        from app.database.db import can_create_session, create_session
+
+        if not can_create_session():
+            return JsonUsageStorage(self.usage_file, self.max_records)
+
+        storage = DatabaseUsageStorage(create_session)
+        if os.path.exists(self.usage_file):
+            # One-off import of the records kept by the JSON backend
+            legacy = JsonUsageStorage(self.usage_file, self.max_records)
+            if legacy.records:
+                storage.append(legacy.records)
+                logging.info("Imported %d usage records into the database", len(legacy.records))
+            os.replace(self.usage_file, self.usage_file + ".imported")
+        return storage
+
+    def flush(self):
+        """Hand all pending records to the storage backend"""
+        with self._flush_lock:
+            with self._pending_lock:
+                records, self._pending = self._pending, []
+            if not records:
+                return
+            try:
+                self.storage.append(records)
+            except Exception as e:
+                logging.error("Failed to save usage records: %s", e)
+
     def record_usage(self, key_id: str, endpoint: str, duration: float,
-                     success: bool = True, metadata: Optional[Dict] = None,
-                     skip_hourly_increment: bool = False):
+                     success: bool = True, metadata: Optional[Dict] = None):
         """
         Record an API usage event
 
@@ -84,7 +323,6 @@ class UsageTracker:
             duration: Request duration in seconds
             success: Whether the request was successful
             metadata: Additional metadata
-            skip_hourly_increment: If True, don't increment hourly count (already done in rate_limit_middleware)
         """
         record = UsageRecord(
             key_id=key_id,
@@ -95,92 +333,20 @@ class UsageTracker:
             metadata=metadata
         )
 
-        self.records.append(record)
-
-        # Track hourly counts for rate limiting
-        # Skip if already incremented in rate_limit_middleware to prevent double-counting
-        hour_key = int(record.timestamp // 3600)
-        if not skip_hourly_increment:
-            self.hourly_counts[key_id][hour_key] += 1
-
-        # Clean up old hourly counts (keep last 24 hours)
-        cutoff_hour = hour_key - 24
-        self.hourly_counts[key_id] = {
-            h: c for h, c in self.hourly_counts[key_id].items()
-            if h > cutoff_hour
-        }
-
-        # Trim records if too many
-        if len(self.records) > self.max_records:
-            self.records = self.records[-self.max_records:]
-
-        # Periodically save (every 10 records)
-        if len(self.records) % 10 == 0:
-            self.save_usage()
-
-    def get_usage_count(self, key_id: str, hours: int = 1) -> int:
-        """Get usage count for a key in the last N hours"""
-        current_hour = int(time.time() // 3600)
-        cutoff_hour = current_hour - hours
-
-        total = 0
-        for hour, count in self.hourly_counts[key_id].items():
-            if hour > cutoff_hour:  # Fixed: use > to only include current hour when hours=1
-                total += count
-
-        return total
-
-    def increment_usage_count(self, key_id: str) -> int:
-        """
-        Atomically increment usage count for rate limiting.
-        Returns the new count for the current hour.
-        This prevents TOCTOU race conditions.
-        """
-        current_hour = int(time.time() // 3600)
-        self.hourly_counts[key_id][current_hour] += 1
-        return self.hourly_counts[key_id][current_hour]
+        with self._pending_lock:
+            self._pending.append(record)
+            pending = len(self._pending)
+        self._write_queue.submit(
+            ("usage", self.usage_file), self.flush,
+            delay=0 if pending >= self.batch_size else self.flush_interval
+        )
 
     def get_usage_stats(self, key_id: str, days: int = 30) -> Dict:
         """Get usage statistics for a key"""
-        cutoff_time = time.time() - (days * 24 * 3600)
-
-        relevant_records = [
-            r for r in self.records
-            if r.key_id == key_id and r.timestamp >= cutoff_time
-        ]
-
-        if not relevant_records:
-            return {
-                "total_requests": 0,
-                "successful_requests": 0,
-                "failed_requests": 0,
-                "total_duration": 0,
-                "average_duration": 0,
-                "requests_per_day": {}
-            }
-
-        successful = sum(1 for r in relevant_records if r.success)
-        total_duration = sum(r.duration for r in relevant_records)
-
-        # Group by day
-        requests_per_day = defaultdict(int)
-        for record in relevant_records:
-            day = datetime.fromtimestamp(record.timestamp).date().isoformat()
-            requests_per_day[day] += 1
-
-        return {
-            "total_requests": len(relevant_records),
-            "successful_requests": successful,
-            "failed_requests": len(relevant_records) - successful,
-            "total_duration": total_duration,
-            "average_duration": total_duration / len(relevant_records) if relevant_records else 0,
-            "requests_per_day": dict(requests_per_day)
-        }
+        self.flush()
+        return self.storage.get_usage_stats(key_id, time.time() - (days * 24 * 3600))
 
     def get_all_usage_stats(self, days: int = 30) -> Dict[str, Dict]:
         """Get usage statistics for all keys"""
-        all_key_ids = set(r.key_id for r in self.records)
-        return {
-            key_id: self.get_usage_stats(key_id, days)
-            for key_id in all_key_ids
-        }
+        self.flush()
+        return self.storage.get_all_usage_stats(time.time() - (days * 24 * 3600))
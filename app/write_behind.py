@@ -0,0 +1,125 @@
+"""
+Write-Behind Queue for Persistence
+
+Runs disk and database writes on a thread pool instead of the aiohttp event
+loop. Writes are submitted under a key; while a write for a key is waiting to
+run, further submissions for the same key are coalesced into it, so a burst of
+updates results in a single write.
+"""
+from __future__ import annotations
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Hashable, Optional, Set
+
+
+class WriteBehindQueue:
+    """Coalescing, optionally delayed, background writes"""
+
+    def __init__(self, max_workers: int = 2, name: str = "write-behind"):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Callable[[], None]] = {}  # waiting to run
+        self._timers: Dict[Hashable, threading.Timer] = {}  # pending with a delay
+        self._running: Set[Future] = set()
+        self._closed = False
+
+    def submit(self, key: Hashable, fn: Callable[[], None], delay: float = 0.0):
+        """
+        Schedule fn to run on the thread pool
+
+        Args:
+            key: Writes with the same key are coalesced while one is pending
+            fn: The write to run
+            delay: Seconds to wait before running, to batch up more updates.
+                Submitting with a shorter delay brings a pending write forward.
+        """
+        with self._lock:
+            if self._closed:
+                run_now = True
+            else:
+                run_now = False
+                already_pending = key in self._pending
+                self._pending[key] = fn
+                timer = self._timers.get(key)
+                if already_pending and (timer is None or delay > 0):
+                    return
+                if timer is not None:
+                    timer.cancel()
+                    del self._timers[key]
+                if delay > 0:
+                    timer = threading.Timer(delay, self._dispatch, (key,))
+                    timer.daemon = True
+                    self._timers[key] = timer
+                    timer.start()
+                    return
+        if run_now:
+            # Shutting down: write synchronously rather than dropping data
+            self._run_fn(fn)
+        else:
+            self._dispatch(key)
+
+    def _dispatch(self, key: Hashable):
+        with self._lock:
+            self._timers.pop(key, None)
+            if self._closed or key not in self._pending:
+                return
+            future = self._executor.submit(self._run, key)
+            self._running.add(future)
+        future.add_done_callback(self._running.discard)
+
+    def _run(self, key: Hashable):
+        with self._lock:
+            fn = self._pending.pop(key, None)
+        if fn is not None:
+            self._run_fn(fn)
+
+    @staticmethod
+    def _run_fn(fn: Callable[[], None]):
+        try:
+            fn()
+        except Exception as e:
+            logging.error("Write-behind task failed: %s", e)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Run all pending writes now and wait for them to finish"""
+        with self._lock:
+            delayed = list(self._timers)
+            for timer in self._timers.values():
+                timer.cancel()
+        for key in delayed:
+            self._dispatch(key)
+        wait(list(self._running), timeout=timeout)
+
+    def close(self):
+        """Run pending writes on the calling thread and stop the thread pool
+
+        At interpreter exit the pool no longer accepts work, so the last writes
+        are made here directly.
+        """
+        with self._lock:
+            self._closed = True
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            pending = list(self._pending.values())
+            self._pending.clear()
+        wait(list(self._running))
+        for fn in pending:
+            self._run_fn(fn)
+        self._executor.shutdown(wait=True)
+
+
+_default_queue: Optional[WriteBehindQueue] = None
+_default_queue_lock = threading.Lock()
+
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    """Return the process-wide queue, flushed at interpreter exit"""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = WriteBehindQueue()
+            atexit.register(_default_queue.close)
+    return _default_queue
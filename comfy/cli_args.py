@@ -113,6 +113,14 @@ cache_group.add_argument("--cache-classic", action="store_true", help="Use the o
 cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU caching with a maximum of N node results cached. May use more RAM/VRAM.")
 cache_group.add_argument("--cache-none", action="store_true", help="Reduced RAM/VRAM usage at the expense of executing every node for each run.")
 cache_group.add_argument("--cache-ram", nargs='?', const=4.0, type=float, default=0, help="Use RAM pressure caching with the specified headroom threshold. If available RAM drops below the threhold the cache remove large items to free RAM. Default 4GB")
+parser.add_argument("--cache-disk", type=str, default=None, metavar="PATH", help="Also persist node outputs in this directory so they survive restarts and RAM cache evictions. Has no effect with --cache-none.")
+parser.add_argument("--cache-disk-size", type=float, default=20.0, metavar="GB", help="Maximum size of the --cache-disk directory in GB. Least recently used outputs are removed first.")
+parser.add_argument("--execution-devices", type=int, nargs='+', default=None, metavar="DEVICE_ID", help="Run prompts on several devices at once, with one execution worker per device id, e.g. --execution-devices 0 1 2 3. Workers prefer prompts using the models they have loaded.")
+parser.add_argument("--lora-cache-ram", type=float, default=2.0, metavar="GB", help="Size of the cache of loaded LoRA files shared by all LoRA loader nodes. Least recently used LoRAs are dropped first. 0 disables it.")
+parser.add_argument("--merged-weight-cache-ram", type=float, default=0.0, metavar="GB", help="Keep up to this many GB of LoRA patched model weights in RAM, so loading a model again with the same LoRAs and strengths copies the weights instead of recomputing them. Disabled by default.")
+parser.add_argument("--warm-pool-size", type=int, default=0, metavar="N", help="Keep the N most recently loaded checkpoints, diffusion models, text encoders and VAEs in RAM even when they are no longer in the node output cache, so switching back to them doesn't read them from disk again.")
+parser.add_argument("--warm-pool-preload", type=str, nargs='+', default=[], metavar="CKPT_NAME", help="Checkpoints to load into the warm pool when the server starts. The pool is made large enough to hold them.")
+parser.add_argument("--shared-cache-ram", type=float, default=4.0, metavar="GB", help="With --execution-devices, size of the RAM cache of node outputs shared between the workers. Ignored with --cache-disk, which is shared instead.")
 
 attn_group = parser.add_mutually_exclusive_group()
 attn_group.add_argument("--use-split-cross-attention", action="store_true", help="Use the split cross attention optimization. Ignored when xformers is used.")
@@ -221,6 +229,8 @@ parser.add_argument("--user-directory", type=is_valid_directory, default=None, h
 parser.add_argument("--enable-compress-response-body", action="store_true", help="Enable compressing response body.")
 parser.add_argument("--enable-api-auth", action="store_true", help="Enable API key authentication for /api/* endpoints. API keys are required when enabled.")
 parser.add_argument("--require-api-auth", action="store_true", help="Require API key authentication for all API endpoints. Overrides --enable-api-auth.")
+parser.add_argument("--rate-limit-algorithm", type=str, default="sliding-window", choices=["sliding-window", "token-bucket"], help="How API key rate limits are enforced: a sliding one hour window, or a token bucket that allows bursts up to the hourly limit.")
+parser.add_argument("--rate-limit-backend", type=str, default=None, metavar="URL", help="Share API key rate limits between ComfyUI instances, e.g. sqlite:///path/to/rate_limits.db or redis://host:6379/0. By default limits are kept per process.")
 
 parser.add_argument(
     "--comfy-api-base",
@@ -233,6 +243,8 @@ database_default_path = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "user", "comfyui.db")
 )
 parser.add_argument("--database-url", type=str, default=f"sqlite:///{database_default_path}", help="Specify the database URL, e.g. for an in-memory database you can use 'sqlite:///:memory:'.")
+parser.add_argument("--coalesce-prompts", type=float, nargs='?', const=0.0, default=None, metavar="SECONDS", help="Run identical prompts submitted while one of them is queued or running only once; each gets the same outputs under its own prompt_id. With SECONDS, prompts identical to one that succeeded within that many seconds get its outputs without running.")
+parser.add_argument("--persist-jobs", action="store_true", help="Keep the prompt queue and history in the database so they survive restarts.")
 
 if comfy.options.args_parsing:
     args = parser.parse_args()
@@ -21,7 +21,11 @@ import comfy.utils
 import comfy.model_management
 import comfy.model_base
 import comfy.weight_adapter as weight_adapter
+from comfy.cli_args import args
+from collections import OrderedDict
 import logging
+import os
+import threading
 import torch
 
 LORA_CLIP_MAP = {
@@ -34,6 +38,85 @@ LORA_CLIP_MAP = {
 }
 
 
+class LoraFileCache:
+    """
+    State dicts of recently loaded LoRA files, shared by all LoRA loaders.
+
+    An entry is keyed by the file path and is reloaded once the modification
+    time or size of the file changed. Safetensors files are memory mapped, so
+    a cached LoRA is backed by the page cache instead of a private copy. The
+    least recently used entries are dropped once their tensors add up to more
+    than max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, tuple] = OrderedDict()  # path -> (stamp, state dict, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, path: str) -> dict[str, torch.Tensor]:
+        """
+        The state dict of the LoRA file at path.
+
+        Each call returns a new dict, callers may add or rename keys, but the
+        tensors are shared and must not be modified.
+        """
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return dict(entry[1])
+            self.misses += 1
+
+        sd = comfy.utils.load_torch_file(path, safe_load=True)
+        size = sum(v.nbytes for v in sd.values() if isinstance(v, torch.Tensor))
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old[2]
+            if size <= self.max_bytes:
+                self.entries[path] = (stamp, sd, size)
+                self.total_bytes += size
+                while self.total_bytes > self.max_bytes:
+                    _, (_, _, old_size) = self.entries.popitem(last=False)
+                    self.total_bytes -= old_size
+                    self.evictions += 1
+        return dict(sd)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+lora_file_cache = LoraFileCache(int(args.lora_cache_ram * (1024 ** 3)))
+
+
+def load_lora_file(path: str) -> dict[str, torch.Tensor]:
+    """Load a LoRA file through the shared LoraFileCache."""
+    return lora_file_cache.load(path)
+
+
 def load_lora(lora, to_load, log_missing=True):
     patch_dict = {}
     loaded_keys = set()
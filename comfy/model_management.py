@@ -18,6 +18,7 @@
 
 import psutil
 import logging
+import collections
 from enum import Enum
 from comfy.cli_args import args, PerformanceFeature
 import torch
@@ -27,6 +28,8 @@ import platform
 import weakref
 import gc
 import os
+import threading
+import contextlib
 
 class VRAMState(Enum):
     DISABLED = 0    #No vram present: no need to move models to vram
@@ -168,9 +171,28 @@ def is_ixuca():
         return True
     return False
 
+# Device of the calling execution worker, when several workers share the process
+thread_device = threading.local()
+
+def set_thread_torch_device(device):
+    """Make get_torch_device() return device on the calling thread."""
+    thread_device.device = device
+    if is_device_type(device, "cuda"):
+        torch.cuda.set_device(device)
+
+def get_execution_devices(device_ids):
+    """Devices for execution workers pinned to the given device ids."""
+    device = get_torch_device()
+    if directml_enabled or device.type in ("cpu", "mps"):
+        return [device] * len(device_ids)
+    return [torch.device(device.type, i) for i in device_ids]
+
 def get_torch_device():
     global directml_enabled
     global cpu_state
+    device = getattr(thread_device, "device", None)
+    if device is not None:
+        return device
     if directml_enabled:
         global directml_device
         return directml_device
@@ -450,6 +472,11 @@ except:
 
 
 current_loaded_models = []
+# Guards current_loaded_models when execution workers load models concurrently.
+# It is only held while the list is read or changed: moving weights to and
+# from a device is serialized per device by device_lock(), taken before it.
+models_lock = threading.RLock()
+device_locks = {}
 
 def module_size(module):
     module_mem = 0
@@ -581,46 +608,62 @@ def extra_reserved_memory():
 def minimum_inference_memory():
     return (1024 * 1024 * 1024) * 0.8 + extra_reserved_memory()
 
-def free_memory(memory_required, device, keep_loaded=[]):
-    cleanup_models_gc()
-    unloaded_model = []
-    can_unload = []
-    unloaded_models = []
-
-    for i in range(len(current_loaded_models) -1, -1, -1):
-        shift_model = current_loaded_models[i]
-        if shift_model.device == device:
-            if shift_model not in keep_loaded and not shift_model.is_dead():
-                can_unload.append((-shift_model.model_offloaded_memory(), sys.getrefcount(shift_model.model), shift_model.model_memory(), i))
-                shift_model.currently_used = False
-
-    for x in sorted(can_unload):
-        i = x[-1]
-        memory_to_free = None
-        if not DISABLE_SMART_MEMORY:
-            free_mem = get_free_memory(device)
-            if free_mem > memory_required:
-                break
-            memory_to_free = memory_required - free_mem
-        logging.debug(f"Unloading {current_loaded_models[i].model.model.__class__.__name__}")
-        if current_loaded_models[i].model_unload(memory_to_free):
-            unloaded_model.append(i)
+def device_lock(device):
+    """Serializes the loading and unloading of models on one device."""
+    with models_lock:
+        lock = device_locks.get(device)
+        if lock is None:
+            lock = device_locks[device] = threading.RLock()
+        return lock
 
-    for i in sorted(unloaded_model, reverse=True):
-        unloaded_models.append(current_loaded_models.pop(i))
+def _remove_loaded_models(removed):
+    removed = set(id(m) for m in removed)
+    current_loaded_models[:] = [m for m in current_loaded_models if id(m) not in removed]
 
-    if len(unloaded_model) > 0:
-        soft_empty_cache()
-    else:
-        if vram_state != VRAMState.HIGH_VRAM:
-            mem_free_total, mem_free_torch = get_free_memory(device, torch_free_too=True)
-            if mem_free_torch > mem_free_total * 0.25:
-                soft_empty_cache()
-    return unloaded_models
+def free_memory(memory_required, device, keep_loaded=[]):
+    with device_lock(device):
+        unloaded_models = []
+        can_unload = []
+        with models_lock:
+            cleanup_models_gc()
+            for i in range(len(current_loaded_models) -1, -1, -1):
+                shift_model = current_loaded_models[i]
+                if shift_model.device == device:
+                    if shift_model not in keep_loaded and not shift_model.is_dead():
+                        can_unload.append((-shift_model.model_offloaded_memory(), sys.getrefcount(shift_model.model), shift_model.model_memory(), i, shift_model))
+                        shift_model.currently_used = False
+
+        # Only this thread loads and unloads models on the device, the unloads
+        # run outside models_lock so workers on other devices aren't held up
+        for x in sorted(can_unload, key=lambda x: x[:-1]):
+            shift_model = x[-1]
+            memory_to_free = None
+            if not DISABLE_SMART_MEMORY:
+                free_mem = get_free_memory(device)
+                if free_mem > memory_required:
+                    break
+                memory_to_free = memory_required - free_mem
+            logging.debug(f"Unloading {shift_model.model.model.__class__.__name__}")
+            if shift_model.model_unload(memory_to_free):
+                unloaded_models.append(x)
+
+        unloaded_models = [x[-1] for x in sorted(unloaded_models, key=lambda x: x[3], reverse=True)]
+        with models_lock:
+            _remove_loaded_models(unloaded_models)
+
+        if len(unloaded_models) > 0:
+            soft_empty_cache()
+        else:
+            if vram_state != VRAMState.HIGH_VRAM:
+                mem_free_total, mem_free_torch = get_free_memory(device, torch_free_too=True)
+                if mem_free_torch > mem_free_total * 0.25:
+                    soft_empty_cache()
+        return unloaded_models
 
 def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
-    cleanup_models_gc()
     global vram_state
+    with models_lock:
+        cleanup_models_gc()
 
     inference_memory = minimum_inference_memory()
     extra_mem = max(inference_memory, memory_required + extra_reserved_memory())
@@ -637,80 +680,91 @@ def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimu
 
     models = models_temp
 
-    models_to_load = []
-
-    for x in models:
-        loaded_model = LoadedModel(x)
-        try:
-            loaded_model_index = current_loaded_models.index(loaded_model)
-        except:
-            loaded_model_index = None
-
-        if loaded_model_index is not None:
-            loaded = current_loaded_models[loaded_model_index]
-            loaded.currently_used = True
-            models_to_load.append(loaded)
-        else:
-            if hasattr(x, "model"):
-                logging.info(f"Requested to load {x.model.__class__.__name__}")
-            models_to_load.append(loaded_model)
-
-    for loaded_model in models_to_load:
-        to_unload = []
-        for i in range(len(current_loaded_models)):
-            if loaded_model.model.is_clone(current_loaded_models[i].model):
-                to_unload = [i] + to_unload
-        for i in to_unload:
-            model_to_unload = current_loaded_models.pop(i)
+    with contextlib.ExitStack() as stack:
+        # Always in the same order, so two calls can't each wait for a device the other holds
+        for device in sorted(set(m.load_device for m in models), key=str):
+            stack.enter_context(device_lock(device))
+
+        models_to_load = []
+        to_detach = []
+        with models_lock:
+            for x in models:
+                loaded_model = LoadedModel(x)
+                try:
+                    loaded_model_index = current_loaded_models.index(loaded_model)
+                except:
+                    loaded_model_index = None
+
+                if loaded_model_index is not None:
+                    loaded = current_loaded_models[loaded_model_index]
+                    loaded.currently_used = True
+                    models_to_load.append(loaded)
+                else:
+                    if hasattr(x, "model"):
+                        logging.info(f"Requested to load {x.model.__class__.__name__}")
+                    models_to_load.append(loaded_model)
+
+            for loaded_model in models_to_load:
+                to_unload = []
+                for i in range(len(current_loaded_models)):
+                    if loaded_model.model.is_clone(current_loaded_models[i].model):
+                        to_unload = [i] + to_unload
+                for i in to_unload:
+                    to_detach.append(current_loaded_models.pop(i))
+
+        for model_to_unload in to_detach:
             model_to_unload.model.detach(unpatch_all=False)
             model_to_unload.model_finalizer.detach()
 
-    total_memory_required = {}
-    for loaded_model in models_to_load:
-        total_memory_required[loaded_model.device] = total_memory_required.get(loaded_model.device, 0) + loaded_model.model_memory_required(loaded_model.device)
-
-    for device in total_memory_required:
-        if device != torch.device("cpu"):
-            free_memory(total_memory_required[device] * 1.1 + extra_mem, device)
-
-    for device in total_memory_required:
-        if device != torch.device("cpu"):
-            free_mem = get_free_memory(device)
-            if free_mem < minimum_memory_required:
-                models_l = free_memory(minimum_memory_required, device)
-                logging.info("{} models unloaded.".format(len(models_l)))
-
-    for loaded_model in models_to_load:
-        model = loaded_model.model
-        torch_dev = model.load_device
-        if is_device_cpu(torch_dev):
-            vram_set_state = VRAMState.DISABLED
-        else:
-            vram_set_state = vram_state
-        lowvram_model_memory = 0
-        if lowvram_available and (vram_set_state == VRAMState.LOW_VRAM or vram_set_state == VRAMState.NORMAL_VRAM) and not force_full_load:
-            loaded_memory = loaded_model.model_loaded_memory()
-            current_free_mem = get_free_memory(torch_dev) + loaded_memory
+        total_memory_required = {}
+        for loaded_model in models_to_load:
+            total_memory_required[loaded_model.device] = total_memory_required.get(loaded_model.device, 0) + loaded_model.model_memory_required(loaded_model.device)
+
+        for device in total_memory_required:
+            if device != torch.device("cpu"):
+                free_memory(total_memory_required[device] * 1.1 + extra_mem, device)
+
+        for device in total_memory_required:
+            if device != torch.device("cpu"):
+                free_mem = get_free_memory(device)
+                if free_mem < minimum_memory_required:
+                    models_l = free_memory(minimum_memory_required, device)
+                    logging.info("{} models unloaded.".format(len(models_l)))
+
+        for loaded_model in models_to_load:
+            model = loaded_model.model
+            torch_dev = model.load_device
+            if is_device_cpu(torch_dev):
+                vram_set_state = VRAMState.DISABLED
+            else:
+                vram_set_state = vram_state
+            lowvram_model_memory = 0
+            if lowvram_available and (vram_set_state == VRAMState.LOW_VRAM or vram_set_state == VRAMState.NORMAL_VRAM) and not force_full_load:
+                loaded_memory = loaded_model.model_loaded_memory()
+                current_free_mem = get_free_memory(torch_dev) + loaded_memory
 
-            lowvram_model_memory = max(0, (current_free_mem - minimum_memory_required), min(current_free_mem * MIN_WEIGHT_MEMORY_RATIO, current_free_mem - minimum_inference_memory()))
-            lowvram_model_memory = lowvram_model_memory - loaded_memory
+                lowvram_model_memory = max(0, (current_free_mem - minimum_memory_required), min(current_free_mem * MIN_WEIGHT_MEMORY_RATIO, current_free_mem - minimum_inference_memory()))
+                lowvram_model_memory = lowvram_model_memory - loaded_memory
 
-            if lowvram_model_memory == 0:
-                lowvram_model_memory = 0.1
+                if lowvram_model_memory == 0:
+                    lowvram_model_memory = 0.1
 
-        if vram_set_state == VRAMState.NO_VRAM:
-            lowvram_model_memory = 0.1
+            if vram_set_state == VRAMState.NO_VRAM:
+                lowvram_model_memory = 0.1
 
-        loaded_model.model_load(lowvram_model_memory, force_patch_weights=force_patch_weights)
-        current_loaded_models.insert(0, loaded_model)
-    return
+            loaded_model.model_load(lowvram_model_memory, force_patch_weights=force_patch_weights)
+            with models_lock:
+                current_loaded_models.insert(0, loaded_model)
+        return
 
 def load_model_gpu(model):
     return load_models_gpu([model])
 
 def loaded_models(only_currently_used=False):
     output = []
-    for m in current_loaded_models:
+    with models_lock:
+        models = list(current_loaded_models)
+    for m in models:
         if only_currently_used:
             if not m.currently_used:
                 continue
@@ -740,14 +794,15 @@ def cleanup_models_gc():
 
 
 def cleanup_models():
-    to_delete = []
-    for i in range(len(current_loaded_models)):
-        if current_loaded_models[i].real_model() is None:
-            to_delete = [i] + to_delete
+    with models_lock:
+        to_delete = []
+        for i in range(len(current_loaded_models)):
+            if current_loaded_models[i].real_model() is None:
+                to_delete = [i] + to_delete
 
-    for i in to_delete:
-        x = current_loaded_models.pop(i)
-        del x
+        for i in to_delete:
+            x = current_loaded_models.pop(i)
+            del x
 
 def dtype_size(dtype):
     dtype_size = 4
@@ -1543,31 +1598,120 @@ def unload_all_models():
     free_memory(1e30, get_torch_device())
 
 
-#TODO: might be cleaner to put this somewhere else
-import threading
+def file_identity(path):
+    """Identifies the contents of a file: the same for every path to it, changes when it is modified."""
+    stat = os.stat(path)
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+class ModelWarmPool:
+    """
+    Recently loaded models kept in RAM, independent of the node output cache.
+
+    Loader nodes load through the pool, so a model that dropped out of the
+    output cache, or is loaded by another node, isn't read from disk again.
+    Entries are keyed by the kind of load, the identity of the files and the
+    load options, so the same file reached through another name or a link is
+    loaded once. The key includes the execution device of the calling
+    thread, models are created for that device. The least recently used
+    entry is dropped past max_entries. The models themselves are loaded to
+    and unloaded from the GPU as usual.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.loading = {}  # key -> lock held while the key is loaded
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, kind, paths, options, loader):
+        """
+        The result of loader() for the files at paths, loaded with options.
+
+        options must be hashable. The result is shared by every caller and
+        must not be modified.
+        """
+        if self.max_entries <= 0:
+            return loader()
+        key = (kind, tuple(file_identity(p) for p in paths), options, get_torch_device())
+        with self.lock:
+            key_lock = self.loading.setdefault(key, threading.Lock())
+        # Another thread loading the same files is waited for instead of loading them twice
+        with key_lock:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key]
+                self.misses += 1
+            try:
+                out = loader()
+                with self.lock:
+                    self.entries[key] = out
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            finally:
+                with self.lock:
+                    self.loading.pop(key, None)
+            return out
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self.entries),
+                "max_size": self.max_entries,
+            }
+
+# Each execution worker preloads the checkpoints for its own device
+warm_pool = ModelWarmPool(max(args.warm_pool_size, len(args.warm_pool_preload) * len(args.execution_devices or [None])))
 
+
+#TODO: might be cleaner to put this somewhere else
 class InterruptProcessingException(Exception):
     pass
 
 interrupt_processing_mutex = threading.RLock()
 
 interrupt_processing = False
-def interrupt_current_processing(value=True):
+# Idents of execution worker threads interrupted individually
+interrupted_threads = set()
+def interrupt_current_processing(value=True, thread_id=None):
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
+        if thread_id is not None:
+            if value:
+                interrupted_threads.add(thread_id)
+            else:
+                interrupted_threads.discard(thread_id)
+            return
         interrupt_processing = value
+        if not value:
+            interrupted_threads.discard(threading.get_ident())
 
 def processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
-        return interrupt_processing
+        return interrupt_processing or threading.get_ident() in interrupted_threads
 
 def throw_exception_if_processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
+        thread_id = threading.get_ident()
+        if thread_id in interrupted_threads:
+            interrupted_threads.discard(thread_id)
+            raise InterruptProcessingException()
         if interrupt_processing:
             interrupt_processing = False
             raise InterruptProcessingException()
@@ -23,7 +23,10 @@ import copy
 import inspect
 import logging
 import math
+import threading
+import types
 import uuid
+import weakref
 from typing import Callable, Optional
 
 import torch
@@ -34,6 +37,8 @@ import comfy.lora
 import comfy.model_management
 import comfy.patcher_extension
 import comfy.utils
+import comfy.weight_adapter
+from comfy.cli_args import args
 from comfy.comfy_types import UnetWrapperFunction
 from comfy.quant_ops import QuantizedTensor
 from comfy.patcher_extension import CallbacksMP, PatcherInjection, WrappersMP
@@ -169,6 +174,116 @@ def get_key_weight(model, key):
 
     return weight, set_func, convert_func
 
+def patches_signature(value, keep):
+    """
+    Hashable description of a weight's patch list, or None if it holds
+    values that can't be described.
+
+    Tensors and functions are described by identity: they are appended to
+    keep, which must be held as long as the signature is used so their ids
+    aren't reused. The version counter of tensors changes with in place
+    updates.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, torch.Tensor):
+        keep.append(value)
+        return ("tensor", id(value), value._version)
+    if isinstance(value, (tuple, list)):
+        items = tuple(patches_signature(v, keep) for v in value)
+        return None if any(i is None and v is not None for i, v in zip(items, value)) else items
+    if isinstance(value, comfy.weight_adapter.WeightAdapterBase):
+        weights = patches_signature(value.weights, keep)
+        return None if weights is None else (type(value).__qualname__, weights)
+    if isinstance(value, types.FunctionType):
+        keep.append(value)
+        return ("function", id(value))
+    return None
+
+
+class MergedWeightCache:
+    """
+    Patched weights, so a model loaded again with the same patches gets its
+    weights copied instead of recomputed.
+
+    An entry is keyed by the model, the weight key, the patches applied to it
+    and the dtypes involved. The base weights are identified by their model:
+    patching never changes them, it is reverted on unpatch. The patches are
+    identified by patches_signature and the entry holds on to them. Entries
+    are kept in CPU RAM; the least recently used are dropped once they add up
+    to more than max_bytes. An entry's size counts the patch tensors it keeps
+    alive along with the weight, as they may outlive the LoRA file cache.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> (model ref, weight, patches kept alive, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model, key, patches, *dtypes):
+        """Cache key for the patched weight key of model, or None if it can't be cached"""
+        if self.max_bytes <= 0:
+            return None
+        keep = []
+        signature = patches_signature(patches, keep)
+        if signature is None:
+            return None
+        return (id(model), key, signature, dtypes), keep
+
+    def get(self, cache_key, model) -> Optional[torch.Tensor]:
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None and entry[0]() is model:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                # A model that was freed, whose id now belongs to another
+                self.total_bytes -= entry[3]
+                del self.entries[cache_key]
+            self.misses += 1
+            return None
+
+    def set(self, cache_key, model, weight: torch.Tensor, keep: list):
+        kept = {id(t): t.nbytes for t in keep if isinstance(t, torch.Tensor)}
+        size = weight.nbytes + sum(kept.values())
+        if size > self.max_bytes:
+            return
+        weight = weight.to("cpu", copy=True)
+        with self.lock:
+            old = self.entries.pop(cache_key, None)
+            if old is not None:
+                self.total_bytes -= old[3]
+            self.entries[cache_key] = (weakref.ref(model), weight, keep, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, _, _, old_size) = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+merged_weight_cache = MergedWeightCache(int(args.merged_weight_cache_ram * (1024 ** 3)))
+
+
 class AutoPatcherEjector:
     def __init__(self, model: 'ModelPatcher', skip_and_inject_on_exit_only=False):
         self.model = model
@@ -622,16 +737,29 @@ class ModelPatcher:
             self.backup[key] = collections.namedtuple('Dimension', ['weight', 'inplace_update'])(weight.to(device=self.offload_device, copy=inplace_update), inplace_update)
 
         temp_dtype = comfy.model_management.lora_compute_dtype(device_to)
-        if device_to is not None:
-            temp_weight = comfy.model_management.cast_to_device(weight, device_to, temp_dtype, copy=True)
+        cached = None
+        if set_func is None:
+            cache_key = merged_weight_cache.key(self.model, key, self.patches[key], temp_dtype, weight.dtype)
+            if cache_key is not None:
+                cached = merged_weight_cache.get(cache_key[0], self.model)
+
+        if cached is not None:
+            out_weight = cached.to(device=weight.device if device_to is None else device_to, copy=True)
         else:
-            temp_weight = weight.to(temp_dtype, copy=True)
-        if convert_func is not None:
-            temp_weight = convert_func(temp_weight, inplace=True)
+            if device_to is not None:
+                temp_weight = comfy.model_management.cast_to_device(weight, device_to, temp_dtype, copy=True)
+            else:
+                temp_weight = weight.to(temp_dtype, copy=True)
+            if convert_func is not None:
+                temp_weight = convert_func(temp_weight, inplace=True)
+
+            out_weight = comfy.lora.calculate_weight(self.patches[key], temp_weight, key)
 
-        out_weight = comfy.lora.calculate_weight(self.patches[key], temp_weight, key)
         if set_func is None:
-            out_weight = comfy.float.stochastic_rounding(out_weight, weight.dtype, seed=string_to_seed(key))
+            if cached is None:
+                out_weight = comfy.float.stochastic_rounding(out_weight, weight.dtype, seed=string_to_seed(key))
+                if cache_key is not None:
+                    merged_weight_cache.set(cache_key[0], self.model, out_weight, cache_key[1])
             if inplace_update:
                 comfy.utils.copy_to_param(self.model, key, out_weight)
             else:
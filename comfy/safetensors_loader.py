@@ -0,0 +1,197 @@
+"""
+Reads safetensors files with a pool of threads.
+
+The tensors are grouped, in the order of their offsets in the file, into
+chunks of about CHUNK_SIZE bytes. Each chunk is read with one call into a
+buffer of its own, by one of the threads, and the tensors of the chunk are
+views of that buffer. When loading to a GPU, chunks are read into pinned
+buffers and copied to the device as soon as they are read, while the next
+chunks are being read.
+
+Unlike safetensors.safe_open this doesn't memory map the file: the tensors
+are read in full. load_torch_file uses it when mmap is disabled and when
+loading directly to a device.
+
+When loading to a GPU, at most threads + 1 pinned buffers, of about
+CHUNK_SIZE bytes each, are held at once: the reads in flight and one copy.
+
+The tensors of a chunk are views of one buffer, which is only freed once
+none of them is referenced. Keeping a few tensors of a file, e.g. the VAE
+of a checkpoint, also keeps the rest of their chunks in memory, up to
+CHUNK_SIZE per chunk.
+"""
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import struct
+
+import torch
+
+CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_THREADS = min(8, os.cpu_count() or 1)
+
+DTYPES = {
+    "BOOL": torch.bool,
+    "U8": torch.uint8,
+    "I8": torch.int8,
+    "I16": torch.int16,
+    "I32": torch.int32,
+    "I64": torch.int64,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "F32": torch.float32,
+    "F64": torch.float64,
+}
+for name, attr in (("U16", "uint16"), ("U32", "uint32"), ("U64", "uint64"),
+                   ("F8_E4M3", "float8_e4m3fn"), ("F8_E5M2", "float8_e5m2")):
+    if hasattr(torch, attr):
+        DTYPES[name] = getattr(torch, attr)
+
+
+class UnsupportedFile(Exception):
+    """The file uses a feature this reader doesn't handle, load it with safetensors instead."""
+
+
+def read_header(path):
+    """
+    The parsed header of a safetensors file.
+
+    Returns:
+        tuple: (tensors, metadata, data_start), tensors maps the tensor names
+            to their header entries and data_start is the file offset that
+            data_offsets are relative to.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        prefix = f.read(8)
+        if len(prefix) < 8:
+            raise ValueError("MetadataIncompleteBuffer")
+        length = struct.unpack("<Q", prefix)[0]
+        if length > file_size - 8:
+            raise ValueError("HeaderTooLarge")
+        try:
+            header = json.loads(f.read(length))
+        except ValueError:
+            raise ValueError("InvalidHeaderDeserialization")
+    metadata = header.pop("__metadata__", None)
+    data_start = 8 + length
+    for entry in header.values():
+        if data_start + entry["data_offsets"][1] > file_size:
+            raise ValueError("MetadataIncompleteBuffer")
+    return header, metadata, data_start
+
+
+def plan_chunks(tensors, chunk_size=CHUNK_SIZE):
+    """Split the tensors, in file order, into lists of (name, entry) of about chunk_size bytes."""
+    chunks = []
+    current = []
+    current_start = 0
+    for name, entry in sorted(tensors.items(), key=lambda x: x[1]["data_offsets"][0]):
+        begin, end = entry["data_offsets"]
+        if current and end - current_start > chunk_size:
+            chunks.append(current)
+            current = []
+        if not current:
+            current_start = begin
+        current.append((name, entry))
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _read_chunk(path, data_start, chunk, pin_memory):
+    begin = chunk[0][1]["data_offsets"][0]
+    end = max(entry["data_offsets"][1] for _, entry in chunk)
+    buffer = torch.empty(end - begin, dtype=torch.uint8, pin_memory=pin_memory)
+    view = memoryview(buffer.numpy())
+    with open(path, "rb", buffering=0) as f:
+        f.seek(data_start + begin)
+        read = 0
+        while read < len(view):
+            n = f.readinto(view[read:])
+            if not n:
+                raise ValueError("MetadataIncompleteBuffer")
+            read += n
+    return begin, buffer
+
+
+def _tensor_views(buffer, begin, chunk):
+    out = {}
+    for name, entry in chunk:
+        dtype = DTYPES[entry["dtype"]]
+        start, end = entry["data_offsets"]
+        data = buffer[start - begin:end - begin]
+        if (start - begin) % dtype.itemsize:
+            data = data.clone()  # views need offsets aligned to the element size
+        out[name] = data.view(dtype).reshape(entry["shape"])
+    return out
+
+
+def load_file(path, device=None, pin_memory=False, threads=DEFAULT_THREADS, chunk_size=CHUNK_SIZE):
+    """
+    Load the tensors of the safetensors file at path.
+
+    Args:
+        device: device of the returned tensors, the CPU by default.
+        pin_memory: with a CPU device, read into pinned buffers so the
+            tensors can later be copied to a GPU asynchronously.
+        threads: number of reads in flight at once. With a GPU device this
+            also bounds the pinned memory, see the module docstring.
+
+    Returns:
+        tuple: (state dict, metadata)
+    """
+    if device is None:
+        device = torch.device("cpu")
+    tensors, metadata, data_start = read_header(path)
+    for entry in tensors.values():
+        if entry["dtype"] not in DTYPES:
+            raise UnsupportedFile("unsupported dtype {}".format(entry["dtype"]))
+
+    to_device = device.type != "cpu"
+    pin_memory = (pin_memory or to_device) and torch.cuda.is_available()
+    stream = None
+    if to_device and device.type == "cuda":
+        stream = torch.cuda.Stream(device)
+
+    threads = max(1, threads)
+    # Buffers read or being copied at once. On the CPU they are the result,
+    # so reads can run further ahead.
+    max_buffers = threads + 1 if to_device else 2 * threads
+    sd = {}
+    in_flight = collections.deque()  # (event, pinned buffer) of copies that may still be running
+    chunks = iter(plan_chunks(tensors, chunk_size))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        def submit(chunk):
+            futures.append((chunk, executor.submit(_read_chunk, path, data_start, chunk, pin_memory)))
+
+        futures = collections.deque()
+        for chunk in itertools.islice(chunks, threads if to_device else max_buffers):
+            submit(chunk)
+        while futures:
+            chunk, future = futures.popleft()
+            begin, buffer = future.result()
+            if stream is not None:
+                with torch.cuda.stream(stream):
+                    on_device = buffer.to(device, non_blocking=pin_memory)
+                    event = torch.cuda.Event()
+                    event.record(stream)
+                # The tensors are used on the current stream once returned
+                on_device.record_stream(torch.cuda.current_stream(device))
+                in_flight.append((event, buffer))
+                # Wait for copies until the next read fits in max_buffers
+                while in_flight and len(futures) + len(in_flight) + 1 > max_buffers:
+                    in_flight.popleft()[0].synchronize()
+                buffer = on_device
+            elif to_device:
+                buffer = buffer.to(device)
+            # Keep the pool busy while this chunk is copied to the device
+            next_chunk = next(chunks, None)
+            if next_chunk is not None:
+                submit(next_chunk)
+            sd.update(_tensor_views(buffer, begin, chunk))
+    if stream is not None:
+        stream.synchronize()
+    return sd, metadata
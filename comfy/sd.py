@@ -1337,30 +1337,106 @@ def load_checkpoint(config_path=None, ckpt_path=None, output_vae=True, output_cl
 
     return (model, clip, vae)
 
+def _diffusers_model_detectable(sd):
+    new_sd = model_detection.convert_diffusers_mmdit(sd, "")
+    if new_sd is not None:
+        return model_detection.model_config_from_unet(new_sd, "") is not None
+    return model_detection.model_config_from_diffusers_unet(sd) is not None
+
+def _model_info_from_state_dict(sd, metadata, checkpoint, model_options):
+    convert_quants = model_options.get("custom_operations", None) is None
+    if checkpoint:
+        diffusion_model_prefix = model_detection.unet_prefix_from_state_dict(sd)
+        parameters = comfy.utils.calculate_parameters(sd, diffusion_model_prefix)
+        weight_dtype = comfy.utils.weight_dtype(sd, diffusion_model_prefix)
+        if convert_quants:
+            sd, metadata = comfy.utils.convert_old_quants(sd, diffusion_model_prefix, metadata=metadata)
+        model_config = model_detection.model_config_from_unet(sd, diffusion_model_prefix, metadata=metadata)
+        if model_config is None:
+            # Loaded as a diffusion model only, see load_state_dict_guess_config
+            if _model_info_from_state_dict(sd, None, False, {}) is False:
+                return False
+            return None
+    else:
+        diffusion_model_prefix = model_detection.unet_prefix_from_state_dict(sd)
+        temp_sd = comfy.utils.state_dict_prefix_replace(sd, {diffusion_model_prefix: ""}, filter_keys=True)
+        if len(temp_sd) > 0:
+            sd = temp_sd
+        if convert_quants:
+            sd, metadata = comfy.utils.convert_old_quants(sd, "", metadata=metadata)
+        parameters = comfy.utils.calculate_parameters(sd)
+        weight_dtype = comfy.utils.weight_dtype(sd)
+        model_config = model_detection.model_config_from_unet(sd, "", metadata=metadata)
+        if model_config is None:
+            # The keys of diffusers models are converted on load, so they are detected again then
+            return None if _diffusers_model_detectable(sd) else False
+    return {"diffusion_model_prefix": diffusion_model_prefix, "parameters": parameters, "weight_dtype": weight_dtype, "model_config": model_config}
+
+def model_info_from_header(path, checkpoint=True, model_options={}):
+    """
+    Detect the model of a safetensors file from its header alone, before any
+    weight is read. A wrong file is rejected early, and a detected model
+    isn't detected again once its weights are loaded.
+
+    checkpoint: the file is loaded with load_checkpoint_guess_config rather
+    than load_diffusion_model.
+
+    Returns:
+        False if the file is not a model that can be loaded. None when the
+        header is not enough to tell, e.g. for other files, diffusers models
+        or quantized models whose conversion reads tensor values: the load
+        then detects from the weights. Otherwise the model_info for
+        load_state_dict_guess_config or load_diffusion_model_state_dict: a
+        dict of diffusion_model_prefix, parameters, weight_dtype and
+        model_config.
+    """
+    header = comfy.utils.load_torch_file_header(path)
+    if header is None:
+        return None
+    sd, metadata = header
+    try:
+        return _model_info_from_state_dict(sd, metadata, checkpoint, model_options)
+    except Exception as e:
+        # Detection of some models looks at tensor values, which the header doesn't have
+        logging.debug("Can't detect the model of {} from its header: {}".format(path, e))
+        return None
+
 def load_checkpoint_guess_config(ckpt_path, output_vae=True, output_clip=True, output_clipvision=False, embedding_directory=None, output_model=True, model_options={}, te_model_options={}):
+    model_info = model_info_from_header(ckpt_path, model_options=model_options)
+    if model_info is False:
+        raise RuntimeError("ERROR: Could not detect model type of: {}\n{}".format(ckpt_path, model_detection_error_hint(ckpt_path, {})))
     sd, metadata = comfy.utils.load_torch_file(ckpt_path, return_metadata=True)
-    out = load_state_dict_guess_config(sd, output_vae, output_clip, output_clipvision, embedding_directory, output_model, model_options, te_model_options=te_model_options, metadata=metadata)
+    out = load_state_dict_guess_config(sd, output_vae, output_clip, output_clipvision, embedding_directory, output_model, model_options, te_model_options=te_model_options, metadata=metadata, model_info=model_info)
     if out is None:
         raise RuntimeError("ERROR: Could not detect model type of: {}\n{}".format(ckpt_path, model_detection_error_hint(ckpt_path, sd)))
     return out
 
-def load_state_dict_guess_config(sd, output_vae=True, output_clip=True, output_clipvision=False, embedding_directory=None, output_model=True, model_options={}, te_model_options={}, metadata=None):
+def load_state_dict_guess_config(sd, output_vae=True, output_clip=True, output_clipvision=False, embedding_directory=None, output_model=True, model_options={}, te_model_options={}, metadata=None, model_info=None):
+    """model_info: detected from the header of the file by model_info_from_header, if not None."""
     clip = None
     clipvision = None
     vae = None
     model = None
     model_patcher = None
 
-    diffusion_model_prefix = model_detection.unet_prefix_from_state_dict(sd)
-    parameters = comfy.utils.calculate_parameters(sd, diffusion_model_prefix)
-    weight_dtype = comfy.utils.weight_dtype(sd, diffusion_model_prefix)
+    if model_info is not None:
+        diffusion_model_prefix = model_info["diffusion_model_prefix"]
+        parameters = model_info["parameters"]
+        weight_dtype = model_info["weight_dtype"]
+    else:
+        diffusion_model_prefix = model_detection.unet_prefix_from_state_dict(sd)
+        parameters = comfy.utils.calculate_parameters(sd, diffusion_model_prefix)
+        weight_dtype = comfy.utils.weight_dtype(sd, diffusion_model_prefix)
     load_device = model_management.get_torch_device()
 
     custom_operations = model_options.get("custom_operations", None)
     if custom_operations is None:
         sd, metadata = comfy.utils.convert_old_quants(sd, diffusion_model_prefix, metadata=metadata)
 
-    model_config = model_detection.model_config_from_unet(sd, diffusion_model_prefix, metadata=metadata)
+    if model_info is not None:
+        model_config = model_info["model_config"]
+    else:
+        model_config = model_detection.model_config_from_unet(sd, diffusion_model_prefix, metadata=metadata)
     if model_config is None:
         logging.warning("Warning, This is not a checkpoint file, trying to load it as a diffusion model only.")
         diffusion_model = load_diffusion_model_state_dict(sd, model_options={})
@@ -1444,7 +1520,7 @@ def load_state_dict_guess_config(sd, output_vae=True, output_clip=True, output_c
     return (model_patcher, clip, vae, clipvision)
 
 
-def load_diffusion_model_state_dict(sd, model_options={}, metadata=None):
+def load_diffusion_model_state_dict(sd, model_options={}, metadata=None, model_info=None):
     """
     Loads a UNet diffusion model from a state dictionary, supporting both diffusers and regular formats.
 
@@ -1454,6 +1530,9 @@ def load_diffusion_model_state_dict(sd, model_options={}, metadata=None):
             - dtype: Override model data type
             - custom_operations: Custom model operations
             - fp8_optimizations: Enable FP8 optimizations
+        metadata (dict, optional): Metadata of the file the state dictionary was loaded from
+        model_info (dict, optional): The model detected from the header of the file by
+            model_info_from_header, so it isn't detected again
 
     Returns:
         ModelPatcher: A wrapped model instance that handles device management and weight loading.
@@ -1477,11 +1556,15 @@ def load_diffusion_model_state_dict(sd, model_options={}, metadata=None):
     custom_operations = model_options.get("custom_operations", None)
     if custom_operations is None:
         sd, metadata = comfy.utils.convert_old_quants(sd, "", metadata=metadata)
-    parameters = comfy.utils.calculate_parameters(sd)
-    weight_dtype = comfy.utils.weight_dtype(sd)
-
     load_device = model_management.get_torch_device()
-    model_config = model_detection.model_config_from_unet(sd, "", metadata=metadata)
+    if model_info is not None:
+        parameters = model_info["parameters"]
+        weight_dtype = model_info["weight_dtype"]
+        model_config = model_info["model_config"]
+    else:
+        parameters = comfy.utils.calculate_parameters(sd)
+        weight_dtype = comfy.utils.weight_dtype(sd)
+        model_config = model_detection.model_config_from_unet(sd, "", metadata=metadata)
 
     if model_config is not None:
         new_sd = sd
@@ -1537,8 +1620,12 @@ def load_diffusion_model_state_dict(sd, model_options={}, metadata=None):
 
 
 def load_diffusion_model(unet_path, model_options={}):
+    model_info = model_info_from_header(unet_path, checkpoint=False, model_options=model_options)
+    if model_info is False:
+        logging.error("ERROR UNSUPPORTED DIFFUSION MODEL {}".format(unet_path))
+        raise RuntimeError("ERROR: Could not detect model type of: {}\n{}".format(unet_path, model_detection_error_hint(unet_path, {})))
     sd, metadata = comfy.utils.load_torch_file(unet_path, return_metadata=True)
-    model = load_diffusion_model_state_dict(sd, model_options=model_options, metadata=metadata)
+    model = load_diffusion_model_state_dict(sd, model_options=model_options, metadata=metadata, model_info=model_info)
     if model is None:
         logging.error("ERROR UNSUPPORTED DIFFUSION MODEL {}".format(unet_path))
         raise RuntimeError("ERROR: Could not detect model type of: {}\n{}".format(unet_path, model_detection_error_hint(unet_path, sd)))
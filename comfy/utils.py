@@ -21,6 +21,7 @@ import torch
 import math
 import struct
 import comfy.checkpoint_pickle
+import comfy.safetensors_loader
 import safetensors.torch
 import numpy as np
 from PIL import Image
@@ -61,15 +62,23 @@ def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False):
     metadata = None
     if ckpt.lower().endswith(".safetensors") or ckpt.lower().endswith(".sft"):
         try:
-            with safetensors.safe_open(ckpt, framework="pt", device=device.type) as f:
-                sd = {}
-                for k in f.keys():
-                    tensor = f.get_tensor(k)
-                    if DISABLE_MMAP:  # TODO: Not sure if this is the best way to bypass the mmap issues
-                        tensor = tensor.to(device=device, copy=True)
-                    sd[k] = tensor
-                if return_metadata:
-                    metadata = f.metadata()
+            sd = None
+            if DISABLE_MMAP or device.type != "cpu":
+                # Read the whole file anyway: do it in parallel, overlapping the copies to the device
+                try:
+                    sd, metadata = comfy.safetensors_loader.load_file(ckpt, device=device)
+                except comfy.safetensors_loader.UnsupportedFile as e:
+                    logging.debug("Loading {} with safetensors: {}".format(ckpt, e))
+            if sd is None:
+                with safetensors.safe_open(ckpt, framework="pt", device=device.type) as f:
+                    sd = {}
+                    for k in f.keys():
+                        tensor = f.get_tensor(k)
+                        if DISABLE_MMAP:  # TODO: Not sure if this is the best way to bypass the mmap issues
+                            tensor = tensor.to(device=device, copy=True)
+                        sd[k] = tensor
+                    if return_metadata:
+                        metadata = f.metadata()
         except Exception as e:
             if len(e.args) > 0:
                 message = e.args[0]
@@ -100,6 +109,25 @@ def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False):
                 sd = pl_sd
     return (sd, metadata) if return_metadata else sd
 
+def load_torch_file_header(ckpt):
+    """
+    Key names, shapes and dtypes of a safetensors file, from its header alone.
+
+    Returns:
+        tuple: (state dict of tensors on the meta device, metadata), or None
+            if ckpt isn't a safetensors file with a readable header. The
+            tensors have no data: enough for model detection, weight_dtype
+            and calculate_parameters without reading any weights.
+    """
+    if not (ckpt.lower().endswith(".safetensors") or ckpt.lower().endswith(".sft")):
+        return None
+    try:
+        tensors, metadata, _ = comfy.safetensors_loader.read_header(ckpt)
+        sd = {k: torch.empty(v["shape"], dtype=comfy.safetensors_loader.DTYPES[v["dtype"]], device="meta") for k, v in tensors.items()}
+    except (OSError, ValueError, KeyError):
+        return None
+    return sd, metadata
+
 def save_torch_file(sd, ckpt, metadata=None):
     if metadata is not None:
         safetensors.torch.save_file(sd, ckpt, metadata=metadata)
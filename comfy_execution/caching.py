@@ -1,5 +1,6 @@
 import bisect
 import gc
+import hashlib
 import itertools
 import psutil
 import time
@@ -46,23 +47,6 @@ class CacheKeySet(ABC):
     def get_subcache_key(self, node_id):
         return self.subcache_keys.get(node_id, None)
 
-class Unhashable:
-    def __init__(self):
-        self.value = float("NaN")
-
-def to_hashable(obj):
-    # So that we don't infinitely recurse since frozenset and tuples
-    # are Sequences.
-    if isinstance(obj, (int, float, str, bool, bytes, type(None))):
-        return obj
-    elif isinstance(obj, Mapping):
-        return frozenset([(to_hashable(k), to_hashable(v)) for k, v in sorted(obj.items())])
-    elif isinstance(obj, Sequence):
-        return frozenset(zip(itertools.count(), [to_hashable(i) for i in obj]))
-    else:
-        # TODO - Support other objects like tensors?
-        return Unhashable()
-
 class CacheKeySetID(CacheKeySet):
     def __init__(self, dynprompt, node_ids, is_changed_cache):
         super().__init__(dynprompt, node_ids, is_changed_cache)
@@ -78,11 +62,73 @@ class CacheKeySetID(CacheKeySet):
             self.keys[node_id] = (node_id, node["class_type"])
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
+class _UnhashableInput(Exception):
+    pass
+
+class UniqueDigest(bytes):
+    """A digest that never matches any other, for nodes whose inputs can't be hashed."""
+    pass
+
+_unique_digest_counter = itertools.count()
+
+def _unique_digest():
+    return UniqueDigest(hashlib.blake2b(b"U%d" % next(_unique_digest_counter), digest_size=20).digest())
+
+def _encode_value(obj, parts):
+    # Unambiguous byte encoding of JSON-like values. Strings and containers are
+    # length prefixed so different values never produce the same bytes.
+    if obj is None:
+        parts.append(b"N")
+    elif isinstance(obj, bool):
+        parts.append(b"T" if obj else b"F")
+    elif isinstance(obj, int):
+        parts.append(b"i%d;" % obj)
+    elif isinstance(obj, float):
+        if obj != obj:
+            # NaN is how IS_CHANGED says "always re-execute"
+            raise _UnhashableInput()
+        parts.append(b"f" + repr(obj).encode() + b";")
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8", "surrogatepass")
+        parts.append(b"s%d:" % len(data))
+        parts.append(data)
+    elif isinstance(obj, bytes):
+        parts.append(b"b%d:" % len(obj))
+        parts.append(obj)
+    elif isinstance(obj, Mapping):
+        parts.append(b"{%d:" % len(obj))
+        try:
+            items = sorted(obj.items())
+        except TypeError:
+            raise _UnhashableInput()
+        for k, v in items:
+            _encode_value(k, parts)
+            _encode_value(v, parts)
+    elif isinstance(obj, Sequence):
+        parts.append(b"[%d:" % len(obj))
+        for item in obj:
+            _encode_value(item, parts)
+    else:
+        raise _UnhashableInput()
+
 class CacheKeySetInputSignature(CacheKeySet):
+    """Keys every node by a content digest of its computation.
+
+    A node's digest covers its class, IS_CHANGED result and constant inputs,
+    and, for linked inputs, the digest of the linked node and output socket.
+    Two nodes get the same key exactly when they compute the same thing from
+    the same upstream graph, whatever their node ids. Each node is digested
+    once, after its parents, so keying a prompt is linear in its size.
+
+    Digests are kept for one prompt only. Reusing them across prompts would
+    need a lookup key covering the node's class and inputs, which costs as
+    much to build as the digest itself.
+    """
     def __init__(self, dynprompt, node_ids, is_changed_cache):
         super().__init__(dynprompt, node_ids, is_changed_cache)
         self.dynprompt = dynprompt
         self.is_changed_cache = is_changed_cache
+        self.digests = {}
 
     def include_node_id_in_input(self) -> bool:
         return False
@@ -98,53 +144,58 @@ class CacheKeySetInputSignature(CacheKeySet):
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
     async def get_node_signature(self, dynprompt, node_id):
-        signature = []
-        ancestors, order_mapping = self.get_ordered_ancestry(dynprompt, node_id)
-        signature.append(await self.get_immediate_node_signature(dynprompt, node_id, order_mapping))
-        for ancestor_id in ancestors:
-            signature.append(await self.get_immediate_node_signature(dynprompt, ancestor_id, order_mapping))
-        return to_hashable(signature)
-
-    async def get_immediate_node_signature(self, dynprompt, node_id, ancestor_order_mapping):
+        # Iterative post-order walk so parents are digested before their children
+        in_progress = set()
+        stack = [(node_id, False)]
+        while stack:
+            current_id, parents_done = stack.pop()
+            if current_id in self.digests:
+                continue
+            if parents_done:
+                self.digests[current_id] = await self.get_immediate_node_signature(dynprompt, current_id)
+                continue
+            if current_id in in_progress:
+                # Cycle; the node is digested once its other parents are done
+                continue
+            in_progress.add(current_id)
+            stack.append((current_id, True))
+            if dynprompt.has_node(current_id):
+                for value in dynprompt.get_node(current_id)["inputs"].values():
+                    if is_link(value) and value[0] not in self.digests:
+                        stack.append((value[0], False))
+        return self.digests[node_id]
+
+    async def get_immediate_node_signature(self, dynprompt, node_id):
         if not dynprompt.has_node(node_id):
             # This node doesn't exist -- we can't cache it.
-            return [float("NaN")]
+            return _unique_digest()
         node = dynprompt.get_node(node_id)
         class_type = node["class_type"]
         class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
-        signature = [class_type, await self.is_changed_cache.get(node_id)]
-        if self.include_node_id_in_input() or (hasattr(class_def, "NOT_IDEMPOTENT") and class_def.NOT_IDEMPOTENT) or include_unique_id_in_input(class_type):
-            signature.append(node_id)
-        inputs = node["inputs"]
-        for key in sorted(inputs.keys()):
-            if is_link(inputs[key]):
-                (ancestor_id, ancestor_socket) = inputs[key]
-                ancestor_index = ancestor_order_mapping[ancestor_id]
-                signature.append((key,("ANCESTOR", ancestor_index, ancestor_socket)))
-            else:
-                signature.append((key, inputs[key]))
-        return signature
-
-    # This function returns a list of all ancestors of the given node. The order of the list is
-    # deterministic based on which specific inputs the ancestor is connected by.
-    def get_ordered_ancestry(self, dynprompt, node_id):
-        ancestors = []
-        order_mapping = {}
-        self.get_ordered_ancestry_internal(dynprompt, node_id, ancestors, order_mapping)
-        return ancestors, order_mapping
-
-    def get_ordered_ancestry_internal(self, dynprompt, node_id, ancestors, order_mapping):
-        if not dynprompt.has_node(node_id):
-            return
-        inputs = dynprompt.get_node(node_id)["inputs"]
-        input_keys = sorted(inputs.keys())
-        for key in input_keys:
-            if is_link(inputs[key]):
-                ancestor_id = inputs[key][0]
-                if ancestor_id not in order_mapping:
-                    ancestors.append(ancestor_id)
-                    order_mapping[ancestor_id] = len(ancestors) - 1
-                    self.get_ordered_ancestry_internal(dynprompt, ancestor_id, ancestors, order_mapping)
+        parts = []
+        try:
+            _encode_value(class_type, parts)
+            _encode_value(await self.is_changed_cache.get(node_id), parts)
+            if self.include_node_id_in_input() or (hasattr(class_def, "NOT_IDEMPOTENT") and class_def.NOT_IDEMPOTENT) or include_unique_id_in_input(class_type):
+                parts.append(b"#")
+                _encode_value(node_id, parts)
+            inputs = node["inputs"]
+            for key in sorted(inputs.keys()):
+                _encode_value(key, parts)
+                if is_link(inputs[key]):
+                    (ancestor_id, ancestor_socket) = inputs[key]
+                    ancestor_digest = self.digests.get(ancestor_id)
+                    if ancestor_digest is None:
+                        return _unique_digest()
+                    parts.append(b"L")
+                    parts.append(ancestor_digest)
+                    _encode_value(ancestor_socket, parts)
+                else:
+                    parts.append(b"V")
+                    _encode_value(inputs[key], parts)
+        except _UnhashableInput:
+            return _unique_digest()
+        return hashlib.blake2b(b"".join(parts), digest_size=20).digest()
 
 class BasicCache:
     def __init__(self, key_class):
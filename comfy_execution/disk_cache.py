@@ -0,0 +1,404 @@
+"""Disk-backed tier for the node output cache.
+
+Node outputs made only of tensors and plain values (numbers, strings, lists,
+tuples and dicts of those) are written to a directory, one safetensors file per
+output, named after the node's input signature digest. After a restart, or
+after the RAM cache evicted an entry, a node with the same signature is loaded
+from disk and promoted back into the RAM cache instead of being executed again.
+The directory is kept under a size limit by evicting the least recently used
+files.
+
+Structure is stored as JSON in the safetensors metadata, so loading an entry
+never unpickles anything.
+
+The file names also cover the ComfyUI version, the serialization format and
+the identity (device, inode, mtime and size) of the model files read by the
+node and its ancestors. Entries written by another version, or computed from
+a checkpoint or LoRA since replaced under the same name, are never loaded and
+age out of the directory as the least recently used.
+
+When several execution workers run in one process, they can share such a tier
+as a MemoryCacheStore instead, so CPU-side outputs computed by one worker are
+reused by the others.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import safetensors
+import safetensors.torch
+import torch
+
+import comfy.model_management
+import folder_paths
+import nodes
+from comfy_execution import worker_pool
+from comfy_execution.caching import HierarchicalCache, UniqueDigest
+from comfy_execution.graph_utils import is_link
+from comfyui_version import __version__
+
+FILE_EXTENSION = ".safetensors"
+METADATA_KEY = "comfy_cache"
+# Bump when the serialized structure changes
+CACHE_FORMAT = 1
+KEY_SALT = f"comfy_cache/{CACHE_FORMAT}/{__version__}".encode()
+
+
+class _NotSerializable(Exception):
+    pass
+
+
+def _encode(obj, tensors, tensor_ids, storages):
+    obj_type = type(obj)
+    if obj is None or obj_type in (bool, int, float, str):
+        return obj
+    if obj_type is torch.Tensor:
+        name = tensor_ids.get(id(obj))
+        if name is None:
+            name = f"t{len(tensors)}"
+            tensor = obj.detach()
+            # safetensors refuses tensors sharing memory, so copy views of one storage
+            storage = (tensor.device, tensor.untyped_storage().data_ptr())
+            if storage in storages:
+                tensor = tensor.clone()
+            storages.add(storage)
+            tensors[name] = tensor
+            tensor_ids[id(obj)] = name
+        return {"__tensor__": name}
+    if obj_type is list:
+        return [_encode(x, tensors, tensor_ids, storages) for x in obj]
+    if obj_type is tuple:
+        return {"__tuple__": [_encode(x, tensors, tensor_ids, storages) for x in obj]}
+    if obj_type is dict and all(type(k) is str for k in obj):
+        return {"__dict__": {k: _encode(v, tensors, tensor_ids, storages) for k, v in obj.items()}}
+    raise _NotSerializable()
+
+
+def _decode(obj, tensors):
+    if isinstance(obj, list):
+        return [_decode(x, tensors) for x in obj]
+    if isinstance(obj, dict):
+        if "__tensor__" in obj:
+            return tensors[obj["__tensor__"]]
+        if "__tuple__" in obj:
+            return tuple(_decode(x, tensors) for x in obj["__tuple__"])
+        return {k: _decode(v, tensors) for k, v in obj["__dict__"].items()}
+    return obj
+
+
+def serialize_entry(entry, max_bytes=None) -> Optional[bytes]:
+    """Serialize a CacheEntry to safetensors bytes.
+
+    Returns None if the entry holds objects other than tensors and plain values,
+    or if its tensors are larger than max_bytes.
+    """
+    tensors = {}
+    try:
+        structure = _encode({"ui": entry.ui, "outputs": entry.outputs}, tensors, {}, set())
+    except _NotSerializable:
+        return None
+    if max_bytes is not None and sum(t.nbytes for t in tensors.values()) > max_bytes:
+        return None
+    devices = {name: str(t.device) for name, t in tensors.items()}
+    tensors = {name: t.to("cpu").contiguous() for name, t in tensors.items()}
+    metadata = {METADATA_KEY: json.dumps({"structure": structure, "devices": devices})}
+    return safetensors.torch.save(tensors, metadata=metadata)
+
+
+def _build_entry(metadata, tensors, entry_type):
+    data = json.loads(metadata[METADATA_KEY])
+    for name, tensor in tensors.items():
+        if data["devices"].get(name, "cpu") != "cpu":
+            # Entries may be shared by workers on different devices, use the current one
+            try:
+                tensors[name] = tensor.to(comfy.model_management.get_torch_device())
+            except (RuntimeError, AssertionError):
+                pass
+    value = _decode(data["structure"], tensors)
+    return entry_type(ui=value["ui"], outputs=value["outputs"])
+
+
+def deserialize_entry(path, entry_type):
+    """Load an entry written by serialize_entry, moving tensors back to the device."""
+    with safetensors.safe_open(path, framework="pt", device="cpu") as f:
+        metadata = f.metadata()
+        tensors = {name: f.get_tensor(name) for name in f.keys()}
+    return _build_entry(metadata, tensors, entry_type)
+
+
+def deserialize_bytes(payload, entry_type):
+    """Like deserialize_entry, for the bytes returned by serialize_entry."""
+    header_size = int.from_bytes(payload[:8], "little")
+    metadata = json.loads(payload[8:8 + header_size])["__metadata__"]
+    return _build_entry(metadata, safetensors.torch.load(payload), entry_type)
+
+
+class DiskCacheStore:
+    """A directory of cache files with a total size limit and LRU eviction."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # file name -> size, least recently used first
+        self.total_bytes = 0
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache")
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(FILE_EXTENSION):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+            self.total_bytes += size
+        logging.info("Disk cache: %d entries, %.1f MB in %s", len(self.entries), self.total_bytes / (1024 * 1024), self.directory)
+
+    def _name(self, key):
+        return key.hex() + FILE_EXTENSION
+
+    def contains(self, key):
+        return self._name(key) in self.entries
+
+    def load(self, key, entry_type):
+        """Return the cached entry for key, or None."""
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        with self.lock:
+            if name not in self.entries:
+                return None
+            self.entries.move_to_end(name)
+        try:
+            entry = deserialize_entry(path, entry_type)
+            os.utime(path)
+            return entry
+        except Exception as e:
+            logging.warning("Disk cache: dropping unreadable entry %s: %s", name, e)
+            self._remove(name)
+            return None
+
+    def save(self, key, payload):
+        """Write payload for key in the background."""
+        if len(payload) > self.max_bytes:
+            return
+        name = self._name(key)
+        with self.lock:
+            if name in self.entries:
+                return
+            # Reserve the name so the entry isn't written twice
+            self.entries[name] = 0
+        self.writer.submit(self._write, name, payload)
+
+    def _write(self, name, payload):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning("Disk cache: could not write %s: %s", name, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self.lock:
+                self.entries.pop(name, None)
+            return
+        with self.lock:
+            self.entries[name] = len(payload)
+            self.total_bytes += len(payload)
+            to_evict = []
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_name, old_size = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+                to_evict.append(old_name)
+        for old_name in to_evict:
+            try:
+                os.remove(os.path.join(self.directory, old_name))
+            except OSError:
+                pass
+
+    def _remove(self, name):
+        with self.lock:
+            size = self.entries.pop(name, None)
+            if size is not None:
+                self.total_bytes -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def flush(self):
+        """Wait for pending writes."""
+        self.writer.submit(lambda: None).result()
+
+
+class MemoryCacheStore:
+    """Serialized entries kept in RAM, with a total size limit and LRU eviction.
+
+    Has the interface of DiskCacheStore. Entries are stored serialized, so
+    the executors of several workers can share one store without sharing
+    tensors, and each load gets tensors on its own device.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> payload, least recently used first
+        self.total_bytes = 0
+
+    def contains(self, key):
+        return key in self.entries
+
+    def load(self, key, entry_type):
+        """Return the cached entry for key, or None."""
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is None:
+                return None
+            self.entries.move_to_end(key)
+        return deserialize_bytes(payload, entry_type)
+
+    def save(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = payload
+            self.total_bytes += len(payload)
+            while self.total_bytes > self.max_bytes:
+                _, old_payload = self.entries.popitem(last=False)
+                self.total_bytes -= len(old_payload)
+
+    def flush(self):
+        pass
+
+
+class DiskCache:
+    """Wraps an output cache, persisting serializable entries in a DiskCacheStore.
+
+    The store may also be a MemoryCacheStore shared between execution workers.
+
+    Entries of output nodes and entries with UI results are not persisted, as
+    they refer to files in the output and temp directories that may not exist
+    after a restart.
+    """
+
+    def __init__(self, ram_cache, store, entry_type):
+        self.ram_cache = ram_cache
+        self.store = store
+        self.entry_type = entry_type
+        self.dynprompt = None
+        self.model_files = {}  # node id -> model files read by the node and its ancestors
+        self.file_identities = {}  # file name -> identities of the files it resolves to
+
+    async def set_prompt(self, dynprompt, node_ids, is_changed_cache):
+        self.dynprompt = dynprompt
+        self.model_files = {}
+        self.file_identities = {}
+        await self.ram_cache.set_prompt(dynprompt, node_ids, is_changed_cache)
+
+    def all_node_ids(self):
+        return self.ram_cache.all_node_ids()
+
+    def clean_unused(self):
+        self.ram_cache.clean_unused()
+
+    def poll(self, **kwargs):
+        self.ram_cache.poll(**kwargs)
+
+    async def ensure_subcache_for(self, node_id, children_ids):
+        return await self.ram_cache.ensure_subcache_for(node_id, children_ids)
+
+    def recursive_debug_dump(self):
+        return self.ram_cache.recursive_debug_dump()
+
+    def _data_key(self, node_id):
+        cache = self.ram_cache
+        if isinstance(cache, HierarchicalCache):
+            cache = cache._get_cache_for(node_id)
+        if cache is None or not cache.initialized:
+            return None
+        key = cache.cache_key_set.get_data_key(node_id)
+        if type(key) is not bytes or isinstance(key, UniqueDigest):
+            return None
+        h = hashlib.blake2b(KEY_SALT, digest_size=20)
+        h.update(key)
+        for name, filename in sorted(self._model_files(node_id)):
+            h.update(repr((name, filename, self._file_identity(filename))).encode())
+        return h.digest()
+
+    def _model_files(self, node_id):
+        # Post-order walk like CacheKeySetInputSignature.get_node_signature
+        in_progress = set()
+        stack = [(node_id, False)]
+        while stack:
+            current_id, parents_done = stack.pop()
+            if current_id in self.model_files:
+                continue
+            node = self.dynprompt.get_node(current_id) if self.dynprompt.has_node(current_id) else None
+            parents = [v[0] for v in node["inputs"].values() if is_link(v)] if node is not None else []
+            if parents_done:
+                files = set(worker_pool.node_model_files(node))
+                for parent_id in parents:
+                    files.update(self.model_files.get(parent_id, ()))
+                self.model_files[current_id] = frozenset(files)
+                continue
+            if current_id in in_progress:
+                continue
+            in_progress.add(current_id)
+            stack.append((current_id, True))
+            stack.extend((parent_id, False) for parent_id in parents if parent_id not in self.model_files)
+        return self.model_files[node_id]
+
+    def _file_identity(self, filename):
+        identity = self.file_identities.get(filename)
+        if identity is None:
+            # The folder a loader reads from isn't known here, so look in all of them
+            identities = set()
+            for folder_name in folder_paths.folder_names_and_paths:
+                path = folder_paths.get_full_path(folder_name, filename)
+                if path is None:
+                    continue
+                try:
+                    identities.add(comfy.model_management.file_identity(path))
+                except OSError:
+                    pass
+            identity = self.file_identities[filename] = tuple(sorted(identities))
+        return identity
+
+    def get(self, node_id):
+        value = self.ram_cache.get(node_id)
+        if value is not None:
+            return value
+        key = self._data_key(node_id)
+        if key is None:
+            return None
+        value = self.store.load(key, self.entry_type)
+        if value is not None:
+            self.ram_cache.set(node_id, value)
+        return value
+
+    def set(self, node_id, value):
+        self.ram_cache.set(node_id, value)
+        key = self._data_key(node_id)
+        if key is None or value.ui or self.store.contains(key):
+            return
+        class_def = nodes.NODE_CLASS_MAPPINGS[self.dynprompt.get_node(node_id)["class_type"]]
+        if getattr(class_def, "OUTPUT_NODE", False):
+            return
+        payload = serialize_entry(value, self.store.max_bytes)
+        if payload is not None:
+            self.store.save(key, payload)
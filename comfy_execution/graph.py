@@ -5,6 +5,7 @@ import nodes
 import asyncio
 import inspect
 from comfy_execution.graph_utils import is_link, ExecutionBlocker
+from comfy_execution import node_schema
 from comfy.comfy_types.node_typing import ComfyNodeABC, InputTypeDict, InputTypeOptions
 
 # NOTE: ExecutionBlocker code got moved to graph_utils.py to prevent torch being imported too soon during unit tests
@@ -78,7 +79,7 @@ def get_input_info(
         tuple[str, str, dict] | tuple[None, None, None]: The input type, category, and extra info for the input name.
     """
 
-    valid_inputs = valid_inputs or class_def.INPUT_TYPES()
+    valid_inputs = valid_inputs or node_schema.input_types(class_def)
     input_info = None
     input_category = None
     if "required" in valid_inputs and input_name in valid_inputs["required"]:
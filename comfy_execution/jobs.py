@@ -1,9 +1,17 @@
 """
 Job utilities for the /api/jobs endpoint.
-Provides normalization and helper functions for job status tracking.
+Provides normalization and helper functions for job status tracking, and the
+indexed history store the endpoint pages through.
 """
 
-from typing import Optional
+import base64
+import bisect
+import heapq
+import json
+import logging
+from collections.abc import Mapping
+from itertools import islice
+from typing import Iterator, Optional
 
 from comfy_api.internal import prune_dict
 
@@ -200,6 +208,190 @@ def apply_sorting(jobs: list[dict], sort_by: str, sort_order: str) -> list[dict]
     return sorted(jobs, key=get_sort_key, reverse=reverse)
 
 
+def job_sort_key(job: dict) -> tuple:
+    """Key ordering jobs by create_time, with the job id breaking ties."""
+    create_time = job.get('create_time', 0)
+    if not isinstance(create_time, (int, float)):
+        create_time = 0
+    return (create_time, job['id'])
+
+
+def encode_cursor(job: dict) -> str:
+    """Opaque cursor pointing just past job in create_time order."""
+    return base64.urlsafe_b64encode(json.dumps(job_sort_key(job)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        create_time, prompt_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(create_time, (int, float)) or not isinstance(prompt_id, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return (create_time, prompt_id)
+
+
+class SortedKeyIndex:
+    """Positional queries over an ascending list of job sort keys."""
+
+    def __init__(self, keys: list[tuple]):
+        self.keys = keys
+
+    def count(self, key: Optional[tuple] = None, inclusive: bool = False) -> int:
+        """Number of keys below key (or equal to it if inclusive), or all keys."""
+        if key is None:
+            return len(self.keys)
+        if inclusive:
+            return bisect.bisect_right(self.keys, key)
+        return bisect.bisect_left(self.keys, key)
+
+    def range(self, start: int, stop: int) -> list[tuple]:
+        """Keys [start, stop) in ascending order."""
+        return self.keys[start:stop]
+
+
+class HistoryStore(Mapping):
+    """
+    Completed prompts keyed by prompt_id, oldest first, bounded to max_size.
+
+    Alongside each history item the store keeps its normalized job summary and
+    indexes of the summaries by status and workflow_id, each sorted by
+    job_sort_key, so a page of jobs costs O(log n + page size) instead of
+    normalizing and sorting the whole history.
+
+    Items are treated as immutable once added: readers get the stored objects
+    without copying, and replacing an item means adding a new one.
+
+    The store isn't thread safe, the prompt queue reads and changes it under
+    its mutex.
+    """
+    thread_safe = False
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size
+        self.clear()
+
+    def clear(self):
+        self.entries: dict[str, dict] = {}
+        self.jobs: dict[str, dict] = {}
+        self.order: list[str] = []
+        self.sorted_by_status: dict[str, list[tuple]] = {JobStatus.COMPLETED: [], JobStatus.FAILED: []}
+        self.sorted_all: list[tuple] = []
+        self.sorted_by_workflow: dict[str, list[tuple]] = {}
+
+    @classmethod
+    def from_items(cls, history: dict) -> 'HistoryStore':
+        store = cls()
+        for prompt_id, history_item in history.items():
+            store.add(prompt_id, history_item)
+        return store
+
+    def __getitem__(self, prompt_id: str) -> dict:
+        return self.entries[prompt_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, prompt_id) -> bool:
+        return prompt_id in self.entries
+
+    def add(self, prompt_id: str, history_item: dict):
+        if prompt_id in self.entries:
+            self.remove(prompt_id)
+        self.entries[prompt_id] = history_item
+        self.order.append(prompt_id)
+        try:
+            job = normalize_history_item(prompt_id, history_item)
+        except Exception as e:
+            logging.warning("History item %s can't be listed as a job: %s", prompt_id, e)
+        else:
+            self.jobs[prompt_id] = job
+            key = job_sort_key(job)
+            bisect.insort(self.sorted_all, key)
+            bisect.insort(self.sorted_by_status[job['status']], key)
+            workflow_id = job.get('workflow_id')
+            if workflow_id is not None:
+                bisect.insort(self.sorted_by_workflow.setdefault(workflow_id, []), key)
+        if self.max_size is not None:
+            while len(self.order) > self.max_size:
+                self.remove(self.order[0])
+
+    def remove(self, prompt_id: str):
+        if self.entries.pop(prompt_id, None) is None:
+            return
+        self.order.remove(prompt_id)
+        job = self.jobs.pop(prompt_id, None)
+        if job is None:
+            return
+        key = job_sort_key(job)
+        indexes = [self.sorted_all, self.sorted_by_status[job['status']]]
+        workflow_id = job.get('workflow_id')
+        if workflow_id is not None:
+            indexes.append(self.sorted_by_workflow[workflow_id])
+        for index in indexes:
+            del index[bisect.bisect_left(index, key)]
+        if workflow_id is not None and not self.sorted_by_workflow[workflow_id]:
+            del self.sorted_by_workflow[workflow_id]
+
+    def page(self, offset: int, max_items: Optional[int]) -> list[str]:
+        """Prompt ids in insertion order, starting at offset."""
+        end = None if max_items is None else offset + max_items
+        return self.order[offset:end]
+
+    def sorted_keys(self, statuses: list[str], workflow_id: Optional[str] = None) -> list[tuple]:
+        """
+        Sort keys of the matching jobs in ascending order.
+
+        Returns one of the store's indexes where possible; it must not be modified.
+        """
+        statuses = [s for s in self.sorted_by_status if s in statuses]
+        if workflow_id is not None:
+            keys = self.sorted_by_workflow.get(workflow_id, [])
+            if len(statuses) < len(self.sorted_by_status):
+                keys = [k for k in keys if self.jobs[k[1]]['status'] in statuses]
+            return keys
+        if len(statuses) == len(self.sorted_by_status):
+            return self.sorted_all
+        if len(statuses) == 1:
+            return self.sorted_by_status[statuses[0]]
+        return []
+
+    def job_index(self, statuses: list[str], workflow_id: Optional[str] = None) -> SortedKeyIndex:
+        """Index of the matching jobs in job_sort_key order."""
+        return SortedKeyIndex(self.sorted_keys(statuses, workflow_id))
+
+    def get_jobs(self, prompt_ids: list[str]) -> dict[str, dict]:
+        """Job summaries of the given prompts, keyed by prompt_id."""
+        return {prompt_id: self.jobs[prompt_id] for prompt_id in prompt_ids}
+
+    def list_jobs(self, statuses: list[str], workflow_id: Optional[str] = None) -> list[dict]:
+        """Job summaries of all matching jobs in job_sort_key order."""
+        return [self.jobs[k[1]] for k in self.sorted_keys(statuses, workflow_id)]
+
+
+def _merged_range(queue_keys: list[tuple], history_index: SortedKeyIndex, start: int, end: int) -> list[tuple]:
+    """
+    Items [start, end) of the ascending merge of the queue keys and a history index.
+
+    The number of merged items before queue key i, i + history_index.count(key),
+    grows with i, so the split point is found by a binary search over the queue.
+    """
+    lo, hi = 0, len(queue_keys)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if mid + history_index.count(queue_keys[mid]) < start:
+            lo = mid + 1
+        else:
+            hi = mid
+    j = start - lo
+    merged = heapq.merge(queue_keys[lo:], history_index.range(j, j + end - start))
+    return list(islice(merged, end - start))
+
+
 def get_job(prompt_id: str, running: list, queued: list, history: dict) -> Optional[dict]:
     """
     Get a single job by prompt_id from history or queue.
@@ -230,62 +422,86 @@ def get_job(prompt_id: str, running: list, queued: list, history: dict) -> Optio
 def get_all_jobs(
     running: list,
     queued: list,
-    history: dict,
+    history: Mapping,
     status_filter: Optional[list[str]] = None,
     workflow_id: Optional[str] = None,
     sort_by: str = "created_at",
     sort_order: str = "desc",
     limit: Optional[int] = None,
-    offset: int = 0
-) -> tuple[list[dict], int]:
+    offset: int = 0,
+    cursor: Optional[str] = None
+) -> tuple[list[dict], int, int]:
     """
     Get all jobs (running, pending, completed) with filtering and sorting.
 
     Args:
         running: List of currently running queue items
         queued: List of pending queue items
-        history: Dict of history items keyed by prompt_id
+        history: HistoryStore (or a store with the same job queries, such as
+            the database backed one), or a dict of history items keyed by prompt_id
         status_filter: List of statuses to include (from JobStatus.ALL)
         workflow_id: Filter by workflow ID
         sort_by: Field to sort by ('created_at', 'execution_duration')
         sort_order: 'asc' or 'desc'
         limit: Maximum number of items to return
         offset: Number of items to skip
+        cursor: Return the items following this cursor (see encode_cursor)
+            instead of skipping offset items. Only valid with 'created_at'.
 
     Returns:
-        tuple: (jobs_list, total_count)
+        tuple: (jobs_list, total_count, offset), where offset is the position
+            of the first returned job, computed from the cursor if given
     """
-    jobs = []
+    if isinstance(history, dict):
+        history = HistoryStore.from_items(history)
 
     if status_filter is None:
         status_filter = JobStatus.ALL
 
+    queue_jobs = []
     if JobStatus.IN_PROGRESS in status_filter:
         for item in running:
-            jobs.append(normalize_queue_item(item, JobStatus.IN_PROGRESS))
+            queue_jobs.append(normalize_queue_item(item, JobStatus.IN_PROGRESS))
 
     if JobStatus.PENDING in status_filter:
         for item in queued:
-            jobs.append(normalize_queue_item(item, JobStatus.PENDING))
-
-    include_completed = JobStatus.COMPLETED in status_filter
-    include_failed = JobStatus.FAILED in status_filter
-    if include_completed or include_failed:
-        for prompt_id, history_item in history.items():
-            is_failed = history_item.get('status', {}).get('status_str') == 'error'
-            if (is_failed and include_failed) or (not is_failed and include_completed):
-                jobs.append(normalize_history_item(prompt_id, history_item))
+            queue_jobs.append(normalize_queue_item(item, JobStatus.PENDING))
 
     if workflow_id:
-        jobs = [j for j in jobs if j.get('workflow_id') == workflow_id]
+        queue_jobs = [j for j in queue_jobs if j.get('workflow_id') == workflow_id]
 
-    jobs = apply_sorting(jobs, sort_by, sort_order)
+    workflow_id = workflow_id or None
 
-    total_count = len(jobs)
-
-    if offset > 0:
-        jobs = jobs[offset:]
-    if limit is not None:
-        jobs = jobs[:limit]
+    if sort_by == 'execution_duration':
+        # No index for durations; sort the already normalized summaries
+        jobs = queue_jobs + history.list_jobs(status_filter, workflow_id)
+        jobs = apply_sorting(jobs, sort_by, sort_order)
+        total_count = len(jobs)
+        end = None if limit is None else offset + limit
+        return (jobs[offset:end], total_count, offset)
+
+    history_index = history.job_index(status_filter, workflow_id)
+    queue_by_key = {job_sort_key(j): j for j in queue_jobs}
+    queue_keys = sorted(queue_by_key)
+    total_count = len(queue_keys) + history_index.count()
+    descending = (sort_order == 'desc')
+
+    if cursor is not None:
+        cursor_key = decode_cursor(cursor)
+        if descending:
+            offset = total_count - bisect.bisect_left(queue_keys, cursor_key) - history_index.count(cursor_key)
+        else:
+            offset = bisect.bisect_right(queue_keys, cursor_key) + history_index.count(cursor_key, inclusive=True)
+
+    count = total_count - offset if limit is None else min(limit, total_count - offset)
+    if count <= 0:
+        return ([], total_count, offset)
+    if descending:
+        start = total_count - offset - count
+        keys = _merged_range(queue_keys, history_index, start, start + count)[::-1]
+    else:
+        keys = _merged_range(queue_keys, history_index, offset, offset + count)
 
-    return (jobs, total_count)
+    history_jobs = history.get_jobs([k[1] for k in keys if k not in queue_by_key])
+    jobs = [queue_by_key[k] if k in queue_by_key else history_jobs[k[1]] for k in keys]
+    return (jobs, total_count, offset)
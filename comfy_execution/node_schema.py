@@ -0,0 +1,109 @@
+"""Memoized node schemas.
+
+INPUT_TYPES of many nodes lists a model folder or the input directory, and it
+is called for every node of every prompt during validation and for every
+class on each GET /object_info. The registry keeps each result together with
+the folder_paths lookups made while computing it, and only recomputes it once
+one of those folders changed.
+
+Custom nodes may read folders without going through folder_paths, so their
+schemas are not memoized.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+import folder_paths
+
+
+def is_memoizable(class_def):
+    # v3 nodes define RELATIVE_PYTHON_MODULE as None until a module loads them
+    return not (getattr(class_def, "RELATIVE_PYTHON_MODULE", None) or "nodes").startswith("custom_nodes.")
+
+
+class NodeSchemaRegistry:
+    def __init__(self):
+        self.entries = {}  # key -> (value, {dependency: stamp})
+        self.object_info = None  # (etag, body, gzipped body)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_current(self, deps, stamps):
+        for dep, stamp in deps.items():
+            if stamps is None:
+                current = folder_paths.dependency_stamp(dep)
+            elif dep in stamps:
+                current = stamps[dep]
+            else:
+                current = stamps[dep] = folder_paths.dependency_stamp(dep)
+            if current != stamp:
+                return False
+        return True
+
+    def memoize(self, key, build, stamps=None):
+        """Return build(), reusing the last result for key if its folders are unchanged.
+
+        Args:
+            key: Cache key, must include the node class
+            build: Computes the value, called with dependency tracking
+            stamps: Optional dict to share dependency stamps between calls
+                that run at the same point in time
+        """
+        entry = self.entries.get(key)
+        if entry is not None and self._is_current(entry[1], stamps):
+            self.hits += 1
+            # Let an enclosing memoize() see the dependencies of this value
+            for dep, stamp in entry[1].items():
+                folder_paths.record_dependency(dep, stamp)
+            return entry[0]
+        self.misses += 1
+        with folder_paths.track_dependencies() as deps:
+            value = build()
+        self.entries[key] = (value, deps)
+        return value
+
+    def input_types(self, class_def):
+        """class_def.INPUT_TYPES(), memoized. The result must not be modified."""
+        if not is_memoizable(class_def):
+            return class_def.INPUT_TYPES()
+        return self.memoize(("input_types", class_def), class_def.INPUT_TYPES)
+
+    def node_info_fragment(self, node_class, class_def, node_info, stamps=None):
+        """Return node_info(node_class) and its JSON encoding as an /object_info member."""
+        def build():
+            info = node_info(node_class)
+            return info, f"{json.dumps(node_class)}: {json.dumps(info)}"
+        if not is_memoizable(class_def):
+            return build()
+        return self.memoize(("node_info", node_class, class_def), build, stamps)
+
+    def object_info_body(self, fragments):
+        """Return (etag, body, gzipped body) for the /object_info members in fragments."""
+        body = ("{" + ", ".join(fragments) + "}").encode("utf-8")
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        with self.lock:
+            if self.object_info is None or self.object_info[0] != etag:
+                self.object_info = (etag, body, gzip.compress(body, compresslevel=6))
+            return self.object_info
+
+    def clear(self):
+        self.entries.clear()
+        self.object_info = None
+
+
+registry = NodeSchemaRegistry()
+
+
+def input_types(class_def):
+    return registry.input_types(class_def)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header, as parsed into entity tags by aiohttp's
+    request.if_none_match, matches etag. Weak tags match too, as RFC 9110
+    asks for If-None-Match.
+    """
+    return any(tag.value == "*" or tag.value == etag for tag in if_none_match or ())
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import threading
 from typing import TypedDict, Dict, Optional, Tuple
 from typing_extensions import override
 from PIL import Image
@@ -319,18 +320,23 @@ class ProgressRegistry:
         for handler in self.handlers.values():
             handler.reset()
 
-# Global registry instance
+# Global registry instance, the one of the prompt started last
 global_progress_registry: ProgressRegistry | None = None
+# Registry of the prompt running on the calling thread, when several
+# execution workers run prompts at the same time
+thread_progress_registry = threading.local()
 
 def reset_progress_state(prompt_id: str, dynprompt: "DynamicPrompt") -> None:
     global global_progress_registry
 
     # Reset existing handlers if registry exists
-    if global_progress_registry is not None:
-        global_progress_registry.reset_handlers()
+    registry = getattr(thread_progress_registry, "registry", None)
+    if registry is not None:
+        registry.reset_handlers()
 
     # Create new registry
     global_progress_registry = ProgressRegistry(prompt_id, dynprompt)
+    thread_progress_registry.registry = global_progress_registry
 
 
 def add_progress_handler(handler: ProgressHandler) -> None:
@@ -341,6 +347,9 @@ def add_progress_handler(handler: ProgressHandler) -> None:
 
 def get_progress_state() -> ProgressRegistry:
     global global_progress_registry
+    registry = getattr(thread_progress_registry, "registry", None)
+    if registry is not None:
+        return registry
     if global_progress_registry is None:
         from comfy_execution.graph import DynamicPrompt
 
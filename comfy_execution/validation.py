@@ -1,4 +1,8 @@
 from __future__ import annotations
+import json
+from collections import OrderedDict
+
+import folder_paths
 from comfy_api.latest import IO
 
 
@@ -57,3 +61,68 @@ def validate_node_input(
     else:
         # In non-strict mode, there must be at least one type in common
         return len(received_types.intersection(input_types)) > 0
+
+
+class ValidationCache:
+    """
+    Remembers nodes that passed validation, so a prompt built from the same
+    workflow only re-validates the nodes whose widget values changed.
+
+    An entry is keyed by node id, class type, widget values and the types of
+    the linked outputs. It stores the widget values as converted during
+    validation, and the folders and files looked up while validating, e.g. the
+    input directory and the image by LoadImage's VALIDATE_INPUTS. The entry is
+    dropped once one of those changed.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.entries: OrderedDict[tuple, tuple[dict, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(unique_id, prompt) -> tuple | None:
+        """Cache key for a node of prompt, or None if the node can't be cached"""
+        node = prompt[unique_id]
+        shape = {}
+        try:
+            for name, value in node["inputs"].items():
+                if isinstance(value, list) and len(value) == 2:
+                    shape[name] = {"__link__": [prompt[value[0]]["class_type"], value[1]]}
+                else:
+                    shape[name] = value
+            return (unique_id, node["class_type"], json.dumps(shape, sort_keys=True))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def get(self, key: tuple) -> dict | None:
+        """Converted widget values of a node that passed validation, or None"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            inputs, deps = entry
+            if all(folder_paths.dependency_stamp(dep) == stamp for dep, stamp in deps.items()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return inputs
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: tuple, inputs: dict, deps: dict):
+        self.entries[key] = (inputs, deps)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.entries),
+        }
@@ -0,0 +1,89 @@
+"""Support for running several execution workers in one server process.
+
+Each worker is a thread with its own PromptExecutor, pinned to one device
+with comfy.model_management.set_thread_torch_device. Workers pull from the
+same PromptQueue; a worker prefers the queued prompts that use the model files
+it ran recently, so checkpoints stay loaded where they are needed instead of
+being loaded on every device.
+"""
+import threading
+from collections import deque
+
+import folder_paths
+
+# Prompt inputs naming a model file, e.g. ckpt_name, lora_name, vae_name
+MODEL_INPUT_SUFFIX = "_name"
+
+
+def node_model_files(node):
+    """Model files a node of a prompt loads, as (input name, file name) pairs."""
+    inputs = node.get("inputs") if isinstance(node, dict) else None
+    if not isinstance(inputs, dict):
+        return frozenset()
+    extensions = tuple(folder_paths.supported_pt_extensions)
+    return frozenset((name, value) for name, value in inputs.items()
+                     if name.endswith(MODEL_INPUT_SUFFIX) and isinstance(value, str) and value.lower().endswith(extensions))
+
+
+def model_files(prompt):
+    """Model files a prompt loads, as (input name, file name) pairs."""
+    files = set()
+    for node in prompt.values():
+        files.update(node_model_files(node))
+    return frozenset(files)
+
+
+class ModelAffinity:
+    """Scores queue items by how many of their model files a worker used recently."""
+
+    def __init__(self, max_prompts=4):
+        self.recent = deque(maxlen=max_prompts)
+
+    def __call__(self, item):
+        files = model_files(item[2])
+        return sum(1 for f in files if any(f in recent for recent in self.recent))
+
+    def update(self, item):
+        self.recent.append(model_files(item[2]))
+
+
+class WorkerServer:
+    """The PromptServer as seen by one execution worker.
+
+    The executor keeps the client and node of the running prompt on the
+    server. Workers running prompts at the same time each keep their own
+    copy of that state; everything else is the shared server. The copies are
+    also published in the server's worker_nodes, so a client reconnecting
+    is told which of its nodes are running.
+    """
+    WORKER_ATTRIBUTES = ("client_id", "last_node_id", "last_prompt_id")
+
+    def __init__(self, server):
+        object.__setattr__(self, "server", server)
+        for name in self.WORKER_ATTRIBUTES:
+            object.__setattr__(self, name, None)
+
+    def __getattr__(self, name):
+        return getattr(self.server, name)
+
+    def __setattr__(self, name, value):
+        if name in self.WORKER_ATTRIBUTES:
+            object.__setattr__(self, name, value)
+            worker_nodes = getattr(self.server, "worker_nodes", None)
+            if worker_nodes is not None:
+                worker_nodes[id(self)] = (self.client_id, self.last_prompt_id, self.last_node_id)
+        else:
+            setattr(self.server, name, value)
+
+
+worker_state = threading.local()
+
+
+def bind_worker_server(server):
+    """Make server the one returned by current_server() on the calling thread."""
+    worker_state.server = server
+
+
+def current_server(default):
+    """The WorkerServer of the calling worker thread, or default."""
+    return getattr(worker_state, "server", default)
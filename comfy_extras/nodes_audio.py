@@ -6,8 +6,8 @@ import torch
 import comfy.model_management
 import folder_paths
 import os
-import hashlib
 import node_helpers
+from app import file_fingerprint
 import logging
 from typing_extensions import override
 from comfy_api.latest import ComfyExtension, IO, UI
@@ -277,10 +277,7 @@ class LoadAudio(IO.ComfyNode):
     @classmethod
     def fingerprint_inputs(cls, audio):
         image_path = folder_paths.get_annotated_filepath(audio)
-        m = hashlib.sha256()
-        with open(image_path, 'rb') as f:
-            m.update(f.read())
-        return m.digest().hex()
+        return file_fingerprint.hash_file(image_path)
 
     @classmethod
     def validate_inputs(cls, audio):
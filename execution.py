@@ -1,18 +1,22 @@
-import copy
+import hashlib
 import heapq
 import inspect
+import json
 import logging
 import sys
 import threading
 import time
 import traceback
+from collections import OrderedDict
 from enum import Enum
 from typing import List, Literal, NamedTuple, Optional, Union
 import asyncio
+import contextlib
 
 import torch
 
 import comfy.model_management
+import folder_paths
 from latent_preview import set_preview_method
 import nodes
 from comfy_execution.caching import (
@@ -24,6 +28,8 @@ from comfy_execution.caching import (
     LRUCache,
     RAMPressureCache,
 )
+from comfy_execution.disk_cache import DiskCache, DiskCacheStore
+from comfy_execution import node_schema
 from comfy_execution.graph import (
     DynamicPrompt,
     ExecutionBlocker,
@@ -31,7 +37,8 @@ from comfy_execution.graph import (
     get_input_info,
 )
 from comfy_execution.graph_utils import GraphBuilder, is_link
-from comfy_execution.validation import validate_node_input
+from comfy_execution.jobs import HistoryStore
+from comfy_execution.validation import ValidationCache, validate_node_input
 from comfy_execution.progress import get_progress_state, reset_progress_state, add_progress_handler, WebUIProgressHandler
 from comfy_execution.utils import CurrentNodeContext
 from comfy_api.internal import _ComfyNodeInternal, _NodeOutputInternal, first_real_override, is_class, make_locked_method_func
@@ -118,6 +125,12 @@ class CacheSet:
         else:
             self.init_classic_cache()
 
+        if cache_type != CacheType.NONE:
+            if cache_args.get("shared_store") is not None:
+                self.outputs = DiskCache(self.outputs, cache_args["shared_store"], CacheEntry)
+            elif cache_args.get("disk"):
+                self.init_disk_cache(cache_args["disk"], cache_args.get("disk_size", 20.0))
+
         self.all = [self.outputs, self.objects]
 
     # Performs like the old cache -- dump data ASAP
@@ -133,6 +146,12 @@ class CacheSet:
         self.outputs = RAMPressureCache(CacheKeySetInputSignature)
         self.objects = HierarchicalCache(CacheKeySetID)
 
+    # Persists serializable outputs so they survive restarts and RAM cache evictions
+    def init_disk_cache(self, directory, max_size_gb):
+        store = DiskCacheStore(directory, int(max_size_gb * 1024 * 1024 * 1024))
+        self.outputs = DiskCache(self.outputs, store, CacheEntry)
+        logging.info("Using disk cache in %s (%.1f GB)", directory, max_size_gb)
+
     def init_null_cache(self):
         self.outputs = NullCache()
         self.objects = NullCache()
@@ -149,7 +168,7 @@ def get_input_data(inputs, class_def, unique_id, execution_list=None, dynprompt=
     is_v3 = issubclass(class_def, _ComfyNodeInternal)
     v3_data: io.V3Data = {}
     hidden_inputs_v3 = {}
-    valid_inputs = class_def.INPUT_TYPES()
+    valid_inputs = node_schema.input_types(class_def)
     if is_v3:
         valid_inputs, hidden, v3_data = _io.get_finalized_class_inputs(valid_inputs, inputs)
     input_data_all = {}
@@ -746,6 +765,8 @@ class PromptExecutor:
                 comfy.model_management.unload_all_models()
 
 
+validation_cache = ValidationCache()
+
 async def validate_inputs(prompt_id, prompt, item, validated):
     unique_id = item
     if unique_id in validated:
@@ -758,17 +779,25 @@ async def validate_inputs(prompt_id, prompt, item, validated):
     errors = []
     valid = True
 
+    # On a cache hit only the links are checked, widget values are known to be valid
+    cache_key = validation_cache.key(unique_id, prompt) if node_schema.is_memoizable(obj_class) else None
+    cached_inputs = validation_cache.get(cache_key) if cache_key is not None else None
+    if cached_inputs is not None:
+        inputs.update(cached_inputs)
+    widget_names = [x for x in inputs if not isinstance(inputs[x], list)]
+
+    with folder_paths.track_dependencies() as validation_deps:
+        class_inputs = node_schema.input_types(obj_class)
+
     v3_data = None
     validate_function_inputs = []
     validate_has_kwargs = False
     if issubclass(obj_class, _ComfyNodeInternal):
         obj_class: _io._ComfyNodeBaseInternal
-        class_inputs = obj_class.INPUT_TYPES()
         class_inputs, _, v3_data = _io.get_finalized_class_inputs(class_inputs, inputs)
         validate_function_name = "validate_inputs"
         validate_function = first_real_override(obj_class, validate_function_name)
     else:
-        class_inputs = obj_class.INPUT_TYPES()
         validate_function_name = "VALIDATE_INPUTS"
         validate_function = getattr(obj_class, validate_function_name, None)
     if validate_function is not None:
@@ -796,6 +825,9 @@ async def validate_inputs(prompt_id, prompt, item, validated):
                 errors.append(error)
             continue
 
+        if cached_inputs is not None and x in cached_inputs:
+            continue
+
         val = inputs[x]
         info = (input_type, extra_info)
         if isinstance(val, list):
@@ -952,7 +984,7 @@ async def validate_inputs(prompt_id, prompt, item, validated):
                         errors.append(error)
                         continue
 
-    if len(validate_function_inputs) > 0 or validate_has_kwargs:
+    if cached_inputs is None and (len(validate_function_inputs) > 0 or validate_has_kwargs):
         input_data_all, _, v3_data = get_input_data(inputs, obj_class, unique_id)
         input_filtered = {}
         for x in input_data_all:
@@ -961,8 +993,10 @@ async def validate_inputs(prompt_id, prompt, item, validated):
         if 'input_types' in validate_function_inputs:
             input_filtered['input_types'] = [received_types]
 
-        ret = await _async_map_node_over_list(prompt_id, unique_id, obj_class, input_filtered, validate_function_name, v3_data=v3_data)
-        ret = await resolve_map_node_over_list_results(ret)
+        with folder_paths.track_dependencies() as function_deps:
+            ret = await _async_map_node_over_list(prompt_id, unique_id, obj_class, input_filtered, validate_function_name, v3_data=v3_data)
+            ret = await resolve_map_node_over_list_results(ret)
+        validation_deps.update(function_deps)
         for x in input_filtered:
             for i, r in enumerate(ret):
                 if r is not True and not isinstance(r, ExecutionBlocker):
@@ -985,6 +1019,8 @@ async def validate_inputs(prompt_id, prompt, item, validated):
         ret = (False, errors, unique_id)
     else:
         ret = (True, [], unique_id)
+        if cache_key is not None and cached_inputs is None:
+            validation_cache.set(cache_key, {x: inputs[x] for x in widget_names}, validation_deps)
 
     validated[unique_id] = ret
     return ret
@@ -1106,32 +1142,240 @@ async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[
 
 MAXIMUM_HISTORY_SIZE = 10000
 
+
+def coalesce_key(prompt, outputs_to_execute, sensitive=None):
+    """
+    Digest of what a prompt computes, used by PromptQueue to coalesce
+    identical prompts.
+
+    Only the class and inputs of each node count, not titles or other
+    metadata. Sensitive data is part of the key so prompts run with
+    different API credentials are never coalesced.
+    """
+    nodes = {node_id: [node.get("class_type"), node.get("inputs")] for node_id, node in prompt.items()}
+    data = json.dumps([nodes, sorted(outputs_to_execute), sensitive or {}], sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode(), digest_size=20).hexdigest()
+
 class PromptQueue:
+    """
+    Queue of prompts waiting to run, the prompts running and the history.
+
+    Queue items are tuples (number, prompt_id, prompt, extra_data,
+    outputs_to_execute, sensitive) and are never modified once queued: the
+    same objects are shared by the queue, the running list, the history and
+    readers, without copying. The heap is ordered by number; queued maps
+    prompt_id to the item so lookups and deletions don't scan the heap.
+    Deleted items stay in the heap until they are popped or compacted away.
+
+    Several execution workers may take prompts from one queue. A worker can
+    pass an affinity function to get() to prefer, among the first queued
+    prompts, the ones it is best placed to run; a prompt passed over
+    AFFINITY_WINDOW times is taken regardless.
+
+    Identical prompts can be coalesced: put() with a coalesce_key attaches a
+    prompt to the queued or running prompt with the same key instead of
+    queuing it. When that prompt finishes, each attached prompt gets a copy
+    of its history entry under its own prompt_id. With coalesce_window set,
+    a prompt is also answered from the history of an identical prompt that
+    succeeded within that many seconds.
+    """
+    AFFINITY_WINDOW = 8
+
     def __init__(self, server):
         self.server = server
         self.mutex = threading.RLock()
         self.not_empty = threading.Condition(self.mutex)
         self.task_counter = 0
         self.queue = []
+        self.queued = {}
         self.currently_running = {}
-        self.history = {}
+        self.running_threads = {}  # prompt_id -> ident of the worker thread running it
+        self.skipped = {}  # prompt_id -> times passed over for a better matching prompt
+        self.history = HistoryStore(MAXIMUM_HISTORY_SIZE)
+        self.job_store = None
         self.flags = {}
+        self.worker_flags = {}  # worker thread ident -> flags, once workers register
+        self.coalesce_window = 0.0
+        self.leaders = {}  # coalesce key -> prompt_id of the queued or running prompt
+        self.leader_keys = {}  # prompt_id -> coalesce key, for the prompts in leaders
+        self.followers = {}  # leader prompt_id -> queue items attached to it
+        self.follower_of = {}  # attached prompt_id -> leader prompt_id
+        self.completed = OrderedDict()  # coalesce key -> (prompt_id, time) of recent successes
+
+    def set_job_store(self, job_store):
+        """
+        Persist the queue and history with job_store (see app.job_store).
+
+        The history is then read from the database, and the prompts that were
+        queued when the server last stopped are queued again. Prompts that were
+        running are added to the history as interrupted.
+        """
+        with self.mutex:
+            self.job_store = job_store
+            self.history = job_store.history(MAXIMUM_HISTORY_SIZE)
+            queued, interrupted = job_store.load_queue()
+            for item in queued:
+                self._push(item)
+            for item in interrupted:
+                status = {
+                    "status_str": "error",
+                    "completed": False,
+                    "messages": [("execution_interrupted", {"prompt_id": item[1], "timestamp": int(time.time() * 1000)})],
+                }
+                self.history.add(item[1], {"prompt": item[:5], "outputs": {}, "status": status})
+                job_store.queue_remove(item[1])
+            if queued:
+                logging.info("Restored %d queued prompts", len(queued))
+            self.server.queue_updated()
+            self.not_empty.notify_all()
+
+    def _push(self, item):
+        heapq.heappush(self.queue, item)
+        self.queued[item[1]] = item
+
+    def _pop(self):
+        while True:
+            item = heapq.heappop(self.queue)
+            # Skip items that were deleted or replaced by a newer put()
+            if self.queued.get(item[1]) is item:
+                del self.queued[item[1]]
+                self.skipped.pop(item[1], None)
+                return item
+
+    def _pop_preferred(self, affinity):
+        candidates = heapq.nsmallest(self.AFFINITY_WINDOW, self.queued.values())
+        head = candidates[0]
+        if self.skipped.get(head[1], 0) >= self.AFFINITY_WINDOW:
+            chosen = head
+        else:
+            # max() keeps the first of equally good items, so ties go by priority
+            chosen = max(candidates, key=affinity)
+        for item in candidates:
+            if item is chosen:
+                break
+            self.skipped[item[1]] = self.skipped.get(item[1], 0) + 1
+        self.skipped.pop(chosen[1], None)
+        if chosen is head:
+            return self._pop()
+        self.queued.pop(chosen[1])
+        self._compact()
+        return chosen
+
+    def _compact(self):
+        if len(self.queue) > 2 * len(self.queued) + 16:
+            self.queue = [x for x in self.queue if self.queued.get(x[1]) is x]
+            heapq.heapify(self.queue)
+
+    def _remove(self, prompt_id):
+        if prompt_id in self.follower_of:
+            followers = self.followers[self.follower_of.pop(prompt_id)]
+            item = next(x for x in followers if x[1] == prompt_id)
+            followers.remove(item)
+        else:
+            item = self.queued.pop(prompt_id, None)
+            if item is None:
+                return None
+            self.skipped.pop(prompt_id, None)
+            self._compact()
+            key = self.leader_keys.pop(prompt_id, None)
+            if key is not None:
+                del self.leaders[key]
+                self._promote(key, self.followers.pop(prompt_id, []))
+        if self.job_store is not None:
+            self.job_store.queue_remove(prompt_id)
+        return item
+
+    def _attach(self, item, leader):
+        self.followers.setdefault(leader, []).append(item)
+        self.follower_of[item[1]] = leader
+        queued = self.queued.get(leader)
+        if queued is not None and item[0] < queued[0]:
+            # The leader runs as soon as the most urgent of its prompts would have
+            raised = (item[0],) + queued[1:]
+            self._push(raised)
+            if self.job_store is not None:
+                self.job_store.queue_put(raised)
+
+    def _promote(self, key, followers):
+        """Queue the first of followers in place of their leader, attach the others to it."""
+        if not followers:
+            return
+        leader = followers[0]
+        self.follower_of.pop(leader[1], None)
+        self._push(leader)
+        self.leaders[key] = leader[1]
+        self.leader_keys[leader[1]] = key
+        for item in followers[1:]:
+            self.follower_of.pop(item[1], None)
+            self._attach(item, leader[1])
+        self.not_empty.notify()
+
+    def _finish_follower(self, item, leader, history_item):
+        # Like the leader's, the stored prompt leaves out the sensitive data
+        follower_item = dict(history_item, prompt=item[:5] + item[6:], coalesced_with=leader)
+        self.history.add(item[1], follower_item)
+        if self.job_store is not None:
+            self.job_store.queue_remove(item[1])
+        self.server.send_coalesced_result(item, follower_item)
+
+    def _recently_completed(self, key):
+        now = time.monotonic()
+        while self.completed:
+            _, finished = next(iter(self.completed.values()))
+            if now - finished <= self.coalesce_window:
+                break
+            self.completed.popitem(last=False)
+        if key in self.completed:
+            prompt_id = self.completed[key][0]
+            if prompt_id in self.history:
+                return prompt_id
+        return None
+
+    def put(self, item, coalesce_key=None):
+        """
+        Queue item, or attach it to an identical prompt when coalesce_key is given.
 
-    def put(self, item):
+        Returns:
+            The prompt_id of the prompt item was attached to, or None if it was queued.
+        """
         with self.mutex:
-            heapq.heappush(self.queue, item)
+            if coalesce_key is not None:
+                leader = self.leaders.get(coalesce_key)
+                if leader is not None:
+                    self._attach(item, leader)
+                    if self.job_store is not None:
+                        self.job_store.queue_put(item)
+                    self.server.queue_updated()
+                    return leader
+                leader = self._recently_completed(coalesce_key)
+                if leader is not None:
+                    self._finish_follower(item, leader, self.history[leader])
+                    self.server.queue_updated()
+                    return leader
+                self.leaders[coalesce_key] = item[1]
+                self.leader_keys[item[1]] = coalesce_key
+            self._push(item)
+            if self.job_store is not None:
+                self.job_store.queue_put(item)
             self.server.queue_updated()
             self.not_empty.notify()
+            return None
 
-    def get(self, timeout=None):
+    def get(self, timeout=None, affinity=None):
         with self.not_empty:
-            while len(self.queue) == 0:
+            while len(self.queued) == 0:
                 self.not_empty.wait(timeout=timeout)
-                if timeout is not None and len(self.queue) == 0:
+                if timeout is not None and len(self.queued) == 0:
                     return None
-            item = heapq.heappop(self.queue)
+            if affinity is None or len(self.queued) == 1:
+                item = self._pop()
+            else:
+                item = self._pop_preferred(affinity)
+            if self.job_store is not None:
+                self.job_store.queue_started(item[1])
             i = self.task_counter
-            self.currently_running[i] = copy.deepcopy(item)
+            self.currently_running[i] = item
+            self.running_threads[item[1]] = threading.get_ident()
             self.task_counter += 1
             self.server.queue_updated()
             return (item, i)
@@ -1145,83 +1389,118 @@ class PromptQueue:
                   status: Optional['PromptQueue.ExecutionStatus'], process_item=None):
         with self.mutex:
             prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
-                self.history.pop(next(iter(self.history)))
+            self.running_threads.pop(prompt[1], None)
 
             status_dict: Optional[dict] = None
             if status is not None:
-                status_dict = copy.deepcopy(status._asdict())
+                # The executor starts a new messages list for each prompt
+                status_dict = status._asdict()
 
             if process_item is not None:
                 prompt = process_item(prompt)
 
-            self.history[prompt[1]] = {
+            history_item = {
                 "prompt": prompt,
                 "outputs": {},
                 'status': status_dict,
             }
-            self.history[prompt[1]].update(history_result)
+            history_item.update(history_result)
+            self.history.add(prompt[1], history_item)
+            if self.job_store is not None:
+                self.job_store.queue_remove(prompt[1])
+
+            key = self.leader_keys.pop(prompt[1], None)
+            if key is not None:
+                del self.leaders[key]
+                followers = self.followers.pop(prompt[1], [])
+                interrupted = status is not None and any(m[0] == "execution_interrupted" for m in status.messages)
+                if interrupted:
+                    # Whoever interrupted the prompt didn't mean to cancel the ones attached to it
+                    self._promote(key, followers)
+                else:
+                    for item in followers:
+                        del self.follower_of[item[1]]
+                        self._finish_follower(item, prompt[1], history_item)
+                    if status is not None and status.status_str == "success" and self.coalesce_window > 0:
+                        self.completed[key] = (prompt[1], time.monotonic())
+                        self.completed.move_to_end(key)
             self.server.queue_updated()
 
-    # Note: slow
     def get_current_queue(self):
-        with self.mutex:
-            out = []
-            for x in self.currently_running.values():
-                out += [x]
-            return (out, copy.deepcopy(self.queue))
+        return self.get_current_queue_volatile()
 
     # read-safe as long as queue items are immutable
     def get_current_queue_volatile(self):
         with self.mutex:
-            running = [x for x in self.currently_running.values()]
-            queued = copy.copy(self.queue)
+            running = list(self.currently_running.values())
+            queued = list(self.queued.values())
+            for followers in self.followers.values():
+                queued.extend(followers)
             return (running, queued)
 
     def get_tasks_remaining(self):
         with self.mutex:
-            return len(self.queue) + len(self.currently_running)
+            return len(self.queued) + len(self.follower_of) + len(self.currently_running)
+
+    def is_running(self, prompt_id):
+        with self.mutex:
+            return prompt_id in self.running_threads
+
+    def get_running_threads(self):
+        """Idents of the worker threads running a prompt, keyed by prompt_id."""
+        with self.mutex:
+            return dict(self.running_threads)
 
     def wipe_queue(self):
         with self.mutex:
             self.queue = []
+            self.queued = {}
+            self.skipped = {}
+            # Prompts attached to a running prompt are still waiting, so they go too
+            self.followers = {}
+            self.follower_of = {}
+            self.leaders = {key: prompt_id for key, prompt_id in self.leaders.items() if prompt_id in self.running_threads}
+            self.leader_keys = {prompt_id: key for key, prompt_id in self.leaders.items()}
+            if self.job_store is not None:
+                self.job_store.queue_clear()
+            self.server.queue_updated()
+
+    def delete_queue_item_by_id(self, prompt_id):
+        with self.mutex:
+            if self._remove(prompt_id) is None:
+                return False
             self.server.queue_updated()
+            return True
 
     def delete_queue_item(self, function):
         with self.mutex:
-            for x in range(len(self.queue)):
-                if function(self.queue[x]):
-                    if len(self.queue) == 1:
-                        self.wipe_queue()
-                    else:
-                        self.queue.pop(x)
-                        heapq.heapify(self.queue)
-                    self.server.queue_updated()
-                    return True
+            for item in self.get_current_queue_volatile()[1]:
+                if function(item):
+                    return self.delete_queue_item_by_id(item[1])
         return False
 
+    def history_reads(self):
+        """Context to read the history in: the mutex, unless the history store does its own locking."""
+        if self.history.thread_safe:
+            return contextlib.nullcontext()
+        return self.mutex
+
     def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
-        with self.mutex:
+        with self.history_reads():
             if prompt_id is None:
                 out = {}
-                i = 0
                 if offset < 0 and max_items is not None:
                     offset = len(self.history) - max_items
-                for k in self.history:
-                    if i >= offset:
-                        p = self.history[k]
-                        if map_function is not None:
-                            p = map_function(p)
-                        out[k] = p
-                        if max_items is not None and len(out) >= max_items:
-                            break
-                    i += 1
+                for k in self.history.page(max(offset, 0), max_items):
+                    p = self.history[k]
+                    if map_function is not None:
+                        p = map_function(p)
+                    out[k] = p
                 return out
             elif prompt_id in self.history:
+                # History items are never modified once stored, so no copy is needed
                 p = self.history[prompt_id]
-                if map_function is None:
-                    p = copy.deepcopy(p)
-                else:
+                if map_function is not None:
                     p = map_function(p)
                 return {prompt_id: p}
             else:
@@ -1229,22 +1508,39 @@ class PromptQueue:
 
     def wipe_history(self):
         with self.mutex:
-            self.history = {}
+            self.history.clear()
 
     def delete_history_item(self, id_to_delete):
         with self.mutex:
-            self.history.pop(id_to_delete, None)
+            self.history.remove(id_to_delete)
+
+    def register_worker(self):
+        """Give the calling worker thread its own copy of the flags set from now on."""
+        with self.mutex:
+            self.worker_flags[threading.get_ident()] = {}
+
+    def worker_count(self):
+        with self.mutex:
+            return len(self.worker_flags)
 
     def set_flag(self, name, data):
         with self.mutex:
-            self.flags[name] = data
-            self.not_empty.notify()
+            if self.worker_flags:
+                for flags in self.worker_flags.values():
+                    flags[name] = data
+            else:
+                self.flags[name] = data
+            self.not_empty.notify_all()
 
     def get_flags(self, reset=True):
         with self.mutex:
+            thread_id = threading.get_ident()
+            flags = self.worker_flags.get(thread_id, self.flags)
             if reset:
-                ret = self.flags
-                self.flags = {}
-                return ret
+                if thread_id in self.worker_flags:
+                    self.worker_flags[thread_id] = {}
+                else:
+                    self.flags = {}
+                return flags
             else:
-                return self.flags.copy()
+                return flags.copy()
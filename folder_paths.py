@@ -4,6 +4,8 @@ import os
 import time
 import mimetypes
 import logging
+import contextvars
+from contextlib import contextmanager
 from typing import Literal, List
 from collections.abc import Collection
 
@@ -89,6 +91,56 @@ class CacheHelper:
 
 cache_helper = CacheHelper()
 
+# Per context so that interleaved coroutines don't record into each other's trackers
+_dependency_trackers: contextvars.ContextVar[tuple[dict, ...]] = contextvars.ContextVar("folder_dependency_trackers", default=())
+
+@contextmanager
+def track_dependencies():
+    """
+    Record the folders looked up while the block runs, e.g. by a node's INPUT_TYPES.
+
+    Yields a dict mapping each dependency to its stamp. Whatever the block
+    computed from the folders is still current as long as dependency_stamp()
+    returns the same stamps.
+    """
+    deps = {}
+    token = _dependency_trackers.set(_dependency_trackers.get() + (deps,))
+    try:
+        yield deps
+    finally:
+        _dependency_trackers.reset(token)
+
+def record_dependency(dep: tuple[str, str], stamp=None) -> None:
+    for deps in _dependency_trackers.get():
+        if dep not in deps:
+            if stamp is None:
+                stamp = dependency_stamp(dep)
+            deps[dep] = stamp
+
+def dependency_stamp(dep: tuple[str, str]):
+    kind, name = dep
+    if kind == "file":
+        try:
+            st = os.stat(name)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    if kind == "filename_list":
+        out = cached_filename_list_(name)
+        # object() never compares equal, so an uncached list is always stale
+        return out[2] if out is not None else object()
+    if kind == "directory":
+        paths = [{"input": input_directory, "output": output_directory, "temp": temp_directory}[name]]
+    else:
+        paths = folder_names_and_paths[name][0] if name in folder_names_and_paths else []
+    stamps = []
+    for path in paths:
+        try:
+            stamps.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            stamps.append((path, None))
+    return tuple(stamps)
+
 extension_mimetypes_cache = {
     "webp" : "image",
     "fbx" : "model",
@@ -119,14 +171,17 @@ def set_input_directory(input_dir: str) -> None:
 
 def get_output_directory() -> str:
     global output_directory
+    record_dependency(("directory", "output"))
     return output_directory
 
 def get_temp_directory() -> str:
     global temp_directory
+    record_dependency(("directory", "temp"))
     return temp_directory
 
 def get_input_directory() -> str:
     global input_directory
+    record_dependency(("directory", "input"))
     return input_directory
 
 def get_user_directory() -> str:
@@ -265,7 +320,10 @@ def get_annotated_filepath(name: str, default_dir: str | None=None) -> str:
         else:
             base_dir = get_input_directory()  # fallback path
 
-    return os.path.join(base_dir, name)
+    filepath = os.path.join(base_dir, name)
+    # A file may change without the mtime of the folder it is listed in changing, e.g. in a subfolder
+    record_dependency(("file", filepath))
+    return filepath
 
 
 def exists_annotated_filepath(name) -> bool:
@@ -275,6 +333,7 @@ def exists_annotated_filepath(name) -> bool:
         base_dir = get_input_directory()  # fallback path
 
     filepath = os.path.join(base_dir, name)
+    record_dependency(("file", filepath))
     return os.path.exists(filepath)
 
 
@@ -298,6 +357,7 @@ def add_model_folder_path(folder_name: str, full_folder_path: str, is_default: b
 
 def get_folder_paths(folder_name: str) -> list[str]:
     folder_name = map_legacy(folder_name)
+    record_dependency(("folder_paths", folder_name))
     return folder_names_and_paths[folder_name][0][:]
 
 def recursive_search(directory: str, excluded_dir_names: list[str] | None=None) -> tuple[list[str], dict[str, float]]:
@@ -423,6 +483,7 @@ def get_filename_list(folder_name: str) -> list[str]:
         global filename_list_cache
         filename_list_cache[folder_name] = out
     cache_helper.set(folder_name, out)
+    record_dependency(("filename_list", folder_name), out[2])
     return list(out[0])
 
 def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0) -> tuple[str, str, int, str, str]:
@@ -1,5 +1,7 @@
 import runpod
 from runpod.serverless.utils import rp_upload
+import asyncio
+import aiohttp
 import json
 import urllib.request
 import urllib.parse
@@ -10,9 +12,17 @@ import base64
 from io import BytesIO
 import websocket
 import uuid
-import tempfile
-import socket
+import threading
+import queue
 import traceback
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # Only importable when the worker runs from the ComfyUI tree (same container)
+    import folder_paths
+except ImportError:
+    folder_paths = None
 
 # Time to wait between API check attempts in milliseconds
 COMFY_API_AVAILABLE_INTERVAL_MS = 50
@@ -26,6 +36,15 @@ COMFY_API_AVAILABLE_MAX_RETRIES = 500
 # If the respective env-vars are not supplied we fall back to sensible defaults ("5" and "3").
 WEBSOCKET_RECONNECT_ATTEMPTS = int(os.environ.get("WEBSOCKET_RECONNECT_ATTEMPTS", 5))
 WEBSOCKET_RECONNECT_DELAY_S = int(os.environ.get("WEBSOCKET_RECONNECT_DELAY_S", 3))
+# Interval in seconds of the keep-alive pings on the worker's persistent websocket
+WEBSOCKET_PING_INTERVAL_S = int(os.environ.get("WEBSOCKET_PING_INTERVAL_S", 20))
+# How long a job waits for ComfyUI to become ready (cold start or restart)
+COMFY_READY_TIMEOUT_S = int(
+    os.environ.get(
+        "COMFY_READY_TIMEOUT_S",
+        COMFY_API_AVAILABLE_MAX_RETRIES * COMFY_API_AVAILABLE_INTERVAL_MS // 1000,
+    )
+)
 
 # Extra verbose websocket trace logs (set WEBSOCKET_TRACE=true to enable)
 if os.environ.get("WEBSOCKET_TRACE", "false").lower() == "true":
@@ -38,6 +57,35 @@ COMFY_HOST = "127.0.0.1:8188"
 # Enforce a clean state after each job is done
 # see https://docs.runpod.io/docs/handler-additional-controls#refresh-worker
 REFRESH_WORKER = os.environ.get("REFRESH_WORKER", "false").lower() == "true"
+# Run the asyncio handler (pooled HTTP session, concurrent transfers). Set
+# ASYNC_HANDLER=false to fall back to the original blocking handler.
+ASYNC_HANDLER = os.environ.get("ASYNC_HANDLER", "true").lower() == "true"
+# Maximum number of concurrent HTTP requests (and pooled connections) to ComfyUI
+# used by the async handler for input uploads and output fetches.
+COMFY_HTTP_CONCURRENCY = int(os.environ.get("COMFY_HTTP_CONCURRENCY", 8))
+# The worker runs in the same container as ComfyUI, so outputs are read straight
+# from ComfyUI's output directory instead of being downloaded through /view.
+# Outputs that cannot be resolved locally still fall back to /view.
+COLOCATED_OUTPUTS = os.environ.get("COLOCATED_OUTPUTS", "true").lower() == "true"
+# Read size used when base64 encoding output files (must be a multiple of 3)
+BASE64_CHUNK_SIZE = 3 * 1024 * 1024
+# S3 output uploads (only used when BUCKET_ENDPOINT_URL is set)
+#   • S3_UPLOAD_WORKERS sets how many outputs are uploaded in parallel.
+#   • Files larger than S3_MULTIPART_THRESHOLD_MB are sent as multipart uploads with
+#     S3_MULTIPART_CHUNK_MB parts, S3_MULTIPART_CONCURRENCY of them in flight per file.
+S3_UPLOAD_WORKERS = int(os.environ.get("S3_UPLOAD_WORKERS", 8))
+S3_MULTIPART_THRESHOLD_MB = int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", 16))
+S3_MULTIPART_CHUNK_MB = int(os.environ.get("S3_MULTIPART_CHUNK_MB", 8))
+S3_MULTIPART_CONCURRENCY = int(os.environ.get("S3_MULTIPART_CONCURRENCY", 4))
+# Concurrent jobs (async handler only)
+#   • MAX_CONCURRENCY is the most jobs the worker accepts at once (1 = one job at a time).
+#   • The worker drops back to one job while ComfyUI has less than
+#     ADMISSION_MIN_FREE_VRAM_MB of VRAM or ADMISSION_MIN_FREE_RAM_MB of RAM free,
+#     checked every ADMISSION_POLL_INTERVAL_S seconds.
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", 1))
+ADMISSION_MIN_FREE_VRAM_MB = int(os.environ.get("ADMISSION_MIN_FREE_VRAM_MB", 512))
+ADMISSION_MIN_FREE_RAM_MB = int(os.environ.get("ADMISSION_MIN_FREE_RAM_MB", 2048))
+ADMISSION_POLL_INTERVAL_S = float(os.environ.get("ADMISSION_POLL_INTERVAL_S", 2))
 
 # ---------------------------------------------------------------------------
 # Helper: quick reachability probe of ComfyUI HTTP endpoint (port 8188)
@@ -56,77 +104,6 @@ def _comfy_server_status():
         return {"reachable": False, "error": str(exc)}
 
 
-def _attempt_websocket_reconnect(ws_url, max_attempts, delay_s, initial_error):
-    """
-    Attempts to reconnect to the WebSocket server after a disconnect.
-
-    Args:
-        ws_url (str): The WebSocket URL (including client_id).
-        max_attempts (int): Maximum number of reconnection attempts.
-        delay_s (int): Delay in seconds between attempts.
-        initial_error (Exception): The error that triggered the reconnect attempt.
-
-    Returns:
-        websocket.WebSocket: The newly connected WebSocket object.
-
-    Raises:
-        websocket.WebSocketConnectionClosedException: If reconnection fails after all attempts.
-    """
-    print(
-        f"worker-comfyui - Websocket connection closed unexpectedly: {initial_error}. Attempting to reconnect..."
-    )
-    last_reconnect_error = initial_error
-    for attempt in range(max_attempts):
-        # Log current server status before each reconnect attempt so that we can
-        # see whether ComfyUI is still alive (HTTP port 8188 responding) even if
-        # the websocket dropped. This is extremely useful to differentiate
-        # between a network glitch and an outright ComfyUI crash/OOM-kill.
-        srv_status = _comfy_server_status()
-        if not srv_status["reachable"]:
-            # If ComfyUI itself is down there is no point in retrying the websocket –
-            # bail out immediately so the caller gets a clear "ComfyUI crashed" error.
-            print(
-                f"worker-comfyui - ComfyUI HTTP unreachable – aborting websocket reconnect: {srv_status.get('error', 'status '+str(srv_status.get('status_code')))}"
-            )
-            raise websocket.WebSocketConnectionClosedException(
-                "ComfyUI HTTP unreachable during websocket reconnect"
-            )
-
-        # Otherwise we proceed with reconnect attempts while server is up
-        print(
-            f"worker-comfyui - Reconnect attempt {attempt + 1}/{max_attempts}... (ComfyUI HTTP reachable, status {srv_status.get('status_code')})"
-        )
-        try:
-            # Need to create a new socket object for reconnect
-            new_ws = websocket.WebSocket()
-            new_ws.connect(ws_url, timeout=10)  # Use existing ws_url
-            print(f"worker-comfyui - Websocket reconnected successfully.")
-            return new_ws  # Return the new connected socket
-        except (
-            websocket.WebSocketException,
-            ConnectionRefusedError,
-            socket.timeout,
-            OSError,
-        ) as reconn_err:
-            last_reconnect_error = reconn_err
-            print(
-                f"worker-comfyui - Reconnect attempt {attempt + 1} failed: {reconn_err}"
-            )
-            if attempt < max_attempts - 1:
-                print(
-                    f"worker-comfyui - Waiting {delay_s} seconds before next attempt..."
-                )
-                time.sleep(delay_s)
-            else:
-                print(f"worker-comfyui - Max reconnection attempts reached.")
-
-    # If loop completes without returning, raise an exception
-    print("worker-comfyui - Failed to reconnect websocket after connection closed.")
-    raise websocket.WebSocketConnectionClosedException(
-        f"Connection closed and failed to reconnect. Last error: {last_reconnect_error}"
-    )
-
-
 def validate_input(job_input):
     """
     Validates the input for the handler function.
@@ -212,6 +189,375 @@ def check_server(url, retries=500, delay=50):
     return False
 
 
+# ---------------------------------------------------------------------------
+# Persistent connection: readiness is tracked once per worker, not per job
+# ---------------------------------------------------------------------------
+
+
+class ComfyConnection:
+    """
+    Long-lived websocket to ComfyUI's /ws endpoint, shared by every job of the worker.
+
+    All prompts are queued with the connection's client_id, so their progress
+    events arrive on this one socket and are routed by prompt_id to the job that
+    registered the prompt. Several jobs can wait on the connection at once.
+
+    ComfyUI's HTTP API is polled once when the connection starts (worker boot).
+    From then on readiness is tracked from the websocket itself: ComfyUI pushes a
+    'status' event as soon as a client connects and whenever its queue changes,
+    keep-alive pings detect a dead server, and a closed socket marks ComfyUI as
+    unavailable until the background thread has reconnected. Checking readiness
+    for a job is therefore a memory lookup.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.client_id = str(uuid.uuid4())
+        self.last_status = None
+        self.last_message_time = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._prompt_events = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}/ws?clientId={self.client_id}"
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        """Start the background thread that keeps the websocket connected."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="comfy-websocket", daemon=True
+            )
+            self._thread.start()
+
+    def wait_ready(self, timeout):
+        """
+        Wait until ComfyUI is reachable.
+
+        Args:
+            timeout (float): Maximum time in seconds to wait.
+
+        Returns:
+            bool: True if ComfyUI is ready, False if the timeout expired.
+        """
+        return self._ready.wait(timeout)
+
+    def register_prompt(self, prompt_id):
+        """
+        Start collecting the websocket events of a prompt.
+
+        Must be called before the prompt is queued so that no event can be missed.
+        """
+        with self._lock:
+            self._prompt_events[prompt_id] = queue.Queue()
+
+    def unregister_prompt(self, prompt_id):
+        """Stop collecting the websocket events of a prompt."""
+        with self._lock:
+            self._prompt_events.pop(prompt_id, None)
+
+    def wait_for_prompt(self, prompt_id, errors, on_executed=None):
+        """
+        Block until ComfyUI reports that a registered prompt finished or failed.
+
+        Args:
+            prompt_id (str): The prompt to wait for (see register_prompt).
+            errors (list): Execution errors are appended to this list.
+            on_executed (callable, optional): Called with the node output of every
+                'executed' event of the prompt, as soon as it arrives.
+
+        Returns:
+            bool: True if execution finished, False if it failed.
+
+        Raises:
+            websocket.WebSocketConnectionClosedException: If ComfyUI went away while waiting.
+        """
+        with self._lock:
+            events = self._prompt_events[prompt_id]
+
+        print(f"worker-comfyui - Waiting for workflow execution ({prompt_id})...")
+        while True:
+            event_type, data = events.get()
+            if event_type == "executing":
+                if data.get("node") is None:
+                    print(f"worker-comfyui - Execution finished for prompt {prompt_id}")
+                    return True
+            elif event_type == "executed":
+                if on_executed:
+                    on_executed(data.get("output"))
+            elif event_type == "execution_error":
+                error_details = f"Node Type: {data.get('node_type')}, Node ID: {data.get('node_id')}, Message: {data.get('exception_message')}"
+                print(f"worker-comfyui - Execution error received: {error_details}")
+                errors.append(f"Workflow execution error: {error_details}")
+                return False
+            elif event_type == "disconnected":
+                finished = self._recover_prompt(prompt_id, errors)
+                if finished is not None:
+                    return finished
+
+    def _recover_prompt(self, prompt_id, errors):
+        """
+        Wait for the websocket to come back after a disconnect and check whether the
+        prompt completed in the meantime, since its events may have been missed.
+
+        Returns:
+            bool: The prompt's outcome if it completed, None if it is still running.
+        """
+        # If ComfyUI itself is down there is no point in waiting for a reconnect –
+        # bail out immediately so the caller gets a clear "ComfyUI crashed" error.
+        srv_status = _comfy_server_status()
+        if not srv_status["reachable"]:
+            print(
+                f"worker-comfyui - ComfyUI HTTP unreachable – aborting websocket reconnect: {srv_status.get('error', 'status '+str(srv_status.get('status_code')))}"
+            )
+            raise websocket.WebSocketConnectionClosedException(
+                "ComfyUI HTTP unreachable during websocket reconnect"
+            )
+
+        if not self.wait_ready(WEBSOCKET_RECONNECT_ATTEMPTS * WEBSOCKET_RECONNECT_DELAY_S):
+            print("worker-comfyui - Failed to reconnect websocket after connection closed.")
+            raise websocket.WebSocketConnectionClosedException(
+                "Connection closed and failed to reconnect."
+            )
+        print("worker-comfyui - Resuming message listening after successful reconnect.")
+
+        prompt_history = get_history(prompt_id).get(prompt_id)
+        if not prompt_history:
+            return None
+        status = prompt_history.get("status") or {}
+        if status.get("status_str") == "error":
+            errors.append(
+                f"Workflow execution error: prompt {prompt_id} failed while the websocket was disconnected"
+            )
+            return False
+        print(f"worker-comfyui - Execution finished for prompt {prompt_id}")
+        return True
+
+    def _run(self):
+        # Cold start: ComfyUI is still loading, poll its HTTP API once for the whole worker
+        check_server(
+            f"http://{self.host}/",
+            COMFY_API_AVAILABLE_MAX_RETRIES,
+            COMFY_API_AVAILABLE_INTERVAL_MS,
+        )
+        while True:
+            app = websocket.WebSocketApp(
+                self.ws_url,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            app.run_forever(
+                ping_interval=WEBSOCKET_PING_INTERVAL_S,
+                ping_timeout=WEBSOCKET_PING_INTERVAL_S / 2,
+            )
+            self._ready.clear()
+            time.sleep(WEBSOCKET_RECONNECT_DELAY_S)
+
+    def _on_message(self, app, message):
+        self.last_message_time = time.time()
+        if not isinstance(message, str):
+            return
+        try:
+            message = json.loads(message)
+        except json.JSONDecodeError:
+            print("worker-comfyui - Received invalid JSON message via websocket.")
+            return
+        event_type = message.get("type")
+        data = message.get("data", {})
+        if event_type == "status":
+            self.last_status = data.get("status", {})
+            if not self._ready.is_set():
+                print("worker-comfyui - ComfyUI is ready (websocket connected)")
+                self._ready.set()
+        elif event_type in ("executing", "executed", "execution_error"):
+            # Route the event to the job waiting for this prompt, if any
+            with self._lock:
+                events = self._prompt_events.get(data.get("prompt_id"))
+            if events is not None:
+                events.put((event_type, data))
+
+    def _on_error(self, app, error):
+        if self._ready.is_set():
+            print(f"worker-comfyui - Websocket error: {error}")
+
+    def _on_close(self, app, close_status_code, close_msg):
+        if self._ready.is_set():
+            print(
+                f"worker-comfyui - Websocket connection to ComfyUI closed ({close_status_code}: {close_msg}). Reconnecting..."
+            )
+        self._ready.clear()
+        # Wake up every waiting job: events sent while disconnected are lost
+        with self._lock:
+            for events in self._prompt_events.values():
+                events.put(("disconnected", None))
+
+
+_comfy_connection = None
+_comfy_connection_lock = threading.Lock()
+
+
+def get_comfy_connection():
+    """Return the worker-wide ComfyConnection, starting it on first use."""
+    global _comfy_connection
+    with _comfy_connection_lock:
+        if _comfy_connection is None:
+            _comfy_connection = ComfyConnection(COMFY_HOST)
+            _comfy_connection.start()
+    return _comfy_connection
+
+
+# ---------------------------------------------------------------------------
+# Admission control: how many jobs this worker accepts at the same time
+# ---------------------------------------------------------------------------
+
+
+class AdmissionController:
+    """
+    Decides how many jobs the worker runs concurrently (RunPod concurrency_modifier).
+
+    Running more than one job lets the next prompt be uploaded, validated and
+    queued in ComfyUI while the current one is sampling, and lets finished
+    outputs upload while the GPU is already busy with the next prompt. The
+    controller admits up to MAX_CONCURRENCY jobs while ComfyUI has memory to
+    spare and its queue is not backed up, and drops back to one job at a time
+    under memory pressure.
+
+    RunPod calls concurrency_modifier from its event loop and drains all
+    in-flight jobs before applying a new value, so the decision is made from a
+    snapshot refreshed by a background thread (/system_stats) and from the queue
+    depth pushed over the persistent websocket, and it only changes when the
+    memory state crosses a threshold (with hysteresis).
+    """
+
+    # Memory must recover to this multiple of the thresholds before admitting more jobs again
+    HYSTERESIS = 1.5
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.system_stats = None
+        self.under_pressure = False
+        self._session = requests.Session()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread that polls /system_stats."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="comfy-admission", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            if self.connection.ready:
+                self.refresh()
+            time.sleep(ADMISSION_POLL_INTERVAL_S)
+
+    def refresh(self):
+        """Fetch /system_stats and update the memory pressure state."""
+        try:
+            response = self._session.get(f"http://{COMFY_HOST}/system_stats", timeout=5)
+            response.raise_for_status()
+            self.system_stats = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"worker-comfyui - Could not fetch system stats: {e}")
+            return
+
+        ram_free = self.system_stats.get("system", {}).get("ram_free")
+        devices = self.system_stats.get("devices") or [{}]
+        vram_free = devices[0].get("vram_free")
+
+        factor = self.HYSTERESIS if self.under_pressure else 1
+        min_ram = ADMISSION_MIN_FREE_RAM_MB * 1024 * 1024 * factor
+        min_vram = ADMISSION_MIN_FREE_VRAM_MB * 1024 * 1024 * factor
+        under_pressure = (ram_free is not None and ram_free < min_ram) or (
+            vram_free is not None and vram_free < min_vram
+        )
+        if under_pressure != self.under_pressure:
+            print(
+                f"worker-comfyui - Memory pressure {'on' if under_pressure else 'off'} (ram_free={ram_free}, vram_free={vram_free})"
+            )
+        self.under_pressure = under_pressure
+
+    def queue_depth(self):
+        """Return the number of prompts running or pending in ComfyUI, if known."""
+        status = self.connection.last_status or {}
+        return status.get("exec_info", {}).get("queue_remaining")
+
+    def concurrency_modifier(self, current_concurrency):
+        """
+        Return the number of jobs the worker should accept concurrently.
+
+        Args:
+            current_concurrency (int): The concurrency currently in effect.
+
+        Returns:
+            int: The new concurrency, between 1 and MAX_CONCURRENCY.
+        """
+        if MAX_CONCURRENCY <= 1:
+            return 1
+        if self.system_stats is None:
+            # No snapshot yet (ComfyUI still starting) - keep what we have
+            return max(1, min(current_concurrency, MAX_CONCURRENCY))
+        if self.under_pressure:
+            return 1
+        queue_depth = self.queue_depth()
+        if queue_depth is not None and queue_depth > MAX_CONCURRENCY:
+            # ComfyUI is backed up with work from other clients, don't add to it
+            return max(1, min(current_concurrency, MAX_CONCURRENCY))
+        return MAX_CONCURRENCY
+
+
+_admission_controller = None
+_admission_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Return the worker-wide AdmissionController, starting it on first use."""
+    global _admission_controller
+    connection = get_comfy_connection()
+    with _admission_controller_lock:
+        if _admission_controller is None:
+            _admission_controller = AdmissionController(connection)
+            _admission_controller.start()
+    return _admission_controller
+
+
+def _decode_image_payload(image):
+    """
+    Decode one entry of the 'images' input into its name and raw bytes.
+
+    Args:
+        image (dict): A dictionary with the 'name' of the image and the 'image' as a base64 encoded string.
+
+    Returns:
+        tuple: (name, blob)
+
+    Raises:
+        binascii.Error: If the base64 data is invalid.
+    """
+    name = image["name"]
+    image_data_uri = image["image"]  # Get the full string (might have prefix)
+
+    # --- Strip Data URI prefix if present ---
+    if "," in image_data_uri:
+        # Find the comma and take everything after it
+        base64_data = image_data_uri.split(",", 1)[1]
+    else:
+        # Assume it's already pure base64
+        base64_data = image_data_uri
+    # --- End strip ---
+
+    return name, base64.b64decode(base64_data)  # Decode the cleaned data
+
+
 def upload_images(images):
     """
     Upload a list of base64 encoded images to the ComfyUI server using the /upload/image endpoint.
@@ -232,19 +578,7 @@ def upload_images(images):
 
     for image in images:
         try:
-            name = image["name"]
-            image_data_uri = image["image"]  # Get the full string (might have prefix)
-
-            # --- Strip Data URI prefix if present ---
-            if "," in image_data_uri:
-                # Find the comma and take everything after it
-                base64_data = image_data_uri.split(",", 1)[1]
-            else:
-                # Assume it's already pure base64
-                base64_data = image_data_uri
-            # --- End strip ---
-
-            blob = base64.b64decode(base64_data)  # Decode the cleaned data
+            name, blob = _decode_image_payload(image)
 
             # Prepare the form data
             files = {
@@ -304,7 +638,10 @@ def get_available_models():
         dict: Dictionary containing available models by type
     """
     try:
-        response = requests.get(f"http://{COMFY_HOST}/object_info", timeout=10)
+        # Only the checkpoint loader is needed, not the full multi-MB node list
+        response = requests.get(
+            f"http://{COMFY_HOST}/object_info/CheckpointLoaderSimple", timeout=10
+        )
         response.raise_for_status()
         object_info = response.json()
 
@@ -325,23 +662,105 @@ def get_available_models():
         return {}
 
 
-def queue_workflow(workflow, client_id, comfy_org_api_key=None):
+def _validation_error_message(response_text):
     """
-    Queue a workflow to be processed by ComfyUI
+    Build a readable error message from the body of a 400 response to POST /prompt.
+
+    Args:
+        response_text (str): The raw response body returned by ComfyUI.
+
+    Returns:
+        str: The error message to surface to the caller.
+    """
+    try:
+        error_data = json.loads(response_text)
+        print(f"worker-comfyui - Parsed error data: {error_data}")
+
+        # Try to extract meaningful error information
+        error_message = "Workflow validation failed"
+        error_details = []
+
+        # ComfyUI seems to return different error formats, let's handle them all
+        if "error" in error_data:
+            error_info = error_data["error"]
+            if isinstance(error_info, dict):
+                error_message = error_info.get("message", error_message)
+                if error_info.get("type") == "prompt_outputs_failed_validation":
+                    error_message = "Workflow validation failed"
+            else:
+                error_message = str(error_info)
+
+        # Check for node validation errors in the response
+        if "node_errors" in error_data:
+            for node_id, node_error in error_data["node_errors"].items():
+                if isinstance(node_error, dict):
+                    for error_type, error_msg in node_error.items():
+                        error_details.append(
+                            f"Node {node_id} ({error_type}): {error_msg}"
+                        )
+                else:
+                    error_details.append(f"Node {node_id}: {node_error}")
+
+        # Check if the error data itself contains validation info
+        if error_data.get("type") == "prompt_outputs_failed_validation":
+            error_message = error_data.get("message", "Workflow validation failed")
+            # For this type of error, we need to parse the validation details from logs
+            # Since ComfyUI doesn't seem to include detailed validation errors in the response
+            # Let's provide a more helpful generic message
+            available_models = get_available_models()
+            if available_models.get("checkpoints"):
+                error_message += "\n\nThis usually means a required model or parameter is not available."
+                error_message += f"\nAvailable checkpoint models: {', '.join(available_models['checkpoints'])}"
+            else:
+                error_message += "\n\nThis usually means a required model or parameter is not available."
+                error_message += "\nNo checkpoint models appear to be available. Please check your model installation."
+
+            return error_message
+
+        # If we have specific validation errors, format them nicely
+        if error_details:
+            detailed_message = f"{error_message}:\n" + "\n".join(
+                f"• {detail}" for detail in error_details
+            )
+
+            # Try to provide helpful suggestions for common errors
+            if any(
+                "not in list" in detail and "ckpt_name" in detail
+                for detail in error_details
+            ):
+                available_models = get_available_models()
+                if available_models.get("checkpoints"):
+                    detailed_message += f"\n\nAvailable checkpoint models: {', '.join(available_models['checkpoints'])}"
+                else:
+                    detailed_message += "\n\nNo checkpoint models appear to be available. Please check your model installation."
+
+            return detailed_message
+
+        # Fallback to the raw response if we can't parse specific errors
+        return f"{error_message}. Raw response: {response_text}"
+
+    except (json.JSONDecodeError, KeyError):
+        # If we can't parse the error response, fall back to the raw text
+        return f"ComfyUI validation failed (could not parse error response): {response_text}"
+
+
+def _build_prompt_payload(workflow, client_id, comfy_org_api_key=None, prompt_id=None):
+    """
+    Build the JSON body for POST /prompt.
 
     Args:
         workflow (dict): A dictionary containing the workflow to be processed
         client_id (str): The client ID for the websocket connection
         comfy_org_api_key (str, optional): Comfy.org API key for API Nodes
+        prompt_id (str, optional): The prompt ID to queue the workflow under
 
     Returns:
-        dict: The JSON response from ComfyUI after processing the workflow
-
-    Raises:
-        ValueError: If the workflow validation fails with detailed error information
+        bytes: The encoded request body
     """
     # Include client_id in the prompt payload
     payload = {"prompt": workflow, "client_id": client_id}
+    if prompt_id:
+        payload["prompt_id"] = prompt_id
 
     # Optionally inject Comfy.org API key for API Nodes.
     # Precedence: per-request key (argument) overrides environment variable.
@@ -351,7 +770,26 @@ def queue_workflow(workflow, client_id, comfy_org_api_key=None):
     effective_key = comfy_org_api_key if comfy_org_api_key else key_from_env
     if effective_key:
         payload["extra_data"] = {"api_key_comfy_org": effective_key}
-    data = json.dumps(payload).encode("utf-8")
+    return json.dumps(payload).encode("utf-8")
+
+
+def queue_workflow(workflow, client_id, comfy_org_api_key=None, prompt_id=None):
+    """
+    Queue a workflow to be processed by ComfyUI
+
+    Args:
+        workflow (dict): A dictionary containing the workflow to be processed
+        client_id (str): The client ID for the websocket connection
+        comfy_org_api_key (str, optional): Comfy.org API key for API Nodes
+        prompt_id (str, optional): The prompt ID to queue the workflow under
+
+    Returns:
+        dict: The JSON response from ComfyUI after processing the workflow
+
+    Raises:
+        ValueError: If the workflow validation fails with detailed error information
+    """
+    data = _build_prompt_payload(workflow, client_id, comfy_org_api_key, prompt_id)
 
     # Use requests for consistency and timeout
     headers = {"Content-Type": "application/json"}
@@ -362,78 +800,7 @@ def queue_workflow(workflow, client_id, comfy_org_api_key=None):
     # Handle validation errors with detailed information
     if response.status_code == 400:
         print(f"worker-comfyui - ComfyUI returned 400. Response body: {response.text}")
-        try:
-            error_data = response.json()
-            print(f"worker-comfyui - Parsed error data: {error_data}")
-
-            # Try to extract meaningful error information
-            error_message = "Workflow validation failed"
-            error_details = []
-
-            # ComfyUI seems to return different error formats, let's handle them all
-            if "error" in error_data:
-                error_info = error_data["error"]
-                if isinstance(error_info, dict):
-                    error_message = error_info.get("message", error_message)
-                    if error_info.get("type") == "prompt_outputs_failed_validation":
-                        error_message = "Workflow validation failed"
-                else:
-                    error_message = str(error_info)
-
-            # Check for node validation errors in the response
-            if "node_errors" in error_data:
-                for node_id, node_error in error_data["node_errors"].items():
-                    if isinstance(node_error, dict):
-                        for error_type, error_msg in node_error.items():
-                            error_details.append(
-                                f"Node {node_id} ({error_type}): {error_msg}"
-                            )
-                    else:
-                        error_details.append(f"Node {node_id}: {node_error}")
-
-            # Check if the error data itself contains validation info
-            if error_data.get("type") == "prompt_outputs_failed_validation":
-                error_message = error_data.get("message", "Workflow validation failed")
-                # For this type of error, we need to parse the validation details from logs
-                # Since ComfyUI doesn't seem to include detailed validation errors in the response
-                # Let's provide a more helpful generic message
-                available_models = get_available_models()
-                if available_models.get("checkpoints"):
-                    error_message += f"\n\nThis usually means a required model or parameter is not available."
-                    error_message += f"\nAvailable checkpoint models: {', '.join(available_models['checkpoints'])}"
-                else:
-                    error_message += "\n\nThis usually means a required model or parameter is not available."
-                    error_message += "\nNo checkpoint models appear to be available. Please check your model installation."
-
-                raise ValueError(error_message)
-
-            # If we have specific validation errors, format them nicely
-            if error_details:
-                detailed_message = f"{error_message}:\n" + "\n".join(
-                    f"• {detail}" for detail in error_details
-                )
-
-                # Try to provide helpful suggestions for common errors
-                if any(
-                    "not in list" in detail and "ckpt_name" in detail
-                    for detail in error_details
-                ):
-                    available_models = get_available_models()
-                    if available_models.get("checkpoints"):
-                        detailed_message += f"\n\nAvailable checkpoint models: {', '.join(available_models['checkpoints'])}"
-                    else:
-                        detailed_message += "\n\nNo checkpoint models appear to be available. Please check your model installation."
-
-                raise ValueError(detailed_message)
-            else:
-                # Fallback to the raw response if we can't parse specific errors
-                raise ValueError(f"{error_message}. Raw response: {response.text}")
-
-        except (json.JSONDecodeError, KeyError) as e:
-            # If we can't parse the error response, fall back to the raw text
-            raise ValueError(
-                f"ComfyUI validation failed (could not parse error response): {response.text}"
-            )
+        raise ValueError(_validation_error_message(response.text))
 
     # For other HTTP errors, raise them normally
     response.raise_for_status()
@@ -492,279 +859,542 @@ def get_image_data(filename, subfolder, image_type):
         return None
 
 
-def handler(job):
+def _collect_output_images(outputs, errors):
     """
-    Handles a job using ComfyUI via websockets for status and image retrieval.
+    Flatten the history outputs into the list of images that should be returned.
 
     Args:
-        job (dict): A dictionary containing job details and input parameters.
+        outputs (dict): The 'outputs' section of the prompt history.
+        errors (list): Warnings about skipped images are appended to this list.
 
     Returns:
-        dict: A dictionary containing either an error message or a success status with generated images.
+        list: A list of (filename, subfolder, image_type) tuples.
     """
-    job_input = job["input"]
-    job_id = job["id"]
+    images = []
+    print(f"worker-comfyui - Processing {len(outputs)} output nodes...")
+    for node_id, node_output in outputs.items():
+        if "images" in node_output:
+            print(
+                f"worker-comfyui - Node {node_id} contains {len(node_output['images'])} image(s)"
+            )
+            for image_info in node_output["images"]:
+                filename = image_info.get("filename")
+                subfolder = image_info.get("subfolder", "")
+                img_type = image_info.get("type")
 
-    # Make sure that the input is valid
-    validated_data, error_message = validate_input(job_input)
-    if error_message:
-        return {"error": error_message}
+                # skip temp images
+                if img_type == "temp":
+                    print(
+                        f"worker-comfyui - Skipping image {filename} because type is 'temp'"
+                    )
+                    continue
 
-    # Extract validated data
-    workflow = validated_data["workflow"]
-    input_images = validated_data.get("images")
+                if not filename:
+                    warn_msg = f"Skipping image in node {node_id} due to missing filename: {image_info}"
+                    print(f"worker-comfyui - {warn_msg}")
+                    errors.append(warn_msg)
+                    continue
 
-    # Make sure that the ComfyUI HTTP API is available before proceeding
-    if not check_server(
-        f"http://{COMFY_HOST}/",
-        COMFY_API_AVAILABLE_MAX_RETRIES,
-        COMFY_API_AVAILABLE_INTERVAL_MS,
-    ):
-        return {
-            "error": f"ComfyUI server ({COMFY_HOST}) not reachable after multiple retries."
-        }
+                images.append((filename, subfolder, img_type))
 
-    # Upload input images if they exist
-    if input_images:
-        upload_result = upload_images(input_images)
-        if upload_result["status"] == "error":
-            # Return upload errors
-            return {
-                "error": "Failed to upload one or more input images",
-                "details": upload_result["details"],
-            }
+        # Check for other output types
+        other_keys = [k for k in node_output.keys() if k != "images"]
+        if other_keys:
+            warn_msg = f"Node {node_id} produced unhandled output keys: {other_keys}."
+            print(f"worker-comfyui - WARNING: {warn_msg}")
+            print(
+                "worker-comfyui - --> If this output is useful, please consider opening an issue on GitHub to discuss adding support."
+            )
+    return images
 
-    ws = None
-    client_id = str(uuid.uuid4())
-    prompt_id = None
-    output_data = []
-    errors = []
 
-    try:
-        # Establish WebSocket connection
-        ws_url = f"ws://{COMFY_HOST}/ws?clientId={client_id}"
-        print(f"worker-comfyui - Connecting to websocket: {ws_url}")
-        ws = websocket.WebSocket()
-        ws.connect(ws_url, timeout=10)
-        print(f"worker-comfyui - Websocket connected")
+def _resolve_local_output_path(filename, subfolder, image_type):
+    """
+    Resolve an output to its path on disk, applying the same checks as the /view endpoint.
 
-        # Queue the workflow
-        try:
-            # Pass per-request API key if provided in input
-            queued_workflow = queue_workflow(
-                workflow,
-                client_id,
-                comfy_org_api_key=validated_data.get("comfy_org_api_key"),
-            )
-            prompt_id = queued_workflow.get("prompt_id")
-            if not prompt_id:
-                raise ValueError(
-                    f"Missing 'prompt_id' in queue response: {queued_workflow}"
-                )
-            print(f"worker-comfyui - Queued workflow with ID: {prompt_id}")
-        except requests.RequestException as e:
-            print(f"worker-comfyui - Error queuing workflow: {e}")
-            raise ValueError(f"Error queuing workflow: {e}")
-        except Exception as e:
-            print(f"worker-comfyui - Unexpected error queuing workflow: {e}")
-            # For ValueError exceptions from queue_workflow, pass through the original message
-            if isinstance(e, ValueError):
-                raise e
-            else:
-                raise ValueError(f"Unexpected error queuing workflow: {e}")
+    Args:
+        filename (str): The filename of the image.
+        subfolder (str): The subfolder where the image is stored.
+        image_type (str): The type of the image (e.g., 'output').
 
-        # Wait for execution completion via WebSocket
-        print(f"worker-comfyui - Waiting for workflow execution ({prompt_id})...")
-        execution_done = False
-        while True:
-            try:
-                out = ws.recv()
-                if isinstance(out, str):
-                    message = json.loads(out)
-                    if message.get("type") == "status":
-                        status_data = message.get("data", {}).get("status", {})
-                        print(
-                            f"worker-comfyui - Status update: {status_data.get('exec_info', {}).get('queue_remaining', 'N/A')} items remaining in queue"
-                        )
-                    elif message.get("type") == "executing":
-                        data = message.get("data", {})
-                        if (
-                            data.get("node") is None
-                            and data.get("prompt_id") == prompt_id
-                        ):
-                            print(
-                                f"worker-comfyui - Execution finished for prompt {prompt_id}"
-                            )
-                            execution_done = True
-                            break
-                    elif message.get("type") == "execution_error":
-                        data = message.get("data", {})
-                        if data.get("prompt_id") == prompt_id:
-                            error_details = f"Node Type: {data.get('node_type')}, Node ID: {data.get('node_id')}, Message: {data.get('exception_message')}"
-                            print(
-                                f"worker-comfyui - Execution error received: {error_details}"
-                            )
-                            errors.append(f"Workflow execution error: {error_details}")
-                            break
-                else:
-                    continue
-            except websocket.WebSocketTimeoutException:
-                print(f"worker-comfyui - Websocket receive timed out. Still waiting...")
-                continue
-            except websocket.WebSocketConnectionClosedException as closed_err:
-                try:
-                    # Attempt to reconnect
-                    ws = _attempt_websocket_reconnect(
-                        ws_url,
-                        WEBSOCKET_RECONNECT_ATTEMPTS,
-                        WEBSOCKET_RECONNECT_DELAY_S,
-                        closed_err,
-                    )
+    Returns:
+        str: The absolute path of the file, or None if it can't be read locally.
+    """
+    if folder_paths is None:
+        return None
 
-                    print(
-                        "worker-comfyui - Resuming message listening after successful reconnect."
-                    )
-                    continue
-                except (
-                    websocket.WebSocketConnectionClosedException
-                ) as reconn_failed_err:
-                    # If _attempt_websocket_reconnect fails, it raises this exception
-                    # Let this exception propagate to the outer handler's except block
-                    raise reconn_failed_err
+    # validation for security: prevent accessing arbitrary path
+    if not filename or filename[0] == "/" or ".." in filename:
+        return None
 
-            except json.JSONDecodeError:
-                print(f"worker-comfyui - Received invalid JSON message via websocket.")
+    output_dir = folder_paths.get_directory_by_type(image_type or "output")
+    if output_dir is None:
+        return None
+    output_dir = os.path.abspath(output_dir)
 
-        if not execution_done and not errors:
-            raise ValueError(
-                "Workflow monitoring loop exited without confirmation of completion or error."
-            )
+    if subfolder:
+        full_output_dir = os.path.abspath(os.path.join(output_dir, subfolder))
+        if os.path.commonpath((full_output_dir, output_dir)) != output_dir:
+            return None
+        output_dir = full_output_dir
 
-        # Fetch history even if there were execution errors, some outputs might exist
-        print(f"worker-comfyui - Fetching history for prompt {prompt_id}...")
-        history = get_history(prompt_id)
+    file_path = os.path.join(output_dir, os.path.basename(filename))
+    if not os.path.isfile(file_path):
+        return None
+    return file_path
 
-        if prompt_id not in history:
-            error_msg = f"Prompt ID {prompt_id} not found in history after execution."
-            print(f"worker-comfyui - {error_msg}")
-            if not errors:
-                return {"error": error_msg}
-            else:
-                errors.append(error_msg)
-                return {
-                    "error": "Job processing failed, prompt ID not found in history.",
-                    "details": errors,
-                }
-
-        prompt_history = history.get(prompt_id, {})
-        outputs = prompt_history.get("outputs", {})
-
-        if not outputs:
-            warning_msg = f"No outputs found in history for prompt {prompt_id}."
-            print(f"worker-comfyui - {warning_msg}")
-            if not errors:
-                errors.append(warning_msg)
-
-        print(f"worker-comfyui - Processing {len(outputs)} output nodes...")
-        for node_id, node_output in outputs.items():
-            if "images" in node_output:
-                print(
-                    f"worker-comfyui - Node {node_id} contains {len(node_output['images'])} image(s)"
+
+def _encode_file_base64(file_path):
+    """
+    Base64 encode a file in chunks so the raw file is never held in memory as a whole.
+
+    Args:
+        file_path (str): The file to encode.
+
+    Returns:
+        str: The base64 encoded file contents.
+    """
+    parts = []
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(BASE64_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts.append(base64.b64encode(chunk).decode("utf-8"))
+    return "".join(parts)
+
+
+def _deliver_file(job_id, filename, file_path):
+    """
+    Return an output file that is readable on local disk as a base64 output entry.
+
+    Unlike _deliver_image this needs no HTTP round-trip through /view.
+
+    Args:
+        job_id (str): The RunPod job ID.
+        filename (str): The filename of the image.
+        file_path (str): The path of the output file.
+
+    Returns:
+        tuple: (output_entry, error_message) - exactly one of them is None.
+    """
+    try:
+        base64_image = _encode_file_base64(file_path)
+        print(f"worker-comfyui - Encoded {filename} as base64 from {file_path}")
+        return {"filename": filename, "type": "base64", "data": base64_image}, None
+    except Exception as e:
+        error_msg = f"Error encoding {filename} to base64: {e}"
+        print(f"worker-comfyui - {error_msg}")
+        return None, error_msg
+
+
+def _deliver_output(job_id, filename, subfolder, img_type):
+    """
+    Return one output as base64, reading it from disk when co-located and through /view otherwise.
+
+    Returns:
+        tuple: (output_entry, error_message) - exactly one of them is None.
+    """
+    if COLOCATED_OUTPUTS:
+        file_path = _resolve_local_output_path(filename, subfolder, img_type)
+        if file_path:
+            return _deliver_file(job_id, filename, file_path)
+
+    image_bytes = get_image_data(filename, subfolder, img_type)
+    if not image_bytes:
+        return None, f"Failed to fetch image data for {filename} from /view endpoint."
+    return _deliver_image(job_id, filename, image_bytes)
+
+
+def _deliver_image(job_id, filename, image_bytes):
+    """
+    Return fetched image bytes as a base64 output entry.
+
+    Args:
+        job_id (str): The RunPod job ID.
+        filename (str): The filename of the image.
+        image_bytes (bytes): The raw image data.
+
+    Returns:
+        tuple: (output_entry, error_message) - exactly one of them is None.
+    """
+    try:
+        base64_image = base64.b64encode(image_bytes).decode("utf-8")
+        print(f"worker-comfyui - Encoded {filename} as base64")
+        # Return dictionary with filename and base64 data
+        return {"filename": filename, "type": "base64", "data": base64_image}, None
+    except Exception as e:
+        error_msg = f"Error encoding {filename} to base64: {e}"
+        print(f"worker-comfyui - {error_msg}")
+        return None, error_msg
+
+
+# ---------------------------------------------------------------------------
+# S3 output uploads: shared worker pool, multipart transfers for large files
+# ---------------------------------------------------------------------------
+
+_s3_client = None
+_s3_transfer_config = None
+_s3_executor = None
+_s3_lock = threading.Lock()
+
+
+def _get_s3_client():
+    """
+    Return the worker-wide boto3 client and transfer config, creating them on first use.
+
+    boto3 clients are thread-safe, so one client (and its connection pool) is shared
+    by all upload threads and all jobs of this worker.
+
+    Returns:
+        tuple: (client, transfer_config) - client is None if no bucket credentials are set.
+    """
+    global _s3_client, _s3_transfer_config
+    with _s3_lock:
+        if _s3_transfer_config is None:
+            from boto3 import session
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+
+            _s3_transfer_config = TransferConfig(
+                multipart_threshold=S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+                multipart_chunksize=S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+                max_concurrency=S3_MULTIPART_CONCURRENCY,
+                use_threads=True,
+            )
+
+            endpoint_url = os.environ.get("BUCKET_ENDPOINT_URL")
+            access_key_id = os.environ.get("BUCKET_ACCESS_KEY_ID")
+            secret_access_key = os.environ.get("BUCKET_SECRET_ACCESS_KEY")
+            if endpoint_url and access_key_id and secret_access_key:
+                boto_config = Config(
+                    signature_version="s3v4",
+                    retries={"max_attempts": 3, "mode": "standard"},
+                    # Every upload thread may run S3_MULTIPART_CONCURRENCY part uploads
+                    max_pool_connections=S3_UPLOAD_WORKERS * S3_MULTIPART_CONCURRENCY,
                 )
-                for image_info in node_output["images"]:
-                    filename = image_info.get("filename")
-                    subfolder = image_info.get("subfolder", "")
-                    img_type = image_info.get("type")
-
-                    # skip temp images
-                    if img_type == "temp":
-                        print(
-                            f"worker-comfyui - Skipping image {filename} because type is 'temp'"
-                        )
-                        continue
-
-                    if not filename:
-                        warn_msg = f"Skipping image in node {node_id} due to missing filename: {image_info}"
-                        print(f"worker-comfyui - {warn_msg}")
-                        errors.append(warn_msg)
-                        continue
-
-                    image_bytes = get_image_data(filename, subfolder, img_type)
-
-                    if image_bytes:
-                        file_extension = os.path.splitext(filename)[1] or ".png"
-
-                        if os.environ.get("BUCKET_ENDPOINT_URL"):
-                            try:
-                                with tempfile.NamedTemporaryFile(
-                                    suffix=file_extension, delete=False
-                                ) as temp_file:
-                                    temp_file.write(image_bytes)
-                                    temp_file_path = temp_file.name
-                                print(
-                                    f"worker-comfyui - Wrote image bytes to temporary file: {temp_file_path}"
-                                )
-
-                                print(f"worker-comfyui - Uploading {filename} to S3...")
-                                s3_url = rp_upload.upload_image(job_id, temp_file_path)
-                                os.remove(temp_file_path)  # Clean up temp file
-                                print(
-                                    f"worker-comfyui - Uploaded {filename} to S3: {s3_url}"
-                                )
-                                # Append dictionary with filename and URL
-                                output_data.append(
-                                    {
-                                        "filename": filename,
-                                        "type": "s3_url",
-                                        "data": s3_url,
-                                    }
-                                )
-                            except Exception as e:
-                                error_msg = f"Error uploading {filename} to S3: {e}"
-                                print(f"worker-comfyui - {error_msg}")
-                                errors.append(error_msg)
-                                if "temp_file_path" in locals() and os.path.exists(
-                                    temp_file_path
-                                ):
-                                    try:
-                                        os.remove(temp_file_path)
-                                    except OSError as rm_err:
-                                        print(
-                                            f"worker-comfyui - Error removing temp file {temp_file_path}: {rm_err}"
-                                        )
-                        else:
-                            # Return as base64 string
-                            try:
-                                base64_image = base64.b64encode(image_bytes).decode(
-                                    "utf-8"
-                                )
-                                # Append dictionary with filename and base64 data
-                                output_data.append(
-                                    {
-                                        "filename": filename,
-                                        "type": "base64",
-                                        "data": base64_image,
-                                    }
-                                )
-                                print(f"worker-comfyui - Encoded {filename} as base64")
-                            except Exception as e:
-                                error_msg = f"Error encoding {filename} to base64: {e}"
-                                print(f"worker-comfyui - {error_msg}")
-                                errors.append(error_msg)
-                    else:
-                        error_msg = f"Failed to fetch image data for {filename} from /view endpoint."
-                        errors.append(error_msg)
-
-            # Check for other output types
-            other_keys = [k for k in node_output.keys() if k != "images"]
-            if other_keys:
-                warn_msg = (
-                    f"Node {node_id} produced unhandled output keys: {other_keys}."
+                _s3_client = session.Session().client(
+                    "s3",
+                    endpoint_url=endpoint_url,
+                    aws_access_key_id=access_key_id,
+                    aws_secret_access_key=secret_access_key,
+                    config=boto_config,
+                    region_name=rp_upload.extract_region_from_url(endpoint_url),
                 )
-                print(f"worker-comfyui - WARNING: {warn_msg}")
-                print(
-                    f"worker-comfyui - --> If this output is useful, please consider opening an issue on GitHub to discuss adding support."
+    return _s3_client, _s3_transfer_config
+
+
+def _get_s3_executor():
+    """Return the worker-wide thread pool used for S3 uploads."""
+    global _s3_executor
+    with _s3_lock:
+        if _s3_executor is None:
+            _s3_executor = ThreadPoolExecutor(
+                max_workers=S3_UPLOAD_WORKERS, thread_name_prefix="s3-upload"
+            )
+    return _s3_executor
+
+
+def upload_output_to_s3(job_id, filename, file_path=None, data=None):
+    """
+    Upload one output file to the bucket and return a presigned URL for it.
+
+    Files above S3_MULTIPART_THRESHOLD_MB are sent as multipart uploads with
+    S3_MULTIPART_CONCURRENCY parts in flight. Objects are stored under
+    '<job_id>/<random>.<ext>' in BUCKET_NAME (default: the current 'MM-YY'), the
+    same layout rp_upload.upload_image uses.
+
+    Args:
+        job_id (str): The RunPod job ID (used as the key prefix).
+        filename (str): The filename of the output, used for extension and content type.
+        file_path (str, optional): The path of the output file on disk.
+        data (bytes, optional): The output bytes, if the file isn't readable locally.
+
+    Returns:
+        str: The presigned URL (or local path if no bucket credentials are configured).
+    """
+    file_extension = os.path.splitext(filename)[1] or ".png"
+    object_name = f"{str(uuid.uuid4())[:8]}{file_extension}"
+
+    client, transfer_config = _get_s3_client()
+    if client is None:
+        # No credentials: keep rp_upload's behaviour of simulating the upload locally
+        if file_path:
+            return rp_upload.upload_image(job_id, file_path)
+        return rp_upload.upload_in_memory_object(object_name, data, prefix=job_id)
+
+    bucket = os.environ.get("BUCKET_NAME") or time.strftime("%m-%y")
+    key = f"{job_id}/{object_name}"
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    extra_args = {"ContentType": content_type}
+
+    if file_path:
+        client.upload_file(
+            file_path, bucket, key, ExtraArgs=extra_args, Config=transfer_config
+        )
+    else:
+        client.upload_fileobj(
+            BytesIO(data), bucket, key, ExtraArgs=extra_args, Config=transfer_config
+        )
+
+    return client.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=604800
+    )
+
+
+def _upload_output(job_id, filename, subfolder, img_type):
+    """
+    Upload one output to S3, reading it from disk when co-located and through /view otherwise.
+
+    Returns:
+        tuple: (output_entry, error_message) - exactly one of them is None.
+    """
+    try:
+        file_path = None
+        data = None
+        if COLOCATED_OUTPUTS:
+            file_path = _resolve_local_output_path(filename, subfolder, img_type)
+        if not file_path:
+            data = get_image_data(filename, subfolder, img_type)
+            if not data:
+                return None, f"Failed to fetch image data for {filename} from /view endpoint."
+
+        print(f"worker-comfyui - Uploading {filename} to S3...")
+        s3_url = upload_output_to_s3(job_id, filename, file_path=file_path, data=data)
+        print(f"worker-comfyui - Uploaded {filename} to S3: {s3_url}")
+        return {"filename": filename, "type": "s3_url", "data": s3_url}, None
+    except Exception as e:
+        error_msg = f"Error uploading {filename} to S3: {e}"
+        print(f"worker-comfyui - {error_msg}")
+        return None, error_msg
+
+
+class OutputUploadPipeline:
+    """
+    Uploads the outputs of one job to S3 on the shared upload pool.
+
+    Outputs are submitted as soon as their node's 'executed' websocket event
+    arrives, so uploads overlap with the rest of the prompt's execution. Outputs
+    that were not announced that way are submitted when the history is processed.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename, subfolder, img_type):
+        """Start uploading an output unless it is already in flight. Returns its future."""
+        key = (filename, subfolder, img_type)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = _get_s3_executor().submit(
+                    _upload_output, self.job_id, filename, subfolder, img_type
+                )
+                self._futures[key] = future
+            return future
+
+    def on_executed(self, node_output):
+        """Callback for 'executed' websocket events of this job's prompt."""
+        for image_info in (node_output or {}).get("images", []):
+            filename = image_info.get("filename")
+            if not filename or image_info.get("type") == "temp":
+                continue
+            self.submit(filename, image_info.get("subfolder", ""), image_info.get("type"))
+
+    def results(self, images):
+        """
+        Wait for the uploads of the given outputs, submitting any that haven't started.
+
+        Args:
+            images (list): (filename, subfolder, image_type) tuples from _collect_output_images.
+
+        Returns:
+            list: (output_entry, error_message) tuples in the order of images.
+        """
+        futures = [self.submit(*image) for image in images]
+        return [future.result() for future in futures]
+
+
+def _check_prompt_history(history, prompt_id, errors):
+    """
+    Extract the outputs of a prompt from its history response.
+
+    Args:
+        history (dict): The JSON response of GET /history/{prompt_id}.
+        prompt_id (str): The prompt ID.
+        errors (list): Warnings are appended to this list.
+
+    Returns:
+        tuple: (outputs, error_result) - error_result is the handler response to return
+               when the prompt is missing from history, otherwise None.
+    """
+    if prompt_id not in history:
+        error_msg = f"Prompt ID {prompt_id} not found in history after execution."
+        print(f"worker-comfyui - {error_msg}")
+        if not errors:
+            return None, {"error": error_msg}
+        errors.append(error_msg)
+        return None, {
+            "error": "Job processing failed, prompt ID not found in history.",
+            "details": errors,
+        }
+
+    prompt_history = history.get(prompt_id, {})
+    outputs = prompt_history.get("outputs", {})
+
+    if not outputs:
+        warning_msg = f"No outputs found in history for prompt {prompt_id}."
+        print(f"worker-comfyui - {warning_msg}")
+        if not errors:
+            errors.append(warning_msg)
+
+    return outputs, None
+
+
+def _build_final_result(output_data, errors):
+    """
+    Assemble the handler response from the delivered outputs and collected errors.
+
+    Args:
+        output_data (list): The output entries produced by _deliver_image.
+        errors (list): Errors and warnings collected during the job.
+
+    Returns:
+        dict: The handler response.
+    """
+    final_result = {}
+
+    if output_data:
+        final_result["images"] = output_data
+
+    if errors:
+        final_result["errors"] = errors
+        print(f"worker-comfyui - Job completed with errors/warnings: {errors}")
+
+    if not output_data and errors:
+        print("worker-comfyui - Job failed with no output images.")
+        return {
+            "error": "Job processing failed",
+            "details": errors,
+        }
+    elif not output_data and not errors:
+        print(
+            "worker-comfyui - Job completed successfully, but the workflow produced no images."
+        )
+        final_result["status"] = "success_no_images"
+        final_result["images"] = []
+
+    print(f"worker-comfyui - Job completed. Returning {len(output_data)} image(s).")
+    return final_result
+
+
+def handler(job):
+    """
+    Handles a job using ComfyUI via websockets for status and image retrieval.
+
+    Args:
+        job (dict): A dictionary containing job details and input parameters.
+
+    Returns:
+        dict: A dictionary containing either an error message or a success status with generated images.
+    """
+    job_input = job["input"]
+    job_id = job["id"]
+
+    # Make sure that the input is valid
+    validated_data, error_message = validate_input(job_input)
+    if error_message:
+        return {"error": error_message}
+
+    # Extract validated data
+    workflow = validated_data["workflow"]
+    input_images = validated_data.get("images")
+
+    # Make sure that ComfyUI is available before proceeding
+    if not get_comfy_connection().wait_ready(COMFY_READY_TIMEOUT_S):
+        return {
+            "error": f"ComfyUI server ({COMFY_HOST}) not reachable after multiple retries."
+        }
+
+    # Upload input images if they exist
+    if input_images:
+        upload_result = upload_images(input_images)
+        if upload_result["status"] == "error":
+            # Return upload errors
+            return {
+                "error": "Failed to upload one or more input images",
+                "details": upload_result["details"],
+            }
+
+    connection = get_comfy_connection()
+    # Choose the prompt ID up front so its events can be routed to this job
+    prompt_id = str(uuid.uuid4())
+    output_data = []
+    errors = []
+    # Outputs go to S3 as soon as their node has executed
+    upload_pipeline = (
+        OutputUploadPipeline(job_id) if os.environ.get("BUCKET_ENDPOINT_URL") else None
+    )
+
+    connection.register_prompt(prompt_id)
+    try:
+        # Queue the workflow
+        try:
+            # Pass per-request API key if provided in input
+            queued_workflow = queue_workflow(
+                workflow,
+                connection.client_id,
+                comfy_org_api_key=validated_data.get("comfy_org_api_key"),
+                prompt_id=prompt_id,
+            )
+            if queued_workflow.get("prompt_id") != prompt_id:
+                raise ValueError(
+                    f"Unexpected 'prompt_id' in queue response: {queued_workflow}"
                 )
+            print(f"worker-comfyui - Queued workflow with ID: {prompt_id}")
+        except requests.RequestException as e:
+            print(f"worker-comfyui - Error queuing workflow: {e}")
+            raise ValueError(f"Error queuing workflow: {e}")
+        except Exception as e:
+            print(f"worker-comfyui - Unexpected error queuing workflow: {e}")
+            # For ValueError exceptions from queue_workflow, pass through the original message
+            if isinstance(e, ValueError):
+                raise e
+            else:
+                raise ValueError(f"Unexpected error queuing workflow: {e}")
+
+        # Wait for execution completion via the shared WebSocket
+        execution_done = connection.wait_for_prompt(
+            prompt_id,
+            errors,
+            on_executed=upload_pipeline.on_executed if upload_pipeline else None,
+        )
+
+        if not execution_done and not errors:
+            raise ValueError(
+                "Workflow monitoring loop exited without confirmation of completion or error."
+            )
+
+        # Fetch history even if there were execution errors, some outputs might exist
+        print(f"worker-comfyui - Fetching history for prompt {prompt_id}...")
+        history = get_history(prompt_id)
+
+        outputs, error_result = _check_prompt_history(history, prompt_id, errors)
+        if error_result:
+            return error_result
+
+        images = _collect_output_images(outputs, errors)
+        if upload_pipeline:
+            results = upload_pipeline.results(images)
+        else:
+            results = [_deliver_output(job_id, *image) for image in images]
+        for entry, error_msg in results:
+            if entry:
+                output_data.append(entry)
+            else:
+                errors.append(error_msg)
 
     except websocket.WebSocketException as e:
         print(f"worker-comfyui - WebSocket Error: {e}")
@@ -783,36 +1413,354 @@ def handler(job):
         print(traceback.format_exc())
         return {"error": f"An unexpected error occurred: {e}"}
     finally:
-        if ws and ws.connected:
-            print(f"worker-comfyui - Closing websocket connection.")
-            ws.close()
+        connection.unregister_prompt(prompt_id)
 
-    final_result = {}
+    return _build_final_result(output_data, errors)
 
-    if output_data:
-        final_result["images"] = output_data
 
-    if errors:
-        final_result["errors"] = errors
-        print(f"worker-comfyui - Job completed with errors/warnings: {errors}")
+# ---------------------------------------------------------------------------
+# Async handler: one pooled HTTP session per worker, concurrent transfers
+# ---------------------------------------------------------------------------
 
-    if not output_data and errors:
-        print(f"worker-comfyui - Job failed with no output images.")
+_http_session = None
+_http_session_loop = None
+
+
+async def _get_http_session():
+    """
+    Return the worker-wide aiohttp session, creating it on first use.
+
+    The connection pool is bounded by COMFY_HTTP_CONCURRENCY and kept alive between
+    jobs so that warm workers don't pay TCP connection setup for every request.
+    """
+    global _http_session, _http_session_loop
+    loop = asyncio.get_running_loop()
+    if _http_session is None or _http_session.closed or _http_session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=COMFY_HTTP_CONCURRENCY, keepalive_timeout=60
+        )
+        _http_session = aiohttp.ClientSession(connector=connector)
+        _http_session_loop = loop
+    return _http_session
+
+
+async def upload_images_async(session, images):
+    """
+    Upload base64 encoded images to /upload/image concurrently.
+
+    At most COMFY_HTTP_CONCURRENCY uploads are in flight at the same time.
+
+    Args:
+        session (aiohttp.ClientSession): The pooled HTTP session.
+        images (list): A list of dictionaries, each containing the 'name' of the image and the 'image' as a base64 encoded string.
+
+    Returns:
+        dict: A dictionary indicating success or error, in the same format as upload_images.
+    """
+    if not images:
+        return {"status": "success", "message": "No images to upload", "details": []}
+
+    print(f"worker-comfyui - Uploading {len(images)} image(s)...")
+    semaphore = asyncio.Semaphore(COMFY_HTTP_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async def upload_one(image):
+        name = image.get("name", "unknown")
+        try:
+            name, blob = _decode_image_payload(image)
+            form = aiohttp.FormData()
+            form.add_field("image", BytesIO(blob), filename=name, content_type="image/png")
+            form.add_field("overwrite", "true")
+            async with semaphore:
+                async with session.post(
+                    f"http://{COMFY_HOST}/upload/image", data=form, timeout=timeout
+                ) as response:
+                    response.raise_for_status()
+            print(f"worker-comfyui - Successfully uploaded {name}")
+            return f"Successfully uploaded {name}", None
+        except base64.binascii.Error as e:
+            error_msg = f"Error decoding base64 for {name}: {e}"
+        except asyncio.TimeoutError:
+            error_msg = f"Timeout uploading {name}"
+        except aiohttp.ClientError as e:
+            error_msg = f"Error uploading {name}: {e}"
+        except Exception as e:
+            error_msg = f"Unexpected error uploading {name}: {e}"
+        print(f"worker-comfyui - {error_msg}")
+        return None, error_msg
+
+    results = await asyncio.gather(*(upload_one(image) for image in images))
+    responses = [ok for ok, _ in results if ok]
+    upload_errors = [err for _, err in results if err]
+
+    if upload_errors:
+        print("worker-comfyui - image(s) upload finished with errors")
         return {
-            "error": "Job processing failed",
-            "details": errors,
+            "status": "error",
+            "message": "Some images failed to upload",
+            "details": upload_errors,
         }
-    elif not output_data and not errors:
+
+    print("worker-comfyui - image(s) upload complete")
+    return {
+        "status": "success",
+        "message": "All images uploaded successfully",
+        "details": responses,
+    }
+
+
+async def queue_workflow_async(
+    session, workflow, client_id, comfy_org_api_key=None, prompt_id=None
+):
+    """
+    Async variant of queue_workflow using the pooled HTTP session.
+
+    Returns:
+        dict: The JSON response from ComfyUI after processing the workflow
+
+    Raises:
+        ValueError: If the workflow validation fails with detailed error information
+    """
+    data = _build_prompt_payload(workflow, client_id, comfy_org_api_key, prompt_id)
+    headers = {"Content-Type": "application/json"}
+    async with session.post(
+        f"http://{COMFY_HOST}/prompt",
+        data=data,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=30),
+    ) as response:
+        if response.status == 400:
+            text = await response.text()
+            print(f"worker-comfyui - ComfyUI returned 400. Response body: {text}")
+            # May call get_available_models, which blocks - keep it off the event loop
+            raise ValueError(await asyncio.to_thread(_validation_error_message, text))
+        response.raise_for_status()
+        return await response.json()
+
+
+async def get_history_async(session, prompt_id):
+    """
+    Async variant of get_history using the pooled HTTP session.
+    """
+    async with session.get(
+        f"http://{COMFY_HOST}/history/{prompt_id}",
+        timeout=aiohttp.ClientTimeout(total=30),
+    ) as response:
+        response.raise_for_status()
+        return await response.json()
+
+
+async def get_image_data_async(session, filename, subfolder, image_type):
+    """
+    Async variant of get_image_data using the pooled HTTP session.
+
+    Returns:
+        bytes: The raw image data, or None if an error occurs.
+    """
+    print(
+        f"worker-comfyui - Fetching image data: type={image_type}, subfolder={subfolder}, filename={filename}"
+    )
+    data = {"filename": filename, "subfolder": subfolder, "type": image_type}
+    url_values = urllib.parse.urlencode(data)
+    try:
+        async with session.get(
+            f"http://{COMFY_HOST}/view?{url_values}",
+            timeout=aiohttp.ClientTimeout(total=60),
+        ) as response:
+            response.raise_for_status()
+            content = await response.read()
+        print(f"worker-comfyui - Successfully fetched image data for {filename}")
+        return content
+    except asyncio.TimeoutError:
+        print(f"worker-comfyui - Timeout fetching image data for {filename}")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"worker-comfyui - Error fetching image data for {filename}: {e}")
+        return None
+    except Exception as e:
         print(
-            f"worker-comfyui - Job completed successfully, but the workflow produced no images."
+            f"worker-comfyui - Unexpected error fetching image data for {filename}: {e}"
         )
-        final_result["status"] = "success_no_images"
-        final_result["images"] = []
+        return None
 
-    print(f"worker-comfyui - Job completed. Returning {len(output_data)} image(s).")
-    return final_result
+
+async def _fetch_and_deliver_outputs(session, job_id, images):
+    """
+    Deliver every output image, COMFY_HTTP_CONCURRENCY at a time. Co-located outputs
+    are read from disk, everything else is fetched from /view.
+
+    Returns:
+        tuple: (output_data, errors) in the order of the given images.
+    """
+    semaphore = asyncio.Semaphore(COMFY_HTTP_CONCURRENCY)
+
+    async def process_one(filename, subfolder, img_type):
+        async with semaphore:
+            if COLOCATED_OUTPUTS:
+                file_path = _resolve_local_output_path(filename, subfolder, img_type)
+                if file_path:
+                    return await asyncio.to_thread(
+                        _deliver_file, job_id, filename, file_path
+                    )
+            image_bytes = await get_image_data_async(
+                session, filename, subfolder, img_type
+            )
+            if not image_bytes:
+                return None, f"Failed to fetch image data for {filename} from /view endpoint."
+            # Encoding is CPU bound - run it on the default executor
+            return await asyncio.to_thread(_deliver_image, job_id, filename, image_bytes)
+
+    results = await asyncio.gather(*(process_one(*image) for image in images))
+    output_data = [entry for entry, _ in results if entry]
+    errors = [err for _, err in results if err]
+    return output_data, errors
+
+
+async def async_handler(job):
+    """
+    Asyncio version of handler() that reuses one pooled HTTP session per worker and
+    uploads inputs / fetches outputs concurrently.
+
+    Args:
+        job (dict): A dictionary containing job details and input parameters.
+
+    Returns:
+        dict: A dictionary containing either an error message or a success status with generated images.
+    """
+    job_input = job["input"]
+    job_id = job["id"]
+
+    # Make sure that the input is valid
+    validated_data, error_message = validate_input(job_input)
+    if error_message:
+        return {"error": error_message}
+
+    # Extract validated data
+    workflow = validated_data["workflow"]
+    input_images = validated_data.get("images")
+
+    session = await _get_http_session()
+
+    # Make sure that ComfyUI is available before proceeding. On a warm worker this
+    # is a memory lookup; only wait on a thread while ComfyUI is (re)starting.
+    connection = get_comfy_connection()
+    if not connection.ready and not await asyncio.to_thread(
+        connection.wait_ready, COMFY_READY_TIMEOUT_S
+    ):
+        return {
+            "error": f"ComfyUI server ({COMFY_HOST}) not reachable after multiple retries."
+        }
+
+    # Upload input images if they exist
+    if input_images:
+        upload_result = await upload_images_async(session, input_images)
+        if upload_result["status"] == "error":
+            # Return upload errors
+            return {
+                "error": "Failed to upload one or more input images",
+                "details": upload_result["details"],
+            }
+
+    # Choose the prompt ID up front so its events can be routed to this job
+    prompt_id = str(uuid.uuid4())
+    output_data = []
+    errors = []
+    # Outputs go to S3 as soon as their node has executed
+    upload_pipeline = (
+        OutputUploadPipeline(job_id) if os.environ.get("BUCKET_ENDPOINT_URL") else None
+    )
+
+    connection.register_prompt(prompt_id)
+    try:
+        # Queue the workflow
+        try:
+            queued_workflow = await queue_workflow_async(
+                session,
+                workflow,
+                connection.client_id,
+                comfy_org_api_key=validated_data.get("comfy_org_api_key"),
+                prompt_id=prompt_id,
+            )
+            if queued_workflow.get("prompt_id") != prompt_id:
+                raise ValueError(
+                    f"Unexpected 'prompt_id' in queue response: {queued_workflow}"
+                )
+            print(f"worker-comfyui - Queued workflow with ID: {prompt_id}")
+        except ValueError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"worker-comfyui - Error queuing workflow: {e}")
+            raise ValueError(f"Error queuing workflow: {e}")
+        except Exception as e:
+            print(f"worker-comfyui - Unexpected error queuing workflow: {e}")
+            raise ValueError(f"Unexpected error queuing workflow: {e}")
+
+        # Waiting on the shared websocket blocks - do it on a worker thread
+        execution_done = await asyncio.to_thread(
+            connection.wait_for_prompt,
+            prompt_id,
+            errors,
+            upload_pipeline.on_executed if upload_pipeline else None,
+        )
+
+        if not execution_done and not errors:
+            raise ValueError(
+                "Workflow monitoring loop exited without confirmation of completion or error."
+            )
+
+        # Fetch history even if there were execution errors, some outputs might exist
+        print(f"worker-comfyui - Fetching history for prompt {prompt_id}...")
+        history = await get_history_async(session, prompt_id)
+
+        outputs, error_result = _check_prompt_history(history, prompt_id, errors)
+        if error_result:
+            return error_result
+
+        images = _collect_output_images(outputs, errors)
+        if upload_pipeline:
+            results = await asyncio.to_thread(upload_pipeline.results, images)
+            output_data = [entry for entry, _ in results if entry]
+            errors.extend(err for _, err in results if err)
+        else:
+            output_data, delivery_errors = await _fetch_and_deliver_outputs(
+                session, job_id, images
+            )
+            errors.extend(delivery_errors)
+
+    except websocket.WebSocketException as e:
+        print(f"worker-comfyui - WebSocket Error: {e}")
+        print(traceback.format_exc())
+        return {"error": f"WebSocket communication error: {e}"}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"worker-comfyui - HTTP Request Error: {e}")
+        print(traceback.format_exc())
+        return {"error": f"HTTP communication error with ComfyUI: {e}"}
+    except ValueError as e:
+        print(f"worker-comfyui - Value Error: {e}")
+        print(traceback.format_exc())
+        return {"error": str(e)}
+    except Exception as e:
+        print(f"worker-comfyui - Unexpected Handler Error: {e}")
+        print(traceback.format_exc())
+        return {"error": f"An unexpected error occurred: {e}"}
+    finally:
+        connection.unregister_prompt(prompt_id)
+
+    return _build_final_result(output_data, errors)
 
 
 if __name__ == "__main__":
     print("worker-comfyui - Starting handler...")
-    runpod.serverless.start({"handler": handler})
+    # Probe ComfyUI and open the persistent websocket once, at worker boot
+    get_comfy_connection()
+    if ASYNC_HANDLER:
+        config = {"handler": async_handler}
+        if MAX_CONCURRENCY > 1:
+            # The blocking handler would stall runpod's event loop, so concurrent
+            # jobs are only enabled together with the async handler
+            config["concurrency_modifier"] = (
+                get_admission_controller().concurrency_modifier
+            )
+        runpod.serverless.start(config)
+    else:
+        runpod.serverless.start({"handler": handler})
@@ -176,9 +176,13 @@ import comfy.utils
 
 import execution
 import server
+from comfy_execution import worker_pool
+from comfy_execution.disk_cache import DiskCacheStore, MemoryCacheStore
 from protocol import BinaryEventTypes
 import nodes
 import comfy.model_management
+import comfy.model_patcher
+import comfy.lora
 import comfyui_version
 import app.logger
 import hook_breaker_ac10a0
@@ -195,7 +199,29 @@ def cuda_malloc_warning():
             logging.warning("\nWARNING: this card most likely does not support cuda-malloc, if you get \"CUDA error\" please run ComfyUI with: --disable-cuda-malloc\n")
 
 
-def prompt_worker(q, server_instance):
+def preload_warm_pool():
+    """Load the --warm-pool-preload checkpoints for the device of the calling worker."""
+    loader = nodes.CheckpointLoaderSimple()
+    for ckpt_name in args.warm_pool_preload:
+        try:
+            loader.load_checkpoint(ckpt_name)
+        except Exception as e:
+            logging.warning("Failed to preload checkpoint %s: %s", ckpt_name, e)
+        else:
+            logging.info("Preloaded checkpoint %s", ckpt_name)
+
+
+def prompt_worker(q, server_instance, device=None, shared_store=None):
+    affinity = None
+    if device is not None:
+        # One of several workers: pin it to its device and keep its prompt state apart
+        comfy.model_management.set_thread_torch_device(device)
+        server_instance = worker_pool.WorkerServer(server_instance)
+        worker_pool.bind_worker_server(server_instance)
+        affinity = worker_pool.ModelAffinity()
+        q.register_worker()
+    preload_warm_pool()
+
     current_time: float = 0.0
     cache_type = execution.CacheType.CLASSIC
     if args.cache_lru > 0:
@@ -205,7 +231,7 @@ def prompt_worker(q, server_instance):
     elif args.cache_none:
         cache_type = execution.CacheType.NONE
 
-    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram } )
+    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram, "disk" : args.cache_disk, "disk_size" : args.cache_disk_size, "shared_store" : shared_store } )
     last_gc_collect = 0
     need_gc = False
     gc_collect_interval = 10.0
@@ -215,9 +241,11 @@ def prompt_worker(q, server_instance):
         if need_gc:
             timeout = max(gc_collect_interval - (current_time - last_gc_collect), 0.0)
 
-        queue_item = q.get(timeout=timeout)
+        queue_item = q.get(timeout=timeout, affinity=affinity)
         if queue_item is not None:
             item, item_id = queue_item
+            if affinity is not None:
+                affinity.update(item)
             execution_start_time = time.perf_counter()
             prompt_id = item[1]
             server_instance.last_prompt_id = prompt_id
@@ -260,6 +288,9 @@ def prompt_worker(q, server_instance):
 
         if free_memory:
             e.reset()
+            comfy.lora.lora_file_cache.clear()
+            comfy.model_patcher.merged_weight_cache.clear()
+            comfy.model_management.warm_pool.clear()
             need_gc = True
             last_gc_collect = 0
 
@@ -281,8 +312,29 @@ async def run(server_instance, address='', port=8188, verbose=True, call_on_star
         server_instance.start_multi_address(addresses, call_on_start, verbose), server_instance.publish_loop()
     )
 
+def start_prompt_workers(prompt_server):
+    if not args.execution_devices:
+        threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+        return
+
+    devices = comfy.model_management.get_execution_devices(args.execution_devices)
+    # CPU-side outputs are shared between the workers; models stay on their device
+    shared_store = None
+    if args.cache_disk:
+        shared_store = DiskCacheStore(args.cache_disk, int(args.cache_disk_size * 1024 * 1024 * 1024))
+    elif args.shared_cache_ram > 0:
+        shared_store = MemoryCacheStore(int(args.shared_cache_ram * 1024 * 1024 * 1024))
+    for i, device in enumerate(devices):
+        logging.info("Starting execution worker %d on %s", i, device)
+        threading.Thread(target=prompt_worker, daemon=True, name=f"prompt-worker-{i}",
+                         args=(prompt_server.prompt_queue, prompt_server, device, shared_store)).start()
+
+
 def hijack_progress(server_instance):
+    default_server = server_instance
+
     def hook(value, total, preview_image, prompt_id=None, node_id=None):
+        server_instance = worker_pool.current_server(default_server)
         executing_context = get_executing_context()
         if prompt_id is None and executing_context is not None:
             prompt_id = executing_context.prompt_id
@@ -328,6 +380,22 @@ def setup_database():
         logging.error(f"Failed to initialize database. Please ensure you have installed the latest requirements. If the error persists, please report this as in future the database will be required: {e}")
 
 
+def setup_job_store(prompt_server):
+    if not args.persist_jobs:
+        return
+    from app.database.db import can_create_session, create_session
+    if not can_create_session():
+        logging.warning("--persist-jobs needs the database, the queue and history will only be kept in memory.")
+        return
+    from app.job_store import JobStore
+    prompt_queue = prompt_server.prompt_queue
+    prompt_queue.set_job_store(JobStore(create_session))
+    # Keep new prompts behind the restored ones
+    numbers = [abs(item[0]) for item in prompt_queue.get_current_queue_volatile()[1]]
+    if numbers:
+        prompt_server.number = max(prompt_server.number, int(max(numbers)) + 1)
+
+
 def start_comfyui(asyncio_loop=None):
     """
     Starts the ComfyUI server using the provided asyncio event loop or creates a new one.
@@ -363,11 +431,12 @@ def start_comfyui(asyncio_loop=None):
 
     cuda_malloc_warning()
     setup_database()
+    setup_job_store(prompt_server)
 
     prompt_server.add_routes()
     hijack_progress(prompt_server)
 
-    threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+    start_prompt_workers(prompt_server)
 
     if args.quick_test_for_ci:
         exit(0)
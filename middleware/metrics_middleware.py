@@ -0,0 +1,117 @@
+"""
+Middleware Latency Metrics
+
+Measures the time each middleware spends on a request, excluding the time
+spent in the handlers and middlewares it calls, and keeps it in a histogram
+per middleware.
+"""
+from __future__ import annotations
+import bisect
+import threading
+import time
+from aiohttp import web
+from typing import Awaitable, Callable, Dict, List
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is unbounded
+LATENCY_BUCKETS_MS: List[float] = [
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000,
+]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets_ms: List[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max observed for the last bucket)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.buckets_ms[i], self.max_ms) if i < len(self.buckets_ms) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(self.buckets_ms, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+class MiddlewareMetrics:
+    """Latency histograms keyed by middleware name"""
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, ms: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.observe(ms)
+
+    def to_dict(self) -> Dict[str, Dict]:
+        return {name: histogram.to_dict() for name, histogram in list(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+
+def instrument_middleware(middleware, metrics: MiddlewareMetrics, name: str = None):
+    """
+    Wrap a middleware so its own latency is recorded in metrics
+
+    Args:
+        middleware: A new-style aiohttp middleware
+        metrics: Where to record the latency
+        name: Histogram name, defaults to the middleware's function name
+    """
+    name = name or getattr(middleware, "__name__", type(middleware).__name__)
+
+    @web.middleware
+    async def timed_middleware(request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]):
+        downstream = 0.0
+
+        async def timed_handler(req: web.Request):
+            nonlocal downstream
+            start = time.perf_counter()
+            try:
+                return await handler(req)
+            finally:
+                downstream += time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            return await middleware(request, timed_handler)
+        finally:
+            metrics.observe(name, (time.perf_counter() - start - downstream) * 1000)
+
+    timed_middleware.__name__ = name
+    return timed_middleware
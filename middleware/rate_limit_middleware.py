@@ -3,18 +3,18 @@ Rate Limiting Middleware
 
 Implements rate limiting per API key based on hourly request limits.
 """
+import math
 from aiohttp import web
-import time
-from app.usage_tracker import UsageTracker
+from app.rate_limiter import RateLimiter
 from app.api_key_manager import APIKey
 
 
-def create_rate_limit_middleware(usage_tracker: UsageTracker):
+def create_rate_limit_middleware(rate_limiter: RateLimiter):
     """
     Create rate limiting middleware
 
     Args:
-        usage_tracker: The usage tracker instance
+        rate_limiter: The rate limiter deciding whether a key is over its limit
     """
     @web.middleware
     async def rate_limit_middleware(request: web.Request, handler):
@@ -31,42 +31,24 @@ def create_rate_limit_middleware(usage_tracker: UsageTracker):
             # No rate limiting for unauthenticated requests (if allowed)
             return await handler(request)
 
-        # Increment usage count BEFORE checking to prevent TOCTOU race condition
-        # This ensures concurrent requests see the updated count immediately
-        new_count = usage_tracker.increment_usage_count(api_key.key_id)
+        # The check counts this request atomically, rejected requests are not counted
+        result = await rate_limiter.check_async(api_key.key_id, api_key.rate_limit)
 
-        # Use > (not >=) because new_count includes this request
-        # If rate_limit=100: requests 1-100 are allowed (new_count 1-100), request 101 is rejected
-        if new_count > api_key.rate_limit:
-            # Over limit - decrement the count we just incremented
-            current_hour = int(time.time() // 3600)
-            usage_tracker.hourly_counts[api_key.key_id][current_hour] = max(0, usage_tracker.hourly_counts[api_key.key_id][current_hour] - 1)
+        if not result.allowed:
             return web.json_response(
                 {
                     "error": "Rate limit exceeded",
                     "error_code": "RATE_LIMIT_EXCEEDED",
                     "limit": api_key.rate_limit,
-                    "reset_in": 3600 - (int(time.time()) % 3600)
+                    "reset_in": math.ceil(result.retry_after)
                 },
                 status=429,
-                headers={
-                    "X-RateLimit-Limit": str(api_key.rate_limit),
-                    "X-RateLimit-Remaining": "0",
-                    "X-RateLimit-Reset": str(int(time.time()) + (3600 - (int(time.time()) % 3600)))
-                }
+                headers=result.headers()
             )
 
         # Add rate limit headers
         response = await handler(request)
-
-        # Calculate remaining: limit - new_count
-        # new_count already includes the increment for this request, so the calculation is correct
-        remaining = api_key.rate_limit - new_count
-        reset_time = int(time.time()) + (3600 - (int(time.time()) % 3600))
-
-        response.headers['X-RateLimit-Limit'] = str(api_key.rate_limit)
-        response.headers['X-RateLimit-Remaining'] = str(max(0, remaining))
-        response.headers['X-RateLimit-Reset'] = str(reset_time)
+        response.headers.update(result.headers())
 
         return response
 
@@ -39,8 +39,7 @@ def create_usage_tracking_middleware(usage_tracker: UsageTracker):
             duration = time.time() - start_time
             success = 200 <= response.status < 400
 
-            # Note: Usage count was already incremented in rate_limit_middleware
-            # This records the full usage details for analytics
+            # Record the full usage details for analytics
             usage_tracker.record_usage(
                 key_id=api_key.key_id,
                 endpoint=endpoint,
@@ -49,15 +48,13 @@ def create_usage_tracking_middleware(usage_tracker: UsageTracker):
                 metadata={
                     "method": request.method,
                     "status": response.status
-                },
-                skip_hourly_increment=True  # Already incremented in rate_limit_middleware
+                }
             )
 
             return response
         except Exception as e:
             duration = time.time() - start_time
-            # Note: Usage count was already incremented in rate_limit_middleware
-            # This records the full usage details for analytics
+            # Record the full usage details for analytics
             usage_tracker.record_usage(
                 key_id=api_key.key_id,
                 endpoint=endpoint,
@@ -66,8 +63,7 @@ def create_usage_tracking_middleware(usage_tracker: UsageTracker):
                 metadata={
                     "method": request.method,
                     "error": str(e)
-                },
-                skip_hourly_increment=True  # Already incremented in rate_limit_middleware
+                }
             )
             raise
 
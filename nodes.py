@@ -5,7 +5,6 @@ import torch
 import os
 import sys
 import json
-import hashlib
 import inspect
 import traceback
 import math
@@ -26,6 +25,7 @@ import comfy.samplers
 import comfy.sample
 import comfy.sd
 import comfy.utils
+import comfy.lora
 import comfy.controlnet
 from comfy.comfy_types import IO, ComfyNodeABC, InputTypeDict, FileLocator
 from comfy_api.internal import register_versions, ComfyAPIWithVersion
@@ -42,6 +42,7 @@ import importlib
 import folder_paths
 import latent_preview
 import node_helpers
+from app import file_fingerprint
 
 if args.enable_manager:
     import comfyui_manager
@@ -49,8 +50,8 @@ if args.enable_manager:
 def before_node_execution():
     comfy.model_management.throw_exception_if_processing_interrupted()
 
-def interrupt_processing(value=True):
-    comfy.model_management.interrupt_current_processing(value)
+def interrupt_processing(value=True, thread_id=None):
+    comfy.model_management.interrupt_current_processing(value, thread_id)
 
 MAX_RESOLUTION=16384
 
@@ -531,10 +532,7 @@ class LoadLatent:
     @classmethod
     def IS_CHANGED(s, latent):
         image_path = folder_paths.get_annotated_filepath(latent)
-        m = hashlib.sha256()
-        with open(image_path, 'rb') as f:
-            m.update(f.read())
-        return m.digest().hex()
+        return file_fingerprint.hash_file(image_path)
 
     @classmethod
     def VALIDATE_INPUTS(s, latent):
@@ -578,8 +576,8 @@ class CheckpointLoaderSimple:
 
     def load_checkpoint(self, ckpt_name):
         ckpt_path = folder_paths.get_full_path_or_raise("checkpoints", ckpt_name)
-        out = comfy.sd.load_checkpoint_guess_config(ckpt_path, output_vae=True, output_clip=True, embedding_directory=folder_paths.get_folder_paths("embeddings"))
-        return out[:3]
+        return comfy.model_management.warm_pool.load("checkpoint", [ckpt_path], None, lambda: comfy.sd.load_checkpoint_guess_config(
+            ckpt_path, output_vae=True, output_clip=True, embedding_directory=folder_paths.get_folder_paths("embeddings"))[:3])
 
 class DiffusersLoader:
     @classmethod
@@ -640,9 +638,6 @@ class CLIPSetLastLayer:
         return (clip,)
 
 class LoraLoader:
-    def __init__(self):
-        self.loaded_lora = None
-
     @classmethod
     def INPUT_TYPES(s):
         return {
@@ -667,17 +662,7 @@ class LoraLoader:
             return (model, clip)
 
         lora_path = folder_paths.get_full_path_or_raise("loras", lora_name)
-        lora = None
-        if self.loaded_lora is not None:
-            if self.loaded_lora[0] == lora_path:
-                lora = self.loaded_lora[1]
-            else:
-                self.loaded_lora = None
-
-        if lora is None:
-            lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
-            self.loaded_lora = (lora_path, lora)
-
+        lora = comfy.lora.load_lora_file(lora_path)
         model_lora, clip_lora = comfy.sd.load_lora_for_models(model, clip, lora, strength_model, strength_clip)
         return (model_lora, clip_lora)
 
@@ -793,7 +778,11 @@ class VAELoader:
                 vae_path = folder_paths.get_full_path_or_raise("vae_approx", vae_name)
             else:
                 vae_path = folder_paths.get_full_path_or_raise("vae", vae_name)
-            sd = comfy.utils.load_torch_file(vae_path)
+            return comfy.model_management.warm_pool.load("vae", [vae_path], None, lambda: self.vae_from_sd(comfy.utils.load_torch_file(vae_path)))
+        return self.vae_from_sd(sd)
+
+    @staticmethod
+    def vae_from_sd(sd):
         vae = comfy.sd.VAE(sd=sd)
         vae.throw_exception_if_invalid()
         return (vae,)
@@ -935,8 +924,8 @@ class UNETLoader:
             model_options["dtype"] = torch.float8_e5m2
 
         unet_path = folder_paths.get_full_path_or_raise("diffusion_models", unet_name)
-        model = comfy.sd.load_diffusion_model(unet_path, model_options=model_options)
-        return (model,)
+        return comfy.model_management.warm_pool.load("diffusion_model", [unet_path], tuple(sorted(model_options.items())),
+                                                     lambda: (comfy.sd.load_diffusion_model(unet_path, model_options=model_options),))
 
 class CLIPLoader:
     @classmethod
@@ -962,8 +951,8 @@ class CLIPLoader:
             model_options["load_device"] = model_options["offload_device"] = torch.device("cpu")
 
         clip_path = folder_paths.get_full_path_or_raise("text_encoders", clip_name)
-        clip = comfy.sd.load_clip(ckpt_paths=[clip_path], embedding_directory=folder_paths.get_folder_paths("embeddings"), clip_type=clip_type, model_options=model_options)
-        return (clip,)
+        return comfy.model_management.warm_pool.load("clip", [clip_path], (clip_type, device), lambda: (comfy.sd.load_clip(
+            ckpt_paths=[clip_path], embedding_directory=folder_paths.get_folder_paths("embeddings"), clip_type=clip_type, model_options=model_options),))
 
 class DualCLIPLoader:
     @classmethod
@@ -992,8 +981,8 @@ class DualCLIPLoader:
         if device == "cpu":
             model_options["load_device"] = model_options["offload_device"] = torch.device("cpu")
 
-        clip = comfy.sd.load_clip(ckpt_paths=[clip_path1, clip_path2], embedding_directory=folder_paths.get_folder_paths("embeddings"), clip_type=clip_type, model_options=model_options)
-        return (clip,)
+        return comfy.model_management.warm_pool.load("clip", [clip_path1, clip_path2], (clip_type, device), lambda: (comfy.sd.load_clip(
+            ckpt_paths=[clip_path1, clip_path2], embedding_directory=folder_paths.get_folder_paths("embeddings"), clip_type=clip_type, model_options=model_options),))
 
 class CLIPVisionLoader:
     @classmethod
@@ -1704,10 +1693,7 @@ class LoadImage:
     @classmethod
     def IS_CHANGED(s, image):
         image_path = folder_paths.get_annotated_filepath(image)
-        m = hashlib.sha256()
-        with open(image_path, 'rb') as f:
-            m.update(f.read())
-        return m.digest().hex()
+        return file_fingerprint.hash_file(image_path)
 
     @classmethod
     def VALIDATE_INPUTS(s, image):
@@ -1753,10 +1739,7 @@ class LoadImageMask:
     @classmethod
     def IS_CHANGED(s, image, channel):
         image_path = folder_paths.get_annotated_filepath(image)
-        m = hashlib.sha256()
-        with open(image_path, 'rb') as f:
-            m.update(f.read())
-        return m.digest().hex()
+        return file_fingerprint.hash_file(image_path)
 
     @classmethod
     def VALIDATE_INPUTS(s, image):
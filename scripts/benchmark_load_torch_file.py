@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark safetensors loading: comfy.safetensors_loader against safetensors.
+
+Writes a synthetic safetensors file of --size GB (unless --path is given),
+then loads it with each method and reports the throughput in GB/s.
+
+Usage examples:
+  python scripts/benchmark_load_torch_file.py --size 4
+  python scripts/benchmark_load_torch_file.py --path /app/models/checkpoints/model.safetensors --device cuda
+  sudo python scripts/benchmark_load_torch_file.py --size 4 --drop-caches   # cold reads, Linux only
+
+Without --drop-caches the file is usually in the page cache after the first
+run, which measures memory bandwidth rather than disk reads.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import safetensors  # noqa: E402
+import safetensors.torch  # noqa: E402
+import torch  # noqa: E402
+
+from comfy import safetensors_loader  # noqa: E402
+
+
+def write_synthetic(path, size_gb, tensor_mb=32):
+    """A file of float16 tensors of tensor_mb each, plus small ones like biases and norms."""
+    elements = tensor_mb * 1024 * 1024 // 2
+    count = max(1, int(size_gb * 1024 // tensor_mb))
+    sd = {}
+    for i in range(count):
+        sd[f"blocks.{i}.weight"] = torch.zeros(elements, dtype=torch.float16)
+        sd[f"blocks.{i}.bias"] = torch.zeros(1024, dtype=torch.float32)
+    safetensors.torch.save_file(sd, path)
+
+
+def drop_caches():
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+
+def load_safetensors_copy(path, device):
+    """What load_torch_file did with --disable-mmap: read each tensor, then copy it."""
+    with safetensors.safe_open(path, framework="pt", device=device.type) as f:
+        return {k: f.get_tensor(k).to(device=device, copy=True) for k in f.keys()}
+
+
+def load_safetensors(path, device):
+    with safetensors.safe_open(path, framework="pt", device=device.type) as f:
+        sd = {k: f.get_tensor(k) for k in f.keys()}
+    if device.type == "cpu":
+        # Tensors are memory mapped, touch every page so the reads are counted
+        for v in sd.values():
+            v.sum()
+    return sd
+
+
+def run(name, fn, size, args):
+    times = []
+    for _ in range(args.repeat):
+        if args.drop_caches:
+            drop_caches()
+        start = time.perf_counter()
+        sd = fn()
+        if args.device.type == "cuda":
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+        del sd
+    best = min(times)
+    print(f"{name:<32} {best:8.3f} s {size / best / 1e9:8.2f} GB/s")  # noqa: T201
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--path", help="Existing safetensors file to load instead of a synthetic one")
+    p.add_argument("--size", type=float, default=4.0, help="Size of the synthetic file in GB")
+    p.add_argument("--device", default="cpu", help="Device to load to, e.g. cpu or cuda")
+    p.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8], help="Thread counts to measure")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per method, the fastest is reported")
+    p.add_argument("--drop-caches", action="store_true", help="Drop the page cache before each run (needs root)")
+    args = p.parse_args()
+    args.device = torch.device(args.device)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path
+        if path is None:
+            path = os.path.join(tmp, "synthetic.safetensors")
+            print(f"Writing {args.size} GB to {path}")  # noqa: T201
+            write_synthetic(path, args.size)
+        size = os.path.getsize(path)
+        print(f"{path}: {size / 1e9:.2f} GB, loading to {args.device}")  # noqa: T201
+
+        run("safetensors (mmap)", lambda: load_safetensors(path, args.device), size, args)
+        run("safetensors + copy (no mmap)", lambda: load_safetensors_copy(path, args.device), size, args)
+        for threads in args.threads:
+            run(f"safetensors_loader threads={threads}",
+                lambda: safetensors_loader.load_file(path, device=args.device, threads=threads)[0], size, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ import time
 import nodes
 import folder_paths
 import execution
-from comfy_execution.jobs import JobStatus, get_job, get_all_jobs
+from comfy_execution.jobs import JobStatus, encode_cursor, get_job, get_all_jobs
+from comfy_execution import node_schema
 import uuid
 import urllib
 import json
@@ -27,9 +28,11 @@ import logging
 import mimetypes
 from comfy.cli_args import args
 import comfy.utils
+import comfy.lora
 import comfy.model_management
+import comfy.model_patcher
 from comfy_api import feature_flags
-import node_helpers
+from app import file_fingerprint
 from comfyui_version import __version__
 from app.frontend_management import FrontendManager, parse_version
 from comfy_api.internal import _ComfyNodeInternal
@@ -48,9 +51,11 @@ from middleware.cache_middleware import cache_control
 # Import API authentication components
 from app.api_key_manager import APIKeyManager
 from app.usage_tracker import UsageTracker
+from app.rate_limiter import create_rate_limiter
 from middleware.auth_middleware import create_auth_middleware
 from middleware.rate_limit_middleware import create_rate_limit_middleware
 from middleware.usage_tracking_middleware import create_usage_tracking_middleware
+from middleware.metrics_middleware import MiddlewareMetrics, instrument_middleware
 
 # Optional comfyui_manager import (only if enabled)
 comfyui_manager = None  # type: ignore
@@ -104,7 +109,7 @@ async def compress_body(request: web.Request, handler):
         return response
     if response.content_type not in ["application/json", "text/plain"]:
         return response
-    if response.body and "gzip" in accept_encoding:
+    if response.body and "gzip" in accept_encoding and "Content-Encoding" not in response.headers:
         response.enable_compression()
     return response
 
@@ -219,6 +224,8 @@ class PromptServer():
         self.internal_routes = InternalRoutes(self)
         self.supports = ["custom_nodes_from_web"]
         self.prompt_queue = execution.PromptQueue(self)
+        if args.coalesce_prompts is not None:
+            self.prompt_queue.coalesce_window = args.coalesce_prompts
         self.loop = loop
         self.messages = asyncio.Queue()
         self.client_session:Optional[aiohttp.ClientSession] = None
@@ -247,10 +254,15 @@ class PromptServer():
         if args.enable_api_auth or args.require_api_auth:
             require_auth = args.require_api_auth
             middlewares.append(create_auth_middleware(self.api_key_manager, require_auth=require_auth))
-            middlewares.append(create_rate_limit_middleware(self.usage_tracker))
+            self.rate_limiter = create_rate_limiter(args.rate_limit_algorithm, args.rate_limit_backend)
+            middlewares.append(create_rate_limit_middleware(self.rate_limiter))
             middlewares.append(create_usage_tracking_middleware(self.usage_tracker))
             logging.info("API authentication enabled (require_auth=%s)", require_auth)
 
+        # Record how long each middleware takes, see /metrics/middleware
+        self.middleware_metrics = MiddlewareMetrics()
+        middlewares = [instrument_middleware(m, self.middleware_metrics) for m in middlewares]
+
         max_upload_size = round(args.max_upload_size * 1024 * 1024)
         self.app = web.Application(client_max_size=max_upload_size, middlewares=middlewares)
         self.sockets = dict()
@@ -265,6 +277,8 @@ class PromptServer():
         self.routes = routes
         self.last_node_id = None
         self.client_id = None
+        # (client_id, prompt_id, node_id) of each execution worker, see worker_pool.WorkerServer
+        self.worker_nodes = {}
 
         self.on_prompt_handlers = []
 
@@ -290,6 +304,9 @@ class PromptServer():
                 # On reconnect if we are the currently executing client send the current node
                 if self.client_id == sid and self.last_node_id is not None:
                     await self.send("executing", { "node": self.last_node_id }, sid)
+                for client_id, prompt_id, node_id in list(self.worker_nodes.values()):
+                    if client_id == sid and node_id is not None:
+                        await self.send("executing", { "node": node_id, "prompt_id": prompt_id }, sid)
 
                 # Flag to track if we've received the first message
                 first_message = True
@@ -388,17 +405,17 @@ class PromptServer():
             return type_dir, dir_type
 
         def compare_image_hash(filepath, image):
-            hasher = node_helpers.hasher()
-
             # function to compare hashes of two images to see if it already exists, fix to #3465
             if os.path.exists(filepath):
-                a = hasher()
-                b = hasher()
-                with open(filepath, "rb") as f:
-                    a.update(f.read())
-                    b.update(image.file.read())
-                    image.file.seek(0)
-                return a.hexdigest() == b.hexdigest()
+                image.file.seek(0, os.SEEK_END)
+                upload_size = image.file.tell()
+                image.file.seek(0)
+                if os.path.getsize(filepath) != upload_size:
+                    return False
+                algorithm = args.default_hashing_function
+                upload_hash = file_fingerprint.hash_stream(image.file, algorithm)
+                image.file.seek(0)
+                return file_fingerprint.hash_file(filepath, algorithm) == upload_hash
             return False
 
         def image_upload(post, image_save_function=None):
@@ -673,6 +690,31 @@ class PromptServer():
         async def get_features(request):
             return web.json_response(feature_flags.get_server_features())
 
+        @routes.get("/metrics/middleware")
+        async def get_middleware_metrics(request):
+            """Per-middleware latency histograms, in milliseconds of the middleware's own time"""
+            return web.json_response(self.middleware_metrics.to_dict())
+
+        @routes.get("/metrics/validation")
+        async def get_validation_metrics(request):
+            """Hit rate of the prompt validation cache"""
+            return web.json_response(execution.validation_cache.stats())
+
+        @routes.get("/metrics/lora")
+        async def get_lora_metrics(request):
+            """Hit rate and size of the shared LoRA file cache"""
+            return web.json_response(comfy.lora.lora_file_cache.stats())
+
+        @routes.get("/metrics/merged_weights")
+        async def get_merged_weight_metrics(request):
+            """Hit rate and size of the cache of LoRA patched model weights"""
+            return web.json_response(comfy.model_patcher.merged_weight_cache.stats())
+
+        @routes.get("/metrics/warm_pool")
+        async def get_warm_pool_metrics(request):
+            """Hit rate and size of the pool of loaded models"""
+            return web.json_response(comfy.model_management.warm_pool.stats())
+
         @routes.get("/prompt")
         async def get_prompt(request):
             return web.json_response(self.get_queue_info())
@@ -682,8 +724,8 @@ class PromptServer():
             if issubclass(obj_class, _ComfyNodeInternal):
                 return obj_class.GET_NODE_INFO_V1()
             info = {}
-            info['input'] = obj_class.INPUT_TYPES()
-            info['input_order'] = {key: list(value.keys()) for (key, value) in obj_class.INPUT_TYPES().items()}
+            info['input'] = node_schema.input_types(obj_class)
+            info['input_order'] = {key: list(value.keys()) for (key, value) in info['input'].items()}
             info['output'] = obj_class.RETURN_TYPES
             info['output_is_list'] = obj_class.OUTPUT_IS_LIST if hasattr(obj_class, 'OUTPUT_IS_LIST') else [False] * len(obj_class.RETURN_TYPES)
             info['output_name'] = obj_class.RETURN_NAMES if hasattr(obj_class, 'RETURN_NAMES') else info['output']
@@ -715,21 +757,29 @@ class PromptServer():
         @routes.get("/object_info")
         async def get_object_info(request):
             with folder_paths.cache_helper:
-                out = {}
-                for x in nodes.NODE_CLASS_MAPPINGS:
+                fragments = []
+                stamps = {}
+                for x, obj_class in list(nodes.NODE_CLASS_MAPPINGS.items()):
                     try:
-                        out[x] = node_info(x)
+                        fragments.append(node_schema.registry.node_info_fragment(x, obj_class, node_info, stamps)[1])
                     except Exception:
                         logging.error("[ERROR] An error occurred while retrieving information for the '%s' node.", x)
                         logging.error(traceback.format_exc())
-                return web.json_response(out)
+            etag, body, gzip_body = node_schema.registry.object_info_body(fragments)
+            headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+            if node_schema.etag_matches(request.if_none_match, etag):
+                return web.Response(status=304, headers=headers)
+            if "gzip" in request.headers.get("Accept-Encoding", ""):
+                headers["Content-Encoding"] = "gzip"
+                body = gzip_body
+            return web.Response(body=body, content_type="application/json", headers=headers)
 
         @routes.get("/object_info/{node_class}")
         async def get_object_info_node(request):
             node_class = request.match_info.get("node_class", None)
             out = {}
             if (node_class is not None) and (node_class in nodes.NODE_CLASS_MAPPINGS):
-                out[node_class] = node_info(node_class)
+                out[node_class] = node_schema.registry.node_info_fragment(node_class, nodes.NODE_CLASS_MAPPINGS[node_class], node_info)[0]
             return web.json_response(out)
 
         @routes.get("/api/jobs")
@@ -743,6 +793,8 @@ class PromptServer():
                 sort_order: Sort direction: asc, desc (default)
                 limit: Max items to return (positive integer)
                 offset: Items to skip (non-negative integer, default 0)
+                cursor: Continue after pagination.next_cursor of a previous response,
+                    instead of using offset (created_at sorting only)
             """
             query = request.rel_url.query
 
@@ -802,32 +854,51 @@ class PromptServer():
                         status=400
                     )
 
-            running, queued = self.prompt_queue.get_current_queue_volatile()
-            history = self.prompt_queue.get_history()
+            cursor = query.get('cursor')
+            if cursor is not None and sort_by != 'created_at':
+                return web.json_response(
+                    {"error": "cursor can only be used with sort_by=created_at"},
+                    status=400
+                )
 
+            running, queued = self.prompt_queue.get_current_queue_volatile()
             running = _remove_sensitive_from_queue(running)
             queued = _remove_sensitive_from_queue(queued)
 
-            jobs, total = get_all_jobs(
-                running, queued, history,
-                status_filter=status_filter,
-                workflow_id=workflow_id,
-                sort_by=sort_by,
-                sort_order=sort_order,
-                limit=limit,
-                offset=offset
-            )
+            def query_jobs():
+                # running and queued are a snapshot, only the history may need the mutex
+                with self.prompt_queue.history_reads():
+                    return get_all_jobs(
+                        running, queued, self.prompt_queue.history,
+                        status_filter=status_filter,
+                        workflow_id=workflow_id,
+                        sort_by=sort_by,
+                        sort_order=sort_order,
+                        limit=limit,
+                        offset=offset,
+                        cursor=cursor
+                    )
+
+            try:
+                # The history may be stored in the database, query it off the event loop
+                jobs, total, offset = await asyncio.to_thread(query_jobs)
+            except ValueError as e:
+                return web.json_response({"error": str(e)}, status=400)
 
             has_more = (offset + len(jobs)) < total
 
+            pagination = {
+                'offset': offset,
+                'limit': limit,
+                'total': total,
+                'has_more': has_more
+            }
+            if has_more and sort_by == 'created_at':
+                pagination['next_cursor'] = encode_cursor(jobs[-1])
+
             return web.json_response({
                 'jobs': jobs,
-                'pagination': {
-                    'offset': offset,
-                    'limit': limit,
-                    'total': total,
-                    'has_more': has_more
-                }
+                'pagination': pagination
             })
 
         @routes.get("/api/jobs/{job_id}")
@@ -841,7 +912,7 @@ class PromptServer():
                 )
 
             running, queued = self.prompt_queue.get_current_queue_volatile()
-            history = self.prompt_queue.get_history(prompt_id=job_id)
+            history = await asyncio.to_thread(self.prompt_queue.get_history, prompt_id=job_id)
 
             running = _remove_sensitive_from_queue(running)
             queued = _remove_sensitive_from_queue(queued)
@@ -867,12 +938,14 @@ class PromptServer():
             else:
                 offset = -1
 
-            return web.json_response(self.prompt_queue.get_history(max_items=max_items, offset=offset))
+            history = await asyncio.to_thread(self.prompt_queue.get_history, max_items=max_items, offset=offset)
+            return web.json_response(history)
 
         @routes.get("/history/{prompt_id}")
         async def get_history_prompt_id(request):
             prompt_id = request.match_info.get("prompt_id", None)
-            return web.json_response(self.prompt_queue.get_history(prompt_id=prompt_id))
+            history = await asyncio.to_thread(self.prompt_queue.get_history, prompt_id=prompt_id)
+            return web.json_response(history)
 
         @routes.get("/queue")
         async def get_queue(request):
@@ -920,8 +993,13 @@ class PromptServer():
                         if sensitive_val in extra_data:
                             sensitive[sensitive_val] = extra_data.pop(sensitive_val)
                     extra_data["create_time"] = int(time.time() * 1000)  # timestamp in milliseconds
-                    self.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute, sensitive))
+                    key = None
+                    if args.coalesce_prompts is not None:
+                        key = execution.coalesce_key(prompt, outputs_to_execute, sensitive)
+                    coalesced_with = self.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute, sensitive), coalesce_key=key)
                     response = {"prompt_id": prompt_id, "number": number, "node_errors": valid[3]}
+                    if coalesced_with is not None:
+                        response["coalesced_with"] = coalesced_with
                     return web.json_response(response)
                 else:
                     logging.warning("invalid prompt: %s", valid[1])
@@ -944,8 +1022,7 @@ class PromptServer():
             if "delete" in json_data:
                 to_delete = json_data['delete']
                 for id_to_delete in to_delete:
-                    delete_func = lambda a: a[1] == id_to_delete
-                    self.prompt_queue.delete_queue_item(delete_func)
+                    self.prompt_queue.delete_queue_item_by_id(id_to_delete)
 
             return web.Response(status=200)
 
@@ -958,26 +1035,23 @@ class PromptServer():
 
             # Check if a specific prompt_id was provided for targeted interruption
             prompt_id = json_data.get('prompt_id')
+            # With several execution workers, only interrupt the threads running the prompts
+            running_threads = self.prompt_queue.get_running_threads()
+            several_workers = self.prompt_queue.worker_count() > 1
             if prompt_id:
-                currently_running, _ = self.prompt_queue.get_current_queue()
-
-                # Check if the prompt_id matches any currently running prompt
-                should_interrupt = False
-                for item in currently_running:
-                    # item structure: (number, prompt_id, prompt, extra_data, outputs_to_execute)
-                    if item[1] == prompt_id:
-                        logging.info("Interrupting prompt %s", prompt_id)
-                        should_interrupt = True
-                        break
-
-                if should_interrupt:
-                    nodes.interrupt_processing()
+                if prompt_id in running_threads:
+                    logging.info("Interrupting prompt %s", prompt_id)
+                    nodes.interrupt_processing(thread_id=running_threads[prompt_id] if several_workers else None)
                 else:
                     logging.info("Prompt %s is not currently running, skipping interrupt", prompt_id)
             else:
                 # No prompt_id provided, do a global interrupt
                 logging.info("Global interrupt (no prompt_id specified)")
-                nodes.interrupt_processing()
+                if several_workers:
+                    for thread_id in running_threads.values():
+                        nodes.interrupt_processing(thread_id=thread_id)
+                else:
+                    nodes.interrupt_processing()
 
             return web.Response(status=200)
 
@@ -1169,7 +1243,7 @@ class PromptServer():
                 )
 
             # Get usage stats
-            stats = self.usage_tracker.get_usage_stats(key_id, days=30)
+            stats = await asyncio.to_thread(self.usage_tracker.get_usage_stats, key_id, days=30)
 
             return web.json_response({
                 **key.to_dict(),
@@ -1238,7 +1312,7 @@ class PromptServer():
                 )
 
             days = int(request.rel_url.query.get("days", 30))
-            stats = self.usage_tracker.get_usage_stats(api_key.key_id, days=days)
+            stats = await asyncio.to_thread(self.usage_tracker.get_usage_stats, api_key.key_id, days=days)
 
             return web.json_response({
                 "key_id": api_key.key_id,
@@ -1258,7 +1332,7 @@ class PromptServer():
                 )
 
             days = int(request.rel_url.query.get("days", 30))
-            all_stats = self.usage_tracker.get_all_usage_stats(days=days)
+            all_stats = await asyncio.to_thread(self.usage_tracker.get_all_usage_stats, days=days)
 
             return web.json_response({
                 "usage_stats": all_stats
@@ -1379,6 +1453,28 @@ class PromptServer():
     def queue_updated(self):
         self.send_sync("status", { "status": self.get_queue_info() })
 
+    def send_coalesced_result(self, item, history_item):
+        """
+        Send the client of a coalesced prompt the messages of the run it was
+        attached to, as if the prompt had run itself.
+        """
+        prompt_id = item[1]
+        client_id = item[3].get("client_id")
+        if client_id is None:
+            return
+        messages = (history_item.get("status") or {}).get("messages", [])
+        final_events = ("execution_success", "execution_error", "execution_interrupted")
+        # The node outputs come after the start messages, before the final one
+        for event, data in messages:
+            if event not in final_events:
+                self.send_sync(event, {**data, "prompt_id": prompt_id}, client_id)
+        for node_id, output in history_item.get("outputs", {}).items():
+            self.send_sync("executed", {"node": node_id, "display_node": node_id, "output": output, "prompt_id": prompt_id}, client_id)
+        for event, data in messages:
+            if event in final_events:
+                self.send_sync(event, {**data, "prompt_id": prompt_id}, client_id)
+        self.send_sync("executing", {"node": None, "prompt_id": prompt_id}, client_id)
+
     async def publish_loop(self):
         while True:
             msg = await self.messages.get()
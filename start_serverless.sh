@@ -143,7 +143,12 @@ if command -v nvidia-smi &> /dev/null && nvidia-smi &> /dev/null; then
 
     # Start ComfyUI in background
     echo "📡 Starting ComfyUI server..."
-    python main.py --listen 0.0.0.0 --port 8188 &
+    COMFYUI_ARGS=(--listen 0.0.0.0 --port 8188)
+    if [ -n "$COMFY_DISK_CACHE_DIR" ]; then
+      # Keep node outputs across cold starts, e.g. on a network volume
+      COMFYUI_ARGS+=(--cache-disk "$COMFY_DISK_CACHE_DIR" --cache-disk-size "${COMFY_DISK_CACHE_SIZE_GB:-20}")
+    fi
+    python main.py "${COMFYUI_ARGS[@]}" &
     COMFYUI_PID=$!
 
     # Wait for ComfyUI to be ready
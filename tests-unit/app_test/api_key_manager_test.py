@@ -0,0 +1,72 @@
+import json
+import os
+import pytest
+from unittest.mock import patch
+
+from app.api_key_manager import APIKeyManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    with patch("folder_paths.get_user_directory", return_value=str(tmp_path)):
+        manager = APIKeyManager(flush_interval=3600)
+    yield manager
+    manager.close()
+
+
+def _read_keys(manager):
+    with open(manager.keys_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_validate_key(manager):
+    key_id, plaintext = manager.generate_key("test")
+
+    assert manager.validate_key(plaintext).key_id == key_id
+    # Second lookup is served from the validation cache
+    assert manager.validate_key(plaintext).key_id == key_id
+    assert manager.validate_key("comfy_not-a-key") is None
+
+
+def test_validate_key_respects_updates_and_deletes(manager):
+    key_id, plaintext = manager.generate_key("test")
+    assert manager.validate_key(plaintext) is not None
+
+    manager.update_key(key_id, is_active=False)
+    assert manager.validate_key(plaintext) is None
+
+    manager.update_key(key_id, is_active=True)
+    assert manager.validate_key(plaintext) is not None
+
+    manager.delete_key(key_id)
+    assert manager.validate_key(plaintext) is None
+
+
+def test_last_used_is_written_behind(manager):
+    key_id, plaintext = manager.generate_key("test")
+    mtime = os.stat(manager.keys_file).st_mtime_ns
+
+    manager.validate_key(plaintext)
+    # Validation does not write the keys file
+    assert os.stat(manager.keys_file).st_mtime_ns == mtime
+    assert _read_keys(manager)[key_id]["last_used"] is None
+
+    manager.flush()
+    assert _read_keys(manager)[key_id]["last_used"] == manager.get_key(key_id).last_used
+
+
+def test_keys_survive_reload(manager, tmp_path):
+    key_id, plaintext = manager.generate_key("test")
+    manager.validate_key(plaintext)
+    manager.close()
+
+    with patch("folder_paths.get_user_directory", return_value=str(tmp_path)):
+        reloaded = APIKeyManager(flush_interval=3600)
+    try:
+        key = reloaded.validate_key(plaintext)
+        assert key.key_id == key_id
+        assert key.last_used is not None
+        # Only the keys file is left behind, no temporary files
+        assert os.listdir(tmp_path) == ["api_keys.json"]
+    finally:
+        reloaded.close()
@@ -0,0 +1,93 @@
+import hashlib
+import io
+import os
+import pytest
+
+from app.write_behind import WriteBehindQueue
+from app import file_fingerprint
+from app.file_fingerprint import FileFingerprintCache, hash_stream
+
+
+@pytest.fixture
+def old_file(tmp_path):
+    def write(name, data):
+        path = tmp_path / name
+        path.write_bytes(data)
+        # Outside the racy window so the hash is cached
+        os.utime(path, ns=(0, 10**18))
+        return str(path)
+    return write
+
+
+@pytest.fixture(autouse=True)
+def write_behind_queue(monkeypatch):
+    queue = WriteBehindQueue()
+    monkeypatch.setattr("app.write_behind._default_queue", queue)
+    yield queue
+    queue.close()
+
+
+def test_hash_stream_matches_hashlib():
+    data = os.urandom(3 * 1024 + 7)
+    assert hash_stream(io.BytesIO(data), chunk_size=1024) == hashlib.sha256(data).hexdigest()
+    assert hash_stream(io.BytesIO(data), "md5") == hashlib.md5(data).hexdigest()
+
+
+def test_unchanged_file_is_not_read_again(old_file, monkeypatch):
+    path = old_file("a.png", b"image data")
+    cache = FileFingerprintCache()
+    assert cache.hash_file(path) == hashlib.sha256(b"image data").hexdigest()
+
+    monkeypatch.setattr(file_fingerprint, "hash_stream", lambda *a, **kw: pytest.fail("file was read"))
+    assert cache.hash_file(path) == hashlib.sha256(b"image data").hexdigest()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_modified_file_is_rehashed(old_file):
+    path = old_file("a.png", b"before")
+    cache = FileFingerprintCache()
+    cache.hash_file(path)
+    old_file("a.png", b"after!")
+    assert cache.hash_file(path) == hashlib.sha256(b"after!").hexdigest()
+
+
+def test_recently_modified_file_is_not_cached(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"fresh")
+    cache = FileFingerprintCache()
+    cache.hash_file(str(path))
+    assert len(cache.entries) == 0
+
+
+def test_algorithms_are_cached_separately(old_file):
+    path = old_file("a.png", b"data")
+    cache = FileFingerprintCache()
+    assert cache.hash_file(path, "md5") == hashlib.md5(b"data").hexdigest()
+    assert cache.hash_file(path, "sha256") == hashlib.sha256(b"data").hexdigest()
+
+
+def test_lru_bound(old_file):
+    cache = FileFingerprintCache(max_entries=2)
+    paths = [old_file(f"{i}.png", bytes([i])) for i in range(3)]
+    for path in paths:
+        cache.hash_file(path)
+    assert [key[0] for key in cache.entries] == paths[1:]
+
+
+def test_index_persists(old_file, tmp_path, write_behind_queue, monkeypatch):
+    path = old_file("a.png", b"data")
+    index_path = str(tmp_path / "index" / "file_hashes.json")
+    FileFingerprintCache(index_path=index_path).hash_file(path)
+    write_behind_queue.flush()
+    assert os.path.exists(index_path)
+
+    reloaded = FileFingerprintCache(index_path=index_path)
+    monkeypatch.setattr(file_fingerprint, "hash_stream", lambda *a, **kw: pytest.fail("file was read"))
+    assert reloaded.hash_file(path) == hashlib.sha256(b"data").hexdigest()
+
+
+def test_corrupt_index_is_ignored(old_file, tmp_path):
+    index_path = tmp_path / "file_hashes.json"
+    index_path.write_text("{not json")
+    path = old_file("a.png", b"data")
+    assert FileFingerprintCache(index_path=str(index_path)).hash_file(path) == hashlib.sha256(b"data").hexdigest()
@@ -0,0 +1,209 @@
+import random
+import threading
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution  # noqa: E402
+from app.job_store import JobStore  # noqa: E402
+from app.write_behind import WriteBehindQueue  # noqa: E402
+from comfy_execution.jobs import JobStatus, HistoryStore, encode_cursor, get_all_jobs  # noqa: E402
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    from sqlalchemy.orm import sessionmaker
+    from app.database.models import Base
+
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def write_queue():
+    queue = WriteBehindQueue()
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def job_store(session_factory, write_queue):
+    return JobStore(session_factory, flush_interval=3600, write_queue=write_queue)
+
+
+class FakeServer:
+    def queue_updated(self):
+        pass
+
+
+def make_queue(job_store):
+    queue = execution.PromptQueue(FakeServer())
+    queue.set_job_store(job_store)
+    return queue
+
+
+def run_prompt(queue, number, prompt_id, status_str="success"):
+    queue.put((number, prompt_id, {}, {"create_time": number}, [], {"auth_token_comfy_org": "secret"}))
+    item, item_id = queue.get()
+    status = execution.PromptQueue.ExecutionStatus(status_str=status_str, completed=status_str == "success", messages=[])
+    queue.task_done(item_id, {"outputs": {}, "meta": {}}, status, process_item=lambda p: p[:5] + p[6:])
+
+
+def make_history_item(prompt_id, create_time, status_str='success', workflow_id=None):
+    extra_data = {'create_time': create_time}
+    if workflow_id is not None:
+        extra_data['extra_pnginfo'] = {'workflow': {'id': workflow_id}}
+    return {
+        'prompt': [0, prompt_id, {}, extra_data, []],
+        'status': {'status_str': status_str, 'completed': status_str == 'success', 'messages': []},
+        'outputs': {},
+    }
+
+
+def test_history_survives_restart(job_store, session_factory, write_queue, monkeypatch):
+    monkeypatch.setattr(execution, "MAXIMUM_HISTORY_SIZE", 5)
+    queue = make_queue(job_store)
+    for i in range(8):
+        run_prompt(queue, i, f"p{i}", "error" if i % 2 else "success")
+    queue.delete_history_item("p4")
+    job_store.flush()
+
+    queue = make_queue(JobStore(session_factory, write_queue=write_queue))
+    assert list(queue.get_history()) == ["p3", "p5", "p6", "p7"]
+    assert list(queue.get_history(max_items=2, offset=1)) == ["p5", "p6"]
+    item = queue.get_history(prompt_id="p5")["p5"]
+    assert item["status"]["status_str"] == "error"
+    assert item["prompt"] == [5, "p5", {}, {"create_time": 5}, []]
+    assert queue.get_history(prompt_id="p4") == {}
+
+    queue.wipe_history()
+    assert queue.get_history() == {}
+
+
+def test_queue_is_restored(job_store, session_factory, write_queue):
+    queue = make_queue(job_store)
+    for i in range(3):
+        queue.put((i, f"p{i}", {"1": {}}, {"create_time": i}, ["1"], {"auth_token_comfy_org": "secret"}))
+    queue.get()
+    queue.delete_queue_item(lambda item: item[1] == "p2")
+    job_store.flush()
+
+    job_store = JobStore(session_factory, write_queue=write_queue)
+    queue = make_queue(job_store)
+    # Sensitive data is not persisted
+    assert queue.queue == [(1, "p1", {"1": {}}, {"create_time": 1}, ["1"], {})]
+    # The prompt that was running when the server stopped is reported as interrupted
+    item = queue.get_history(prompt_id="p0")["p0"]
+    assert item["status"]["status_str"] == "error"
+    assert item["status"]["messages"][0][0] == "execution_interrupted"
+
+    queue.wipe_queue()
+    job_store.flush()
+    assert make_queue(JobStore(session_factory, write_queue=write_queue)).queue == []
+
+
+def test_coalesced_prompts_are_restored(job_store, session_factory, write_queue):
+    queue = make_queue(job_store)
+    queue.put((0, "p0", {}, {}, [], {}), coalesce_key="k")
+    queue.put((1, "p1", {}, {}, [], {}), coalesce_key="k")
+    job_store.flush()
+    # Attached prompts are queued on their own after a restart
+    queue = make_queue(JobStore(session_factory, write_queue=write_queue))
+    assert [item[1] for item in queue.queue] == ["p0", "p1"]
+
+
+def test_raised_priority_is_restored(job_store, session_factory, write_queue):
+    queue = make_queue(job_store)
+    queue.put((5, "p5", {}, {}, [], {}), coalesce_key="k")
+    queue.put((3, "p3", {}, {}, [], {}))
+    queue.put((-1, "front", {}, {}, [], {}), coalesce_key="k")
+    job_store.flush()
+    queue = make_queue(JobStore(session_factory, write_queue=write_queue))
+    assert [queue.get()[0][1] for _ in range(3)] == ["front", "p5", "p3"]
+
+
+def test_writes_are_batched(job_store, session_factory):
+    from app.database.models import QueuedPrompt
+
+    queue = make_queue(job_store)
+    queue.put((0, "p0", {}, {}, [], {}))
+    with session_factory() as session:
+        assert session.query(QueuedPrompt).count() == 0
+    job_store.flush()
+    with session_factory() as session:
+        assert session.query(QueuedPrompt).count() == 1
+
+
+def test_history_reads_see_pending_writes(job_store):
+    queue = make_queue(job_store)
+    run_prompt(queue, 0, "p0")
+    assert "p0" in queue.get_history()
+
+
+def test_history_is_read_without_the_queue_mutex(job_store):
+    queue = make_queue(job_store)
+    run_prompt(queue, 0, "p0")
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def hold_mutex():
+        with queue.mutex:
+            acquired.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold_mutex)
+    thread.start()
+    acquired.wait(5)
+    try:
+        with queue.history_reads():
+            assert "p0" in queue.get_history()
+    finally:
+        release.set()
+        thread.join()
+    memory_queue = execution.PromptQueue(FakeServer())
+    assert memory_queue.history_reads() is memory_queue.mutex
+
+
+class TestGetAllJobs:
+    """Jobs listed from the database should match the in-memory store."""
+
+    @pytest.fixture
+    def stores(self, job_store):
+        rng = random.Random(0)
+        memory = HistoryStore(100)
+        database = job_store.history(100)
+        for i in range(120):
+            prompt_id = f'h{i:03d}'
+            item = make_history_item(
+                prompt_id, rng.randrange(50), rng.choice(['success', 'error']), rng.choice(['w1', 'w2', None]))
+            memory.add(prompt_id, item)
+            database.add(prompt_id, item)
+        memory.remove('h050')
+        database.remove('h050')
+        return memory, database
+
+    @pytest.mark.parametrize('status_filter', [JobStatus.ALL, [JobStatus.FAILED], [JobStatus.PENDING]])
+    @pytest.mark.parametrize('workflow_id', [None, 'w1'])
+    @pytest.mark.parametrize('sort_by', ['created_at', 'execution_duration'])
+    def test_matches_memory_store(self, stores, status_filter, workflow_id, sort_by):
+        memory, database = stores
+        queued = [(i, f'q{i}', {}, {'create_time': 7 * i}, []) for i in range(5)]
+        assert len(database) == len(memory) == 99
+        for offset, limit in [(0, None), (7, 13), (95, 10)]:
+            expected = get_all_jobs([], queued, memory, status_filter, workflow_id, sort_by=sort_by, limit=limit, offset=offset)
+            assert get_all_jobs([], queued, database, status_filter, workflow_id, sort_by=sort_by, limit=limit, offset=offset) == expected
+
+    @pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+    def test_cursor(self, stores, sort_order):
+        memory, database = stores
+        first, _, _ = get_all_jobs([], [], memory, sort_order=sort_order, limit=30)
+        cursor = encode_cursor(first[-1])
+        expected = get_all_jobs([], [], memory, sort_order=sort_order, limit=30, cursor=cursor)
+        assert get_all_jobs([], [], database, sort_order=sort_order, limit=30, cursor=cursor) == expected
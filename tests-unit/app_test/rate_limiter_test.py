@@ -0,0 +1,126 @@
+import socket
+import threading
+import pytest
+
+from app.rate_limiter import (
+    MemoryRateLimitBackend,
+    RateLimiter,
+    SQLiteRateLimitBackend,
+    create_backend,
+)
+
+WINDOW = 100.0
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    fakeredis = pytest.importorskip("fakeredis")
+    port = _free_port()
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{port}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend_url(request, tmp_path):
+    if request.param == "memory":
+        return None
+    if request.param == "sqlite":
+        return f"sqlite:///{tmp_path / 'rate_limits.db'}"
+    return request.getfixturevalue("redis_url")
+
+
+@pytest.fixture
+def make_limiter(backend_url):
+    limiters = []
+
+    def make(algorithm):
+        limiter = RateLimiter(algorithm, create_backend(backend_url), window=WINDOW)
+        limiters.append(limiter)
+        return limiter
+
+    yield make
+    for limiter in limiters:
+        limiter.close()
+
+
+def test_sliding_window(make_limiter, request):
+    limiter = make_limiter("sliding-window")
+    key = request.node.name
+    now = 1000.0
+
+    for i in range(3):
+        result = limiter.check(key, 3, now + i)
+        assert result.allowed
+        assert result.remaining == 2 - i
+
+    result = limiter.check(key, 3, now + 10)
+    assert not result.allowed
+    assert result.remaining == 0
+    # The first request leaves the window at now + WINDOW
+    assert result.retry_after == pytest.approx(WINDOW - 10)
+
+    assert limiter.check(key, 3, now + WINDOW + 0.5).allowed
+    assert not limiter.check(key, 3, now + WINDOW + 0.6).allowed
+
+
+def test_token_bucket(make_limiter, request):
+    limiter = make_limiter("token-bucket")
+    key = request.node.name
+    now = 1000.0
+
+    # A full bucket allows a burst up to the limit
+    for _ in range(4):
+        assert limiter.check(key, 4, now).allowed
+    result = limiter.check(key, 4, now)
+    assert not result.allowed
+    assert result.retry_after == pytest.approx(WINDOW / 4)
+
+    # One token is refilled every WINDOW / limit seconds
+    assert limiter.check(key, 4, now + WINDOW / 4).allowed
+    assert not limiter.check(key, 4, now + WINDOW / 4).allowed
+
+
+def test_limits_are_per_key(make_limiter, request):
+    limiter = make_limiter("sliding-window")
+    key = request.node.name
+    assert limiter.check(key + "a", 1, 1000.0).allowed
+    assert not limiter.check(key + "a", 1, 1000.0).allowed
+    assert limiter.check(key + "b", 1, 1000.0).allowed
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    first = RateLimiter("sliding-window", SQLiteRateLimitBackend(path), window=WINDOW)
+    second = RateLimiter("sliding-window", SQLiteRateLimitBackend(path), window=WINDOW)
+    try:
+        assert first.check("key", 2, 1000.0).allowed
+        assert second.check("key", 2, 1001.0).allowed
+        assert not first.check("key", 2, 1002.0).allowed
+    finally:
+        first.close()
+        second.close()
+
+
+def test_unreachable_backend_falls_back_to_local_limits():
+    limiter = RateLimiter("token-bucket", create_backend(f"redis://127.0.0.1:{_free_port()}"), window=WINDOW)
+    assert limiter.check("key", 1, 1000.0).allowed
+    assert not limiter.check("key", 1, 1000.0).allowed
+
+
+def test_memory_backend_drops_expired_entries():
+    backend = MemoryRateLimitBackend()
+    limiter = RateLimiter("sliding-window", backend, window=WINDOW)
+    for i in range(50):
+        limiter.check("key", 100, 1000.0 + i)
+    limiter.check("key", 100, 1000.0 + 49 + WINDOW)
+    assert len(backend._logs["key"]) == 1
@@ -0,0 +1,82 @@
+import time
+import pytest
+from unittest.mock import patch
+
+from app.usage_tracker import (
+    DatabaseUsageStorage,
+    JsonUsageStorage,
+    UsageRecord,
+    UsageTracker,
+)
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def db_storage(tmp_path):
+    from sqlalchemy.orm import sessionmaker
+    from app.database.models import Base
+
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Base.metadata.create_all(engine)
+    yield DatabaseUsageStorage(sessionmaker(bind=engine))
+    engine.dispose()
+
+
+@pytest.fixture
+def json_storage(tmp_path):
+    return JsonUsageStorage(str(tmp_path / "api_usage.json"))
+
+
+@pytest.fixture(params=["json", "database"])
+def storage(request, json_storage, db_storage):
+    return json_storage if request.param == "json" else db_storage
+
+
+def _record(key_id, timestamp, success=True, duration=0.5):
+    return UsageRecord(key_id, "/prompt", timestamp, duration, success, {"status": 200})
+
+
+def test_usage_stats(storage):
+    now = time.time()
+    storage.append([
+        _record("a", now),
+        _record("a", now - 1, success=False),
+        _record("a", now - 3 * DAY),
+        _record("a", now - 40 * DAY),
+        _record("b", now),
+    ])
+
+    stats = storage.get_usage_stats("a", now - 30 * DAY)
+    assert stats["total_requests"] == 3
+    assert stats["successful_requests"] == 2
+    assert stats["failed_requests"] == 1
+    assert stats["total_duration"] == pytest.approx(1.5)
+    assert stats["average_duration"] == pytest.approx(0.5)
+    assert sum(stats["requests_per_day"].values()) == 3
+
+    assert storage.get_usage_stats("missing", now - 30 * DAY)["total_requests"] == 0
+
+    all_stats = storage.get_all_usage_stats(now - DAY)
+    assert all_stats["a"]["total_requests"] == 2
+    assert all_stats["b"]["total_requests"] == 1
+
+
+def test_window_starts_mid_day(storage):
+    # Records on the first day of the window but before its start are excluded
+    now = time.time()
+    storage.append([_record("a", now - 10), _record("a", now - 5)])
+    assert storage.get_usage_stats("a", now - 7)["total_requests"] == 1
+
+
+def test_tracker_batches_records(db_storage, tmp_path):
+    with patch("folder_paths.get_user_directory", return_value=str(tmp_path)):
+        tracker = UsageTracker(storage=db_storage, flush_interval=3600)
+    for _ in range(5):
+        tracker.record_usage("a", "/queue", 0.1)
+
+    # Nothing is written until the batch is flushed; stats flush first
+    assert db_storage.get_usage_stats("a", 0)["total_requests"] == 0
+    assert tracker.get_usage_stats("a")["total_requests"] == 5
@@ -0,0 +1,59 @@
+import threading
+import time
+import pytest
+
+from app.write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def queue():
+    queue = WriteBehindQueue()
+    yield queue
+    queue.close()
+
+
+def test_runs_off_the_calling_thread(queue):
+    threads = []
+    queue.submit("key", lambda: threads.append(threading.current_thread()))
+    queue.flush()
+    assert threads and threads[0] is not threading.current_thread()
+
+
+def test_delayed_writes_are_coalesced(queue):
+    calls = []
+    for i in range(10):
+        queue.submit("key", lambda i=i: calls.append(i), delay=60)
+    assert calls == []
+
+    queue.flush()
+    # Only the latest submission runs
+    assert calls == [9]
+
+
+def test_shorter_delay_brings_write_forward(queue):
+    done = threading.Event()
+    queue.submit("key", done.set, delay=60)
+    queue.submit("key", done.set)
+    assert done.wait(5)
+
+
+def test_failed_write_does_not_stop_the_queue(queue):
+    def fail():
+        raise OSError("disk full")
+
+    calls = []
+    queue.submit("bad", fail)
+    queue.submit("good", lambda: calls.append(1))
+    queue.flush()
+    assert calls == [1]
+
+
+def test_close_runs_pending_writes():
+    queue = WriteBehindQueue()
+    calls = []
+    queue.submit("key", lambda: calls.append(time.time()), delay=60)
+    queue.close()
+    assert len(calls) == 1
+    # Submitting after close writes synchronously
+    queue.submit("key", lambda: calls.append(time.time()))
+    assert len(calls) == 2
@@ -0,0 +1,61 @@
+import os
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.utils  # noqa: E402
+from comfy.lora import LoraFileCache  # noqa: E402
+
+
+def save_lora(path, value, numel=256):
+    comfy.utils.save_torch_file({"lora_unet_x.lora_up.weight": torch.full((numel,), float(value))}, str(path))
+    return str(path)
+
+
+def test_hits_and_reload_on_change(tmp_path):
+    cache = LoraFileCache(1 << 20)
+    path = save_lora(tmp_path / "a.safetensors", 1)
+    first = cache.load(path)
+    second = cache.load(path)
+    assert first is not second
+    assert first["lora_unet_x.lora_up.weight"] is second["lora_unet_x.lora_up.weight"]
+    assert cache.stats()["hits"] == 1
+
+    save_lora(path, 2, numel=128)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.load(path)["lora_unet_x.lora_up.weight"][0] == 2
+    stats = cache.stats()
+    assert stats["misses"] == 2
+    assert stats["size"] == 1
+    assert stats["bytes"] == 128 * 4
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = LoraFileCache(2 * 1024 + 100)  # two files of 1024 bytes
+    paths = [save_lora(tmp_path / f"{i}.safetensors", i) for i in range(3)]
+    cache.load(paths[0])
+    cache.load(paths[1])
+    cache.load(paths[0])
+    cache.load(paths[2])
+    assert list(cache.entries) == [paths[0], paths[2]]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_callers_may_change_returned_dict(tmp_path):
+    cache = LoraFileCache(1 << 20)
+    path = save_lora(tmp_path / "a.safetensors", 1)
+    sd = cache.load(path)
+    sd["renamed"] = sd.pop("lora_unet_x.lora_up.weight")
+    assert list(cache.load(path)) == ["lora_unet_x.lora_up.weight"]
+
+
+def test_disabled_cache(tmp_path):
+    cache = LoraFileCache(0)
+    path = save_lora(tmp_path / "a.safetensors", 1)
+    cache.load(path)
+    cache.load(path)
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,92 @@
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.model_patcher  # noqa: E402
+from comfy.model_patcher import MergedWeightCache, ModelPatcher  # noqa: E402
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = MergedWeightCache(1 << 20)
+    monkeypatch.setattr(comfy.model_patcher, "merged_weight_cache", cache)
+    return cache
+
+
+def make_patcher():
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4))
+    return ModelPatcher(model, torch.device("cpu"), torch.device("cpu"))
+
+
+def patched_weight(patcher):
+    patcher.patch_model()
+    weight = patcher.model[0].weight.detach().clone()
+    patcher.unpatch_model()
+    return weight
+
+
+def test_patched_weights_are_reused(cache):
+    patcher = make_patcher()
+    base = patcher.model[0].weight.detach().clone()
+    diff = torch.ones(4, 4)
+    patcher.add_patches({"0.weight": ("diff", (diff,))}, 0.5)
+
+    first = patched_weight(patcher)
+    assert torch.equal(patcher.model[0].weight, base)
+    assert torch.equal(patched_weight(patcher), first)
+    assert torch.allclose(first, base + 0.5)
+    assert cache.stats()["hits"] == 1
+
+    # A different strength, or an in place change of the patch, is another entry
+    stronger = patcher.clone()
+    stronger.add_patches({"0.weight": ("diff", (diff,))}, 0.25)
+    assert torch.allclose(patched_weight(stronger), base + 0.75)
+    diff += 1
+    assert torch.allclose(patched_weight(patcher), base + 1.0)
+    assert cache.stats() == {**cache.stats(), "hits": 1, "misses": 3}
+
+
+def test_models_do_not_share_entries(cache):
+    diff = torch.ones(4, 4)
+    weights = []
+    for _ in range(2):
+        patcher = make_patcher()
+        patcher.add_patches({"0.weight": ("diff", (diff,))}, 1.0)
+        weights.append((patcher.model[0].weight.detach().clone(), patched_weight(patcher)))
+        del patcher
+    for base, patched in weights:
+        assert torch.allclose(patched, base + 1.0)
+
+
+def test_unknown_patches_are_not_cached(cache):
+    patcher = make_patcher()
+    patcher.add_patches({"0.weight": ("diff", (torch.ones(4, 4),))}, 1.0)
+    patcher.patches["0.weight"][0] += (object(),)
+    assert cache.key(patcher.model, "0.weight", patcher.patches["0.weight"]) is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = MergedWeightCache(100)
+    model = torch.nn.Linear(1, 1)
+    for i in range(3):
+        cache.set(("k", i), model, torch.zeros(10), [])
+    assert list(cache.entries) == [("k", 1), ("k", 2)]
+    assert cache.get(("k", 0), model) is None
+    assert cache.get(("k", 2), model) is not None
+
+
+def test_kept_patches_count_against_the_limit():
+    cache = MergedWeightCache(200)
+    model = torch.nn.Linear(1, 1)
+    lora = torch.zeros(20)
+    cache.set(("k", 0), model, torch.zeros(10), [lora, lora, print])
+    assert cache.stats()["bytes"] == 120
+    cache.set(("k", 1), model, torch.zeros(10), [torch.zeros(20)])
+    assert list(cache.entries) == [("k", 1)]
+    assert cache.total_bytes == 120
+    # Too large with its patches
+    cache.set(("k", 2), model, torch.zeros(10), [torch.zeros(60)])
+    assert list(cache.entries) == [("k", 1)]
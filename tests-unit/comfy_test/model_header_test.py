@@ -0,0 +1,112 @@
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.sd  # noqa: E402
+import comfy.supported_models  # noqa: E402
+import comfy.utils  # noqa: E402
+
+
+SD15_UNET_CONFIG = {
+    'use_checkpoint': False, 'image_size': 32, 'out_channels': 4, 'use_spatial_transformer': True, 'legacy': False,
+    'in_channels': 4, 'model_channels': 320, 'num_res_blocks': [2, 2, 2, 2], 'transformer_depth': [1, 1, 1, 1, 1, 1, 0, 0],
+    'channel_mult': [1, 2, 4, 4], 'transformer_depth_middle': 1, 'use_linear_in_transformer': False, 'context_dim': 768,
+    'num_heads': 8, 'transformer_depth_output': [1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0], 'use_temporal_resblock': False,
+    'use_temporal_attention': False, 'adm_in_channels': None,
+}
+
+
+@pytest.fixture
+def lora_file(tmp_path):
+    path = str(tmp_path / "style_lora.safetensors")
+    sd = {
+        "lora_unet_down_blocks_0.lora_up.weight": torch.zeros(8, 4, dtype=torch.float16),
+        "lora_unet_down_blocks_0.alpha": torch.tensor(4.0),
+    }
+    comfy.utils.save_torch_file(sd, path, metadata={"ss_network_dim": "4"})
+    return path
+
+
+def test_header_matches_file(lora_file):
+    header, metadata = comfy.utils.load_torch_file_header(lora_file)
+    sd = comfy.utils.load_torch_file(lora_file)
+    assert header.keys() == sd.keys()
+    for k, v in sd.items():
+        assert header[k].device.type == "meta"
+        assert header[k].shape == v.shape
+        assert header[k].dtype == v.dtype
+    assert metadata == {"ss_network_dim": "4"}
+    assert comfy.utils.calculate_parameters(header) == comfy.utils.calculate_parameters(sd)
+    assert comfy.utils.weight_dtype(header) == torch.float16
+
+
+def test_header_of_other_files(tmp_path):
+    assert comfy.utils.load_torch_file_header(str(tmp_path / "model.ckpt")) is None
+    broken = tmp_path / "broken.safetensors"
+    broken.write_bytes(b"not a safetensors file")
+    assert comfy.utils.load_torch_file_header(str(broken)) is None
+    assert comfy.sd.model_info_from_header(str(broken)) is None
+
+
+def test_wrong_file_is_rejected_without_reading_weights(lora_file, monkeypatch):
+    def load_torch_file(*args, **kwargs):
+        raise AssertionError("weights were read")
+    monkeypatch.setattr(comfy.utils, "load_torch_file", load_torch_file)
+    with pytest.raises(RuntimeError, match="Lora file"):
+        comfy.sd.load_checkpoint_guess_config(lora_file)
+    with pytest.raises(RuntimeError, match="Could not detect model type"):
+        comfy.sd.load_diffusion_model(lora_file)
+
+
+@pytest.fixture
+def sd15_header(monkeypatch):
+    model_config = comfy.supported_models.SD15(SD15_UNET_CONFIG)
+    model_config.set_inference_dtype(torch.float16, None)
+    with torch.device("meta"):
+        model = model_config.get_model({}, "model.diffusion_model.")
+    sd = {"model.diffusion_model." + k: v for k, v in model.diffusion_model.state_dict().items()}
+    assert len(sd) == 686
+    monkeypatch.setattr(comfy.utils, "load_torch_file_header", lambda path: (dict(sd), None))
+    return sd
+
+
+def test_model_is_detected_from_header(sd15_header):
+    parameters = comfy.utils.calculate_parameters(sd15_header)
+    for checkpoint in (True, False):
+        info = comfy.sd.model_info_from_header("model.safetensors", checkpoint=checkpoint)
+        assert type(info["model_config"]) is comfy.supported_models.SD15
+        assert info["parameters"] == parameters
+        assert info["weight_dtype"] == torch.float16
+    assert info["diffusion_model_prefix"] == "model.diffusion_model."
+
+
+def test_load_reuses_the_header_detection(sd15_header, monkeypatch):
+    passed = {}
+
+    def load_state_dict_guess_config(sd, *args, model_info=None, **kwargs):
+        passed["checkpoint"] = model_info
+        return (None, None, None, None)
+
+    def load_diffusion_model_state_dict(sd, model_options={}, metadata=None, model_info=None):
+        passed["diffusion_model"] = model_info
+        return object()
+
+    monkeypatch.setattr(comfy.utils, "load_torch_file", lambda *args, **kwargs: ({}, None))
+    monkeypatch.setattr(comfy.sd, "load_state_dict_guess_config", load_state_dict_guess_config)
+    monkeypatch.setattr(comfy.sd, "load_diffusion_model_state_dict", load_diffusion_model_state_dict)
+    comfy.sd.load_checkpoint_guess_config("model.safetensors")
+    comfy.sd.load_diffusion_model("model.safetensors")
+    assert type(passed["checkpoint"]["model_config"]) is comfy.supported_models.SD15
+    assert type(passed["diffusion_model"]["model_config"]) is comfy.supported_models.SD15
+
+
+def test_scale_values_are_left_to_the_full_load(lora_file, monkeypatch):
+    sd, metadata = comfy.utils.load_torch_file_header(lora_file)
+    assert comfy.sd.model_info_from_header(lora_file) is False
+    # convert_old_quants reads the value of scale_input tensors
+    quantized = {**sd, "scaled_fp8": torch.empty(2, device="meta"), "lora_unet_down_blocks_0.scale_input": torch.empty((), device="meta")}
+    monkeypatch.setattr(comfy.utils, "load_torch_file_header", lambda path: (dict(quantized), metadata))
+    assert comfy.sd.model_info_from_header(lora_file, checkpoint=False) is None
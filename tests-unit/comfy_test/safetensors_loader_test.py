@@ -0,0 +1,81 @@
+import json
+import struct
+import pytest
+import safetensors.torch
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.utils  # noqa: E402
+from comfy import safetensors_loader  # noqa: E402
+
+
+@pytest.fixture
+def state_dict():
+    torch.manual_seed(0)
+    return {
+        "a.weight": torch.randn(64, 32),
+        "a.bias": torch.randn(32, dtype=torch.float16),
+        "b.weight": torch.randn(3, 5, 7).to(torch.bfloat16),
+        "c.index": torch.arange(10, dtype=torch.int64),
+        "d.mask": torch.tensor([True, False, True]),
+        "e.empty": torch.zeros(0, 4),
+    }
+
+
+def assert_same(loaded, expected):
+    assert loaded.keys() == expected.keys()
+    for k, v in expected.items():
+        assert loaded[k].dtype == v.dtype
+        assert torch.equal(loaded[k], v), k
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1000, 1 << 20])
+@pytest.mark.parametrize("threads", [1, 3])
+def test_matches_safetensors(tmp_path, state_dict, chunk_size, threads):
+    path = str(tmp_path / "model.safetensors")
+    safetensors.torch.save_file(state_dict, path, metadata={"format": "pt"})
+    sd, metadata = safetensors_loader.load_file(path, threads=threads, chunk_size=chunk_size)
+    assert_same(sd, state_dict)
+    assert metadata == {"format": "pt"}
+
+
+def test_unaligned_offsets(tmp_path):
+    # A 3 byte tensor first leaves the float tensor after it at an odd offset
+    header = {
+        "odd": {"dtype": "U8", "shape": [3], "data_offsets": [0, 3]},
+        "f": {"dtype": "F32", "shape": [2], "data_offsets": [3, 11]},
+    }
+    data = bytes([1, 2, 3]) + struct.pack("<2f", 1.5, -2.0)
+    header_bytes = json.dumps(header).encode()
+    path = tmp_path / "odd.safetensors"
+    path.write_bytes(struct.pack("<Q", len(header_bytes)) + header_bytes + data)
+    sd, _ = safetensors_loader.load_file(str(path))
+    assert sd["odd"].tolist() == [1, 2, 3]
+    assert sd["f"].tolist() == [1.5, -2.0]
+
+
+def test_truncated_file(tmp_path, state_dict):
+    path = tmp_path / "model.safetensors"
+    safetensors.torch.save_file(state_dict, str(path))
+    path.write_bytes(path.read_bytes()[:-16])
+    with pytest.raises(ValueError, match="MetadataIncompleteBuffer"):
+        safetensors_loader.load_file(str(path))
+
+
+def test_load_torch_file_without_mmap(tmp_path, state_dict, monkeypatch):
+    path = str(tmp_path / "model.safetensors")
+    safetensors.torch.save_file(state_dict, path)
+    monkeypatch.setattr(comfy.utils, "DISABLE_MMAP", True)
+    calls = []
+    load_file = safetensors_loader.load_file
+    monkeypatch.setattr(safetensors_loader, "load_file", lambda *a, **kw: calls.append(a) or load_file(*a, **kw))
+    assert_same(comfy.utils.load_torch_file(path), state_dict)
+    assert len(calls) == 1
+
+    path = tmp_path / "broken.safetensors"
+    path.write_bytes(struct.pack("<Q", 1 << 40))
+    with pytest.raises(ValueError, match="corrupt or invalid"):
+        comfy.utils.load_torch_file(str(path))
@@ -0,0 +1,71 @@
+import os
+import threading
+import time
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from comfy.model_management import ModelWarmPool  # noqa: E402
+
+
+def write(path, data=b"weights"):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_same_file_is_loaded_once(tmp_path):
+    pool = ModelWarmPool(4)
+    path = write(tmp_path / "model.safetensors")
+    link = str(tmp_path / "link.safetensors")
+    os.symlink(path, link)
+    first = pool.load("checkpoint", [path], None, object)
+    assert pool.load("checkpoint", [link], None, object) is first
+    assert pool.load("checkpoint", [path], ("fp8",), object) is not first
+    assert pool.load("vae", [path], None, object) is not first
+    assert pool.stats()["hits"] == 1
+
+
+def test_modified_file_is_reloaded(tmp_path):
+    pool = ModelWarmPool(4)
+    path = write(tmp_path / "model.safetensors")
+    first = pool.load("checkpoint", [path], None, object)
+    write(tmp_path / "model.safetensors", b"new weights")
+    assert pool.load("checkpoint", [path], None, object) is not first
+
+
+def test_least_recently_used_is_dropped(tmp_path):
+    pool = ModelWarmPool(2)
+    paths = [write(tmp_path / f"{i}.safetensors") for i in range(3)]
+    models = [pool.load("checkpoint", [p], None, object) for p in paths[:2]]
+    pool.load("checkpoint", [paths[0]], None, object)
+    pool.load("checkpoint", [paths[2]], None, object)
+    assert pool.load("checkpoint", [paths[0]], None, object) is models[0]
+    assert pool.load("checkpoint", [paths[1]], None, object) is not models[1]
+
+
+def test_concurrent_loads_share_one_load(tmp_path):
+    pool = ModelWarmPool(2)
+    path = write(tmp_path / "model.safetensors")
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.load("checkpoint", [path], None, loader))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_disabled_pool(tmp_path):
+    pool = ModelWarmPool(0)
+    path = write(tmp_path / "model.safetensors")
+    assert pool.load("checkpoint", [path], None, object) is not pool.load("checkpoint", [path], None, object)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import nodes  # noqa: E402
+from comfy_execution.caching import CacheKeySetInputSignature  # noqa: E402
+from comfy_execution.graph import DynamicPrompt  # noqa: E402
+
+
+class TestAdd:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"a": ("INT",), "b": ("INT",)}}
+
+
+class TestRandom:
+    NOT_IDEMPOTENT = True
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"seed": ("INT",)}}
+
+
+class FakeIsChangedCache:
+    def __init__(self, values=None):
+        self.values = values or {}
+
+    async def get(self, node_id):
+        return self.values.get(node_id, False)
+
+
+@pytest.fixture(autouse=True)
+def test_nodes(monkeypatch):
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestAdd", TestAdd)
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestRandom", TestRandom)
+
+
+def _keys(prompt, is_changed=None):
+    dynprompt = DynamicPrompt(prompt)
+    key_set = CacheKeySetInputSignature(dynprompt, list(prompt), FakeIsChangedCache(is_changed))
+    asyncio.run(key_set.add_keys(list(prompt)))
+    return key_set
+
+
+def _chain(length, seed=0):
+    prompt = {"0": {"class_type": "TestAdd", "inputs": {"a": seed, "b": 1}}}
+    for i in range(1, length):
+        prompt[str(i)] = {"class_type": "TestAdd", "inputs": {"a": [str(i - 1), 0], "b": i}}
+    return prompt
+
+
+def test_keys_are_stable_across_prompts():
+    first = _keys(_chain(10))
+    second = _keys(_chain(10))
+    assert all(first.get_data_key(n) == second.get_data_key(n) for n in first.all_node_ids())
+
+
+def test_changed_input_changes_only_downstream_keys():
+    prompt = _chain(5)
+    prompt["side"] = {"class_type": "TestAdd", "inputs": {"a": 7, "b": 8}}
+    before = _keys(prompt)
+    prompt["2"]["inputs"]["b"] = 100
+    after = _keys(prompt)
+
+    for node_id in ("0", "1", "side"):
+        assert before.get_data_key(node_id) == after.get_data_key(node_id)
+    for node_id in ("2", "3", "4"):
+        assert before.get_data_key(node_id) != after.get_data_key(node_id)
+
+
+def test_keys_do_not_depend_on_node_ids():
+    prompt = {
+        "1": {"class_type": "TestAdd", "inputs": {"a": 1, "b": 2}},
+        "2": {"class_type": "TestAdd", "inputs": {"a": ["1", 0], "b": 3}},
+    }
+    renamed = {
+        "x": {"class_type": "TestAdd", "inputs": {"a": 1, "b": 2}},
+        "y": {"class_type": "TestAdd", "inputs": {"a": ["x", 0], "b": 3}},
+    }
+    assert _keys(prompt).get_data_key("2") == _keys(renamed).get_data_key("y")
+
+
+def test_input_values_are_typed():
+    keys = _keys({
+        "int": {"class_type": "TestAdd", "inputs": {"a": 1, "b": 1}},
+        "float": {"class_type": "TestAdd", "inputs": {"a": 1.0, "b": 1}},
+        "str": {"class_type": "TestAdd", "inputs": {"a": "1", "b": 1}},
+        "bool": {"class_type": "TestAdd", "inputs": {"a": True, "b": 1}},
+        "socket": {"class_type": "TestAdd", "inputs": {"a": ["int", 1], "b": 1}},
+        "socket0": {"class_type": "TestAdd", "inputs": {"a": ["int", 0], "b": 1}},
+    })
+    assert len({keys.get_data_key(n) for n in keys.all_node_ids()}) == 6
+
+
+def test_not_idempotent_nodes_include_node_id():
+    prompt = {
+        "1": {"class_type": "TestRandom", "inputs": {"seed": 1}},
+        "2": {"class_type": "TestRandom", "inputs": {"seed": 1}},
+    }
+    keys = _keys(prompt)
+    assert keys.get_data_key("1") != keys.get_data_key("2")
+
+
+def test_nan_is_changed_never_matches():
+    prompt = _chain(3)
+    first = _keys(prompt, {"0": [float("nan")]})
+    second = _keys(prompt, {"0": [float("nan")]})
+    for node_id in ("0", "1", "2"):
+        assert first.get_data_key(node_id) != second.get_data_key(node_id)
+
+
+def test_unhashable_input_never_matches():
+    prompt = {"1": {"class_type": "TestAdd", "inputs": {"a": object(), "b": 1}}}
+    assert _keys(prompt).get_data_key("1") != _keys(prompt).get_data_key("1")
+
+
+def test_missing_parent():
+    prompt = {"1": {"class_type": "TestAdd", "inputs": {"a": ["missing", 0], "b": 1}}}
+    assert _keys(prompt).get_data_key("1") != _keys(prompt).get_data_key("1")
+
+
+def test_deep_graph_is_linear():
+    # A long chain used to re-sign every ancestor for every node
+    start = time.perf_counter()
+    keys = _keys(_chain(2000))
+    assert len(keys.all_node_ids()) == 2000
+    assert time.perf_counter() - start < 2
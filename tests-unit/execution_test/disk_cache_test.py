@@ -0,0 +1,202 @@
+import asyncio
+import os
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import folder_paths  # noqa: E402
+import nodes  # noqa: E402
+from comfy_execution import disk_cache  # noqa: E402
+from comfy_execution.caching import CacheKeySetInputSignature, LRUCache  # noqa: E402
+from comfy_execution.disk_cache import DiskCache, DiskCacheStore, MemoryCacheStore, serialize_entry  # noqa: E402
+from comfy_execution.graph import DynamicPrompt  # noqa: E402
+from execution import CacheEntry  # noqa: E402
+
+
+class TestLoader:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"seed": ("INT",)}}
+
+
+class TestModelLoader:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"ckpt_name": ("STRING",)}}
+
+
+class TestSave:
+    OUTPUT_NODE = True
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"seed": ("INT",)}}
+
+
+class FakeIsChangedCache:
+    async def get(self, node_id):
+        return False
+
+
+@pytest.fixture(autouse=True)
+def test_nodes(monkeypatch):
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestLoader", TestLoader)
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestSave", TestSave)
+
+
+def make_prompt(prompt=None):
+    return DynamicPrompt(prompt or {
+        "1": {"class_type": "TestLoader", "inputs": {"seed": 1}},
+        "2": {"class_type": "TestSave", "inputs": {"seed": 1}},
+    })
+
+
+def new_cache(directory, max_bytes=1024 * 1024, prompt=None):
+    store = DiskCacheStore(str(directory), max_bytes)
+    cache = DiskCache(LRUCache(CacheKeySetInputSignature, max_size=10), store, CacheEntry)
+    dynprompt = make_prompt(prompt)
+    asyncio.run(cache.set_prompt(dynprompt, dynprompt.all_node_ids(), FakeIsChangedCache()))
+    return cache, store
+
+
+def roundtrip(store, entry, key=b"k" * 20):
+    store.save(key, serialize_entry(entry))
+    store.flush()
+    return store.load(key, CacheEntry)
+
+
+class TestSerialization:
+    def test_tensors_and_structures(self, tmp_path):
+        store = DiskCacheStore(str(tmp_path), 1024 * 1024)
+        cond = torch.randn(1, 4, 8)
+        latent = {"samples": torch.zeros(1, 4, 8, 8), "batch_index": [0]}
+        entry = CacheEntry(ui=None, outputs=[[latent], [[[cond, {"pooled_output": cond[:, 0]}]]], [1.5, "a", None, (1, 2)]])
+        loaded = roundtrip(store, entry)
+        out_latent, out_cond, out_values = loaded.outputs
+        assert torch.equal(out_latent[0]["samples"], latent["samples"])
+        assert out_latent[0]["batch_index"] == [0]
+        assert torch.equal(out_cond[0][0][0], cond)
+        assert torch.equal(out_cond[0][0][1]["pooled_output"], cond[:, 0])
+        assert out_values == [1.5, "a", None, (1, 2)]
+
+    def test_unserializable_entry(self):
+        assert serialize_entry(CacheEntry(ui=None, outputs=[[object()]])) is None
+        assert serialize_entry(CacheEntry(ui=None, outputs=[[{1: "int key"}]])) is None
+
+    def test_entry_over_size_limit(self):
+        entry = CacheEntry(ui=None, outputs=[[torch.zeros(1024)]])
+        assert serialize_entry(entry, max_bytes=1024) is None
+
+
+class TestDiskCacheStore:
+    def test_evicts_least_recently_used(self, tmp_path):
+        payload = serialize_entry(CacheEntry(ui=None, outputs=[[torch.zeros(256)]]))
+        store = DiskCacheStore(str(tmp_path), int(len(payload) * 2.5))
+        store.save(b"a", payload)
+        store.save(b"b", payload)
+        store.flush()
+        assert store.load(b"a", CacheEntry) is not None
+        store.save(b"c", payload)
+        store.flush()
+        assert store.contains(b"a")
+        assert not store.contains(b"b")
+        assert store.contains(b"c")
+        assert store.total_bytes <= store.max_bytes
+        assert sorted(os.listdir(tmp_path)) == sorted([b"a".hex() + ".safetensors", b"c".hex() + ".safetensors"])
+
+    def test_rescans_directory(self, tmp_path):
+        store = DiskCacheStore(str(tmp_path), 1024 * 1024)
+        roundtrip(store, CacheEntry(ui=None, outputs=[[torch.ones(4)]]), key=b"x")
+        reopened = DiskCacheStore(str(tmp_path), 1024 * 1024)
+        assert reopened.contains(b"x")
+        assert reopened.total_bytes == store.total_bytes
+
+    def test_unreadable_entry_is_dropped(self, tmp_path):
+        store = DiskCacheStore(str(tmp_path), 1024 * 1024)
+        roundtrip(store, CacheEntry(ui=None, outputs=[[torch.ones(4)]]), key=b"x")
+        with open(tmp_path / (b"x".hex() + ".safetensors"), "wb") as f:
+            f.write(b"garbage")
+        assert store.load(b"x", CacheEntry) is None
+        assert not store.contains(b"x")
+
+
+class TestMemoryCacheStore:
+    def test_roundtrip_and_eviction(self):
+        payload = serialize_entry(CacheEntry(ui=None, outputs=[[torch.arange(256)], [(1, "a")]]))
+        store = MemoryCacheStore(int(len(payload) * 2.5))
+        store.save(b"a", payload)
+        store.save(b"b", payload)
+        loaded = store.load(b"a", CacheEntry)
+        assert torch.equal(loaded.outputs[0][0], torch.arange(256))
+        assert loaded.outputs[1] == [(1, "a")]
+        store.save(b"c", payload)
+        assert store.contains(b"a")
+        assert not store.contains(b"b")
+        assert store.total_bytes <= store.max_bytes
+
+    def test_shared_between_caches(self):
+        store = MemoryCacheStore(1024 * 1024)
+        caches = []
+        for _ in range(2):
+            cache = DiskCache(LRUCache(CacheKeySetInputSignature, max_size=10), store, CacheEntry)
+            dynprompt = make_prompt()
+            asyncio.run(cache.set_prompt(dynprompt, dynprompt.all_node_ids(), FakeIsChangedCache()))
+            caches.append(cache)
+        entry = CacheEntry(ui=None, outputs=[[torch.ones(3)]])
+        caches[0].set("1", entry)
+        loaded = caches[1].get("1")
+        assert torch.equal(loaded.outputs[0][0], torch.ones(3))
+        # Workers get their own tensors
+        assert loaded.outputs[0][0] is not entry.outputs[0][0]
+
+
+class TestDiskCache:
+    def test_promotes_after_restart(self, tmp_path):
+        cache, store = new_cache(tmp_path)
+        entry = CacheEntry(ui=None, outputs=[[torch.arange(6)]])
+        cache.set("1", entry)
+        store.flush()
+
+        restarted, _ = new_cache(tmp_path)
+        assert restarted.ram_cache.get("1") is None
+        loaded = restarted.get("1")
+        assert torch.equal(loaded.outputs[0][0], torch.arange(6))
+        assert restarted.ram_cache.get("1") is loaded
+
+    def test_skips_output_nodes_and_ui(self, tmp_path):
+        cache, store = new_cache(tmp_path)
+        cache.set("2", CacheEntry(ui=None, outputs=[[torch.ones(2)]]))
+        store.flush()
+        assert len(store.entries) == 0
+
+        cache.set("1", CacheEntry(ui={"images": []}, outputs=[[torch.ones(2)]]))
+        store.flush()
+        assert len(store.entries) == 0
+
+    def test_key_covers_model_files_and_version(self, tmp_path, monkeypatch):
+        models = tmp_path / "models"
+        models.mkdir()
+        (models / "model.safetensors").write_bytes(b"v1")
+        monkeypatch.setattr(folder_paths, "folder_names_and_paths", {"checkpoints": ([str(models)], {".safetensors"})})
+        monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "TestModelLoader", TestModelLoader)
+
+        def keys():
+            cache, _ = new_cache(tmp_path / "cache", prompt={
+                "1": {"class_type": "TestModelLoader", "inputs": {"ckpt_name": "model.safetensors"}},
+                "2": {"class_type": "TestLoader", "inputs": {"seed": ["1", 0]}},
+                "3": {"class_type": "TestLoader", "inputs": {"seed": 1}},
+            })
+            return [cache._data_key(node_id) for node_id in ("1", "2", "3")]
+
+        before = keys()
+        assert keys() == before
+        (models / "model.safetensors").write_bytes(b"v2 replaced")
+        after = keys()
+        assert after[0] != before[0] and after[1] != before[1]
+        assert after[2] == before[2]
+
+        monkeypatch.setattr(disk_cache, "KEY_SALT", b"comfy_cache/0/0.0.0")
+        assert keys()[2] != before[2]
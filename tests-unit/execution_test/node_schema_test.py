@@ -0,0 +1,142 @@
+import gzip
+import json
+import os
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+import folder_paths
+from comfy_execution.node_schema import NodeSchemaRegistry, etag_matches, is_memoizable
+
+
+def touch_dir(path):
+    # Make sure the change is visible even with coarse directory timestamps
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def model_folder(tmp_path, monkeypatch):
+    folder = tmp_path / "test_models"
+    folder.mkdir()
+    (folder / "a.safetensors").write_bytes(b"")
+    monkeypatch.setitem(folder_paths.folder_names_and_paths, "test_models", ([str(folder)], {".safetensors"}))
+    monkeypatch.delitem(folder_paths.filename_list_cache, "test_models", raising=False)
+    return folder
+
+
+@pytest.fixture
+def input_dir(tmp_path, monkeypatch):
+    folder = tmp_path / "input"
+    folder.mkdir()
+    monkeypatch.setattr(folder_paths, "input_directory", str(folder))
+    return folder
+
+
+def make_loader(calls):
+    class TestLoader:
+        @classmethod
+        def INPUT_TYPES(cls):
+            calls.append(1)
+            return {"required": {"model": (folder_paths.get_filename_list("test_models"),)}}
+    return TestLoader
+
+
+def test_memoized_until_folder_changes(model_folder):
+    calls = []
+    loader = make_loader(calls)
+    registry = NodeSchemaRegistry()
+    assert registry.input_types(loader)["required"]["model"][0] == ["a.safetensors"]
+    registry.input_types(loader)
+    assert len(calls) == 1
+
+    (model_folder / "b.safetensors").write_bytes(b"")
+    touch_dir(model_folder)
+    assert registry.input_types(loader)["required"]["model"][0] == ["a.safetensors", "b.safetensors"]
+    assert len(calls) == 2
+
+
+def test_input_directory_dependency(input_dir):
+    calls = []
+
+    class TestLoadImage:
+        @classmethod
+        def INPUT_TYPES(cls):
+            calls.append(1)
+            return {"required": {"image": (sorted(os.listdir(folder_paths.get_input_directory())),)}}
+
+    registry = NodeSchemaRegistry()
+    assert registry.input_types(TestLoadImage)["required"]["image"][0] == []
+    registry.input_types(TestLoadImage)
+    assert len(calls) == 1
+
+    (input_dir / "new.png").write_bytes(b"")
+    touch_dir(input_dir)
+    assert registry.input_types(TestLoadImage)["required"]["image"][0] == ["new.png"]
+
+
+def test_custom_nodes_are_not_memoized(model_folder):
+    calls = []
+    loader = make_loader(calls)
+    loader.RELATIVE_PYTHON_MODULE = "custom_nodes.example"
+    registry = NodeSchemaRegistry()
+    registry.input_types(loader)
+    registry.input_types(loader)
+    assert len(calls) == 2
+
+
+def test_v3_node_without_module(model_folder):
+    from comfy_api.latest import io
+
+    class V3Loader(io.ComfyNode):
+        @classmethod
+        def define_schema(cls):
+            return io.Schema(node_id="TestV3Loader", inputs=[io.Combo.Input("model", options=folder_paths.get_filename_list("test_models"))], outputs=[])
+
+    assert V3Loader.RELATIVE_PYTHON_MODULE is None
+    assert is_memoizable(V3Loader)
+    registry = NodeSchemaRegistry()
+    assert registry.input_types(V3Loader)["required"]["model"][1]["options"] == ["a.safetensors"]
+
+
+def test_node_info_tracks_nested_dependencies(model_folder):
+    calls = []
+    loader = make_loader(calls)
+    registry = NodeSchemaRegistry()
+    registry.input_types(loader)
+
+    def node_info(node_class):
+        return {"name": node_class, "input": registry.input_types(loader)}
+
+    info, fragment = registry.node_info_fragment("TestLoader", loader, node_info)
+    assert json.loads("{" + fragment + "}") == json.loads(json.dumps({"TestLoader": info}))
+    assert registry.node_info_fragment("TestLoader", loader, node_info)[0] is info
+
+    (model_folder / "b.safetensors").write_bytes(b"")
+    touch_dir(model_folder)
+    info, _ = registry.node_info_fragment("TestLoader", loader, node_info)
+    assert info["input"]["required"]["model"][0] == ["a.safetensors", "b.safetensors"]
+
+
+def test_object_info_body():
+    registry = NodeSchemaRegistry()
+    etag, body, gzip_body = registry.object_info_body(['"A": {"x": 1}', '"B": {}'])
+    assert json.loads(body) == {"A": {"x": 1}, "B": {}}
+    assert gzip.decompress(gzip_body) == body
+    assert registry.object_info_body(['"A": {"x": 1}', '"B": {}'])[0] == etag
+    assert registry.object_info_body(['"A": {"x": 2}', '"B": {}'])[0] != etag
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('*', True),
+    ('"xabcx"', False),
+    ('"ab"', False),
+    ('abc', False),
+    (None, False),
+])
+def test_etag_matches(header, matches):
+    headers = {"If-None-Match": header} if header is not None else {}
+    request = make_mocked_request("GET", "/object_info", headers=headers)
+    assert etag_matches(request.if_none_match, "abc") == matches
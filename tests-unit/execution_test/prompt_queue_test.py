@@ -0,0 +1,256 @@
+import threading
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution  # noqa: E402
+
+
+class FakeServer:
+    def queue_updated(self):
+        pass
+
+
+def run_prompt(queue, number, prompt_id, status_str="success"):
+    queue.put((number, prompt_id, {}, {"create_time": number}, [], {}))
+    item, item_id = queue.get()
+    status = execution.PromptQueue.ExecutionStatus(status_str=status_str, completed=status_str == "success", messages=[])
+    queue.task_done(item_id, {"outputs": {}, "meta": {}}, status, process_item=lambda p: p[:5] + p[6:])
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(execution, "MAXIMUM_HISTORY_SIZE", 5)
+    queue = execution.PromptQueue(FakeServer())
+    for i in range(8):
+        run_prompt(queue, i, f"p{i}", "error" if i % 2 else "success")
+    return queue
+
+
+def test_history_is_bounded(queue):
+    assert list(queue.get_history()) == ["p3", "p4", "p5", "p6", "p7"]
+
+
+def test_history_pagination(queue):
+    assert list(queue.get_history(max_items=2)) == ["p6", "p7"]
+    assert list(queue.get_history(max_items=2, offset=1)) == ["p4", "p5"]
+    assert list(queue.get_history(offset=3)) == ["p6", "p7"]
+    assert list(queue.get_history(max_items=10)) == ["p3", "p4", "p5", "p6", "p7"]
+
+
+def test_history_item(queue):
+    item = queue.get_history(prompt_id="p5")["p5"]
+    assert item["status"]["status_str"] == "error"
+    assert item["prompt"][1] == "p5"
+    assert queue.get_history(prompt_id="p0") == {}
+    assert queue.get_history(prompt_id="p5", map_function=lambda p: p["status"]) == {"p5": item["status"]}
+
+
+def test_delete_and_wipe(queue):
+    queue.delete_history_item("p4")
+    assert list(queue.get_history()) == ["p3", "p5", "p6", "p7"]
+    assert [k[1] for k in queue.history.sorted_keys(["completed"])] == ["p6"]
+    queue.wipe_history()
+    assert queue.get_history() == {}
+
+
+def test_queue_items_are_shared():
+    queue = execution.PromptQueue(FakeServer())
+    item = (0, "p0", {"1": {}}, {}, ["1"], {})
+    queue.put(item)
+    assert queue.get_current_queue()[1][0] is item
+    got, _ = queue.get()
+    assert got is item
+    assert queue.get_current_queue()[0][0] is item
+    assert queue.is_running("p0")
+    assert not queue.is_running("p1")
+
+
+def test_delete_by_id_keeps_order():
+    queue = execution.PromptQueue(FakeServer())
+    for i in [5, 3, 8, 1, 9, 2, 7]:
+        queue.put((i, f"p{i}", {}, {}, [], {}))
+    assert queue.delete_queue_item_by_id("p3")
+    assert queue.delete_queue_item(lambda item: item[1] == "p9")
+    assert not queue.delete_queue_item_by_id("p3")
+    assert queue.get_tasks_remaining() == 5
+    assert sorted(item[1] for item in queue.get_current_queue_volatile()[1]) == ["p1", "p2", "p5", "p7", "p8"]
+    assert [queue.get()[0][1] for _ in range(5)] == ["p1", "p2", "p5", "p7", "p8"]
+    assert queue.get(timeout=0.01) is None
+
+
+def test_deleted_items_are_compacted():
+    queue = execution.PromptQueue(FakeServer())
+    for i in range(100):
+        queue.put((i, f"p{i}", {}, {}, [], {}))
+    for i in range(95):
+        queue.delete_queue_item_by_id(f"p{i}")
+    assert len(queue.queue) < 50
+    assert [queue.get()[0][1] for _ in range(5)] == ["p95", "p96", "p97", "p98", "p99"]
+
+
+def test_affinity_prefers_matching_prompts():
+    queue = execution.PromptQueue(FakeServer())
+    for i in range(4):
+        queue.put((i, f"p{i}", {}, {"model": "b" if i == 2 else "a"}, [], {}))
+
+    def affinity(item):
+        return item[3]["model"] == "b"
+
+    assert queue.get(affinity=affinity)[0][1] == "p2"
+    assert [queue.get(affinity=affinity)[0][1] for _ in range(3)] == ["p0", "p1", "p3"]
+
+
+def test_affinity_does_not_starve_prompts():
+    queue = execution.PromptQueue(FakeServer())
+    queue.put((0, "p0", {}, {"model": "a"}, [], {}))
+    taken = []
+    for i in range(1, 20):
+        queue.put((i, f"p{i}", {}, {"model": "b"}, [], {}))
+        taken.append(queue.get(affinity=lambda item: item[3]["model"] == "b")[0][1])
+    assert "p0" in taken[:queue.AFFINITY_WINDOW + 1]
+
+
+def test_flags_reach_every_worker():
+    queue = execution.PromptQueue(FakeServer())
+    seen = {}
+
+    def worker(name, registered, ready):
+        queue.register_worker()
+        registered.set()
+        ready.wait()
+        seen[name] = queue.get_flags()
+
+    ready = threading.Event()
+    threads = []
+    for name in ("a", "b"):
+        registered = threading.Event()
+        thread = threading.Thread(target=worker, args=(name, registered, ready))
+        thread.start()
+        registered.wait()
+        threads.append(thread)
+    assert queue.worker_count() == 2
+    queue.set_flag("unload_models", True)
+    ready.set()
+    for thread in threads:
+        thread.join()
+    assert seen == {"a": {"unload_models": True}, "b": {"unload_models": True}}
+
+
+def test_running_threads():
+    queue = execution.PromptQueue(FakeServer())
+    queue.put((0, "p0", {}, {}, [], {}))
+    _, item_id = queue.get()
+    assert queue.get_running_threads() == {"p0": threading.get_ident()}
+    queue.task_done(item_id, {"outputs": {}}, None)
+    assert queue.get_running_threads() == {}
+
+
+class CoalescingServer(FakeServer):
+    def __init__(self):
+        self.results = []
+
+    def send_coalesced_result(self, item, history_item):
+        self.results.append((item[1], history_item["coalesced_with"]))
+
+
+def finish(queue, item_id, status_str="success", messages=()):
+    status = execution.PromptQueue.ExecutionStatus(status_str=status_str, completed=status_str == "success", messages=list(messages))
+    queue.task_done(item_id, {"outputs": {"9": {"images": ["a.png"]}}}, status)
+
+
+def test_coalesce_key_ignores_metadata():
+    prompt = {"1": {"class_type": "A", "inputs": {"x": 1}, "_meta": {"title": "a"}}}
+    renamed = {"1": {"class_type": "A", "inputs": {"x": 1}, "_meta": {"title": "b"}}}
+    key = execution.coalesce_key(prompt, ["1"])
+    assert execution.coalesce_key(renamed, ["1"]) == key
+    assert execution.coalesce_key({"1": {"class_type": "A", "inputs": {"x": 2}}}, ["1"]) != key
+    assert execution.coalesce_key(prompt, ["1"], {"api_key_comfy_org": "k"}) != key
+
+
+def test_identical_prompts_run_once():
+    server = CoalescingServer()
+    queue = execution.PromptQueue(server)
+    assert queue.put((0, "p0", {}, {}, [], {}), coalesce_key="k") is None
+    assert queue.put((1, "p1", {}, {}, [], {}), coalesce_key="k") == "p0"
+    assert queue.put((2, "p2", {}, {}, [], {}), coalesce_key="other") is None
+    assert queue.get_tasks_remaining() == 3
+    assert [item[1] for item in queue.get_current_queue()[1]] == ["p0", "p2", "p1"]
+
+    item, item_id = queue.get()
+    assert item[1] == "p0"
+    assert queue.put((3, "p3", {}, {"client_id": "c"}, [], {"api_key_comfy_org": "k"}), coalesce_key="k") == "p0"
+    finish(queue, item_id)
+    assert server.results == [("p1", "p0"), ("p3", "p0")]
+    history = queue.get_history()
+    assert history["p3"]["outputs"] == history["p0"]["outputs"]
+    assert history["p3"]["prompt"] == (3, "p3", {}, {"client_id": "c"}, [])
+    assert queue.get()[0][1] == "p2"
+    assert queue.get(timeout=0.01) is None
+
+    # Once finished, an identical prompt runs again
+    assert queue.put((4, "p4", {}, {}, [], {}), coalesce_key="k") is None
+
+
+def test_recently_completed_prompts_are_reused():
+    server = CoalescingServer()
+    queue = execution.PromptQueue(server)
+    queue.coalesce_window = 60
+    queue.put((0, "p0", {}, {}, [], {}), coalesce_key="k")
+    finish(queue, queue.get()[1])
+    assert queue.put((1, "p1", {}, {}, [], {}), coalesce_key="k") == "p0"
+    assert server.results == [("p1", "p0")]
+    assert queue.get_tasks_remaining() == 0
+
+    queue.coalesce_window = 0
+    assert queue.put((2, "p2", {}, {}, [], {}), coalesce_key="k") is None
+
+
+def test_failed_prompts_are_not_reused():
+    queue = execution.PromptQueue(CoalescingServer())
+    queue.coalesce_window = 60
+    queue.put((0, "p0", {}, {}, [], {}), coalesce_key="k")
+    finish(queue, queue.get()[1], "error")
+    assert queue.put((1, "p1", {}, {}, [], {}), coalesce_key="k") is None
+
+
+def test_followers_take_over():
+    queue = execution.PromptQueue(CoalescingServer())
+    for i in range(4):
+        queue.put((i, f"p{i}", {}, {}, [], {}), coalesce_key="k")
+    # The first attached prompt replaces a deleted leader
+    assert queue.delete_queue_item_by_id("p0")
+    assert queue.delete_queue_item_by_id("p2")
+    assert [item[1] for item in queue.get_current_queue()[1]] == ["p1", "p3"]
+
+    # and an interrupted one, whose interruption was not meant for it
+    _, item_id = queue.get()
+    finish(queue, item_id, "error", [("execution_interrupted", {"prompt_id": "p1"})])
+    item, item_id = queue.get(timeout=0.01)
+    assert item[1] == "p3"
+    assert "p3" not in queue.get_history()
+
+
+def test_follower_raises_leader_priority():
+    queue = execution.PromptQueue(CoalescingServer())
+    queue.put((5, "p5", {}, {}, [], {}), coalesce_key="k")
+    queue.put((3, "p3", {}, {}, [], {}))
+    queue.put((-1, "front", {}, {}, [], {}), coalesce_key="k")
+    assert queue.get()[0][1] == "p5"
+
+
+def test_wipe_removes_followers():
+    queue = execution.PromptQueue(CoalescingServer())
+    queue.put((0, "p0", {}, {}, [], {}), coalesce_key="k")
+    queue.put((1, "p1", {}, {}, [], {}), coalesce_key="q")
+    _, item_id = queue.get()
+    queue.put((2, "p2", {}, {}, [], {}), coalesce_key="k")
+    queue.put((3, "p3", {}, {}, [], {}), coalesce_key="q")
+    queue.wipe_queue()
+    assert queue.get_tasks_remaining() == 1
+    finish(queue, item_id)
+    assert list(queue.get_history()) == ["p0"]
+    assert queue.put((4, "p4", {}, {}, [], {}), coalesce_key="q") is None
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import folder_paths  # noqa: E402
+import nodes  # noqa: E402
+import execution  # noqa: E402
+from comfy_execution.validation import ValidationCache  # noqa: E402
+
+validate_calls = []
+
+
+class TestSource:
+    RETURN_TYPES = ("INT",)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("INT", {"min": 0, "max": 100})}}
+
+
+class TestLoadFile:
+    RETURN_TYPES = ("INT",)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"file": ("STRING",)}}
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, file):
+        validate_calls.append(file)
+        if not os.path.exists(os.path.join(folder_paths.get_input_directory(), file)):
+            return f"Invalid file: {file}"
+        return True
+
+
+class TestSink:
+    OUTPUT_NODE = True
+    RETURN_TYPES = ()
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"a": ("INT",), "b": ("INT",)}}
+
+
+class TestImageSink:
+    OUTPUT_NODE = True
+    RETURN_TYPES = ()
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"image": ("IMAGE",)}}
+
+
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, tmp_path):
+    for cls in (TestSource, TestLoadFile, TestSink, TestImageSink):
+        monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, cls.__name__, cls)
+    monkeypatch.setattr(execution, "validation_cache", ValidationCache())
+    monkeypatch.setattr(folder_paths, "input_directory", str(tmp_path))
+    (tmp_path / "a.png").write_bytes(b"")
+    validate_calls.clear()
+
+
+def make_prompt(value="5", file="a.png"):
+    return {
+        "1": {"class_type": "TestSource", "inputs": {"value": value}},
+        "2": {"class_type": "TestLoadFile", "inputs": {"file": file}},
+        "3": {"class_type": "TestSink", "inputs": {"a": ["1", 0], "b": ["2", 0]}},
+    }
+
+
+def validate(prompt):
+    return asyncio.run(execution.validate_prompt("id", prompt, None))
+
+
+def test_repeated_prompt_hits():
+    assert validate(make_prompt())[0] is True
+    assert execution.validation_cache.stats()["misses"] == 3
+
+    prompt = make_prompt()
+    assert validate(prompt)[0] is True
+    assert execution.validation_cache.stats()["hits"] == 3
+    assert validate_calls == ["a.png"]
+    # Widget values are still converted on a hit
+    assert prompt["1"]["inputs"]["value"] == 5
+
+
+def test_only_changed_nodes_are_revalidated():
+    validate(make_prompt(value="5"))
+    assert validate(make_prompt(value="7"))[0] is True
+    stats = execution.validation_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 4)
+    assert validate_calls == ["a.png"]
+
+
+def test_failures_are_not_cached():
+    assert validate(make_prompt(value="500"))[0] is False
+    assert validate(make_prompt(value="500"))[0] is False
+    assert execution.validation_cache.stats()["size"] == 1
+
+
+def test_folder_change_invalidates(tmp_path):
+    assert validate(make_prompt())[0] is True
+    os.remove(tmp_path / "a.png")
+    st = os.stat(tmp_path)
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    ok, _, _, node_errors = validate(make_prompt())
+    assert ok is False
+    assert "2" in node_errors
+    assert validate_calls == ["a.png", "a.png"]
+
+
+def test_file_change_in_subfolder_invalidates(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.png").write_bytes(b"")
+    prompt = {
+        "1": {"class_type": "LoadImage", "inputs": {"image": "sub/a.png"}},
+        "2": {"class_type": "TestImageSink", "inputs": {"image": ["1", 0]}},
+    }
+    assert validate(prompt)[0] is True
+    assert validate(prompt)[0] is True
+    assert execution.validation_cache.stats()["hits"] == 2
+
+    # The mtime of the input directory itself doesn't change
+    st = os.stat(tmp_path)
+    os.remove(tmp_path / "sub" / "a.png")
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    ok, _, _, node_errors = validate(prompt)
+    assert ok is False
+    assert "Invalid image file" in node_errors["1"]["errors"][0]["details"]
+
+
+def test_custom_nodes_are_not_cached(monkeypatch):
+    monkeypatch.setattr(TestLoadFile, "RELATIVE_PYTHON_MODULE", "custom_nodes.example", raising=False)
+    validate(make_prompt())
+    validate(make_prompt())
+    assert validate_calls == ["a.png", "a.png"]
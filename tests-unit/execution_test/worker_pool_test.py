@@ -0,0 +1,157 @@
+import threading
+import weakref
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.model_management  # noqa: E402
+import comfy.model_patcher  # noqa: E402
+from comfy_execution import worker_pool  # noqa: E402
+from comfy_execution.graph import DynamicPrompt  # noqa: E402
+from comfy_execution.progress import get_progress_state, reset_progress_state  # noqa: E402
+
+
+def run_in_thread(fn):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def make_prompt(ckpt_name, lora_name=None):
+    prompt = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": ckpt_name}},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "a.safetensors", "clip": ["1", 1]}},
+    }
+    if lora_name is not None:
+        prompt["3"] = {"class_type": "LoraLoader", "inputs": {"lora_name": lora_name, "model": ["1", 0]}}
+    return prompt
+
+
+def test_model_files():
+    assert worker_pool.model_files(make_prompt("sd.safetensors", "detail.safetensors")) == {
+        ("ckpt_name", "sd.safetensors"), ("lora_name", "detail.safetensors"),
+    }
+
+
+def test_model_affinity():
+    affinity = worker_pool.ModelAffinity(max_prompts=2)
+    item = (0, "p", make_prompt("sd.safetensors", "detail.safetensors"))
+    assert affinity(item) == 0
+    affinity.update((0, "p", make_prompt("sd.safetensors")))
+    assert affinity(item) == 1
+    affinity.update((0, "p", make_prompt("xl.safetensors")))
+    affinity.update((0, "p", make_prompt("xl.safetensors")))
+    assert affinity(item) == 0
+
+
+class FakeServer:
+    def __init__(self):
+        self.client_id = "shared"
+        self.sockets = {}
+        self.worker_nodes = {}
+
+
+def test_worker_server_keeps_prompt_state_apart():
+    server = FakeServer()
+    a = worker_pool.WorkerServer(server)
+    b = worker_pool.WorkerServer(server)
+    a.client_id = "a"
+    b.client_id = "b"
+    a.sockets["x"] = 1
+    assert (a.client_id, b.client_id, server.client_id) == ("a", "b", "shared")
+    assert b.sockets == {"x": 1}
+    a.number = 5
+    assert server.number == 5
+
+    # Published so a reconnecting client is sent the node its prompt runs
+    a.last_prompt_id = "p1"
+    a.last_node_id = "9"
+    b.last_node_id = None
+    assert sorted(server.worker_nodes.values(), key=str) == [("a", "p1", "9"), ("b", None, None)]
+
+    worker_pool.bind_worker_server(a)
+    assert worker_pool.current_server(server) is a
+    assert run_in_thread(lambda: worker_pool.current_server(server)) is server
+
+
+def test_thread_device():
+    default = comfy.model_management.get_torch_device()
+
+    def pinned():
+        comfy.model_management.set_thread_torch_device(torch.device("meta"))
+        return comfy.model_management.get_torch_device()
+
+    assert run_in_thread(pinned) == torch.device("meta")
+    assert comfy.model_management.get_torch_device() == default
+
+
+def test_loads_on_other_devices_run_concurrently(monkeypatch):
+    mm = comfy.model_management
+    monkeypatch.setattr(mm, "current_loaded_models", [])
+    monkeypatch.setattr(mm, "get_free_memory", lambda dev=None, torch_free_too=False: (1 << 40, 1 << 40) if torch_free_too else 1 << 40)
+    monkeypatch.setattr(mm, "soft_empty_cache", lambda force=False: None)
+    loading = threading.Event()
+    release = threading.Event()
+
+    def model_load(self, lowvram_model_memory=0, force_patch_weights=False):
+        # Stands in for the weight transfer, which takes a while
+        if self.device.index == 1:
+            loading.set()
+            release.wait(5)
+        self.real_model = weakref.ref(self.model.model)
+        self.model_finalizer = weakref.finalize(self.model.model, lambda: None)
+        return self.model.model
+
+    monkeypatch.setattr(mm.LoadedModel, "model_load", model_load)
+    patchers = [comfy.model_patcher.ModelPatcher(torch.nn.Sequential(torch.nn.Linear(4, 4)), torch.device("cuda", i), torch.device("cpu"))
+                for i in (1, 2)]
+
+    slow = threading.Thread(target=mm.load_models_gpu, args=([patchers[0]],))
+    slow.start()
+    try:
+        assert loading.wait(5)
+        fast = threading.Thread(target=mm.load_models_gpu, args=([patchers[1]],))
+        fast.start()
+        fast.join(5)
+        assert not fast.is_alive()
+        assert mm.loaded_models() == [patchers[1]]
+    finally:
+        release.set()
+        slow.join()
+    assert mm.loaded_models() == [patchers[0], patchers[1]]
+
+
+def test_thread_interrupt():
+    done = threading.Event()
+    interrupted = threading.Event()
+    result = {}
+
+    def worker():
+        interrupted.wait()
+        result["worker"] = comfy.model_management.processing_interrupted()
+        done.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    comfy.model_management.interrupt_current_processing(thread_id=thread.ident)
+    interrupted.set()
+    done.wait()
+    thread.join()
+    assert result["worker"]
+    assert not comfy.model_management.processing_interrupted()
+    comfy.model_management.interrupt_current_processing(False, thread_id=thread.ident)
+
+
+def test_progress_state_per_thread():
+    reset_progress_state("main", DynamicPrompt({}))
+
+    def worker():
+        reset_progress_state("worker", DynamicPrompt({}))
+        return get_progress_state().prompt_id
+
+    assert run_in_thread(worker) == "worker"
+    assert get_progress_state().prompt_id == "main"
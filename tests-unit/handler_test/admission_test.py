@@ -0,0 +1,81 @@
+import types
+
+import pytest
+
+import handler
+
+GB = 1024 ** 3
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+def _stats(ram_free=32 * GB, vram_free=16 * GB):
+    return {
+        "system": {"ram_total": 64 * GB, "ram_free": ram_free},
+        "devices": [{"name": "cuda:0", "vram_total": 24 * GB, "vram_free": vram_free}],
+    }
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(handler, "MAX_CONCURRENCY", 4)
+    monkeypatch.setattr(handler, "ADMISSION_MIN_FREE_VRAM_MB", 1024)
+    monkeypatch.setattr(handler, "ADMISSION_MIN_FREE_RAM_MB", 1024)
+    connection = types.SimpleNamespace(ready=True, last_status=None)
+    controller = handler.AdmissionController(connection)
+
+    def serve(payload):
+        monkeypatch.setattr(controller._session, "get", lambda *a, **kw: FakeResponse(payload))
+        controller.refresh()
+
+    controller.serve = serve
+    return controller
+
+
+def test_keeps_current_until_first_snapshot(controller):
+    assert controller.concurrency_modifier(1) == 1
+
+
+def test_admits_max_concurrency_with_free_memory(controller):
+    controller.serve(_stats())
+    assert controller.concurrency_modifier(1) == 4
+
+
+def test_single_job_when_concurrency_disabled(controller, monkeypatch):
+    monkeypatch.setattr(handler, "MAX_CONCURRENCY", 1)
+    controller.serve(_stats())
+    assert controller.concurrency_modifier(3) == 1
+
+
+def test_memory_pressure_with_hysteresis(controller):
+    controller.serve(_stats(vram_free=512 * 1024 ** 2))
+    assert controller.under_pressure
+    assert controller.concurrency_modifier(4) == 1
+
+    # Back above the threshold but not above threshold * HYSTERESIS: stay at one job
+    controller.serve(_stats(vram_free=1200 * 1024 ** 2))
+    assert controller.concurrency_modifier(1) == 1
+
+    controller.serve(_stats(vram_free=2 * GB))
+    assert not controller.under_pressure
+    assert controller.concurrency_modifier(1) == 4
+
+
+def test_low_ram_is_pressure(controller):
+    controller.serve(_stats(ram_free=100 * 1024 ** 2))
+    assert controller.concurrency_modifier(4) == 1
+
+
+def test_backed_up_queue_keeps_current(controller):
+    controller.serve(_stats())
+    controller.connection.last_status = {"exec_info": {"queue_remaining": 9}}
+    assert controller.concurrency_modifier(2) == 2
@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+import handler
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeConnection:
+    """Stands in for the worker's websocket: every prompt finishes at once."""
+    client_id = "worker-client"
+    ready = True
+
+    def __init__(self):
+        self.registered = set()
+
+    def register_prompt(self, prompt_id):
+        self.registered.add(prompt_id)
+
+    def unregister_prompt(self, prompt_id):
+        self.registered.discard(prompt_id)
+
+    def wait_for_prompt(self, prompt_id, errors, on_executed=None):
+        assert prompt_id in self.registered
+        return True
+
+
+class FakeComfy:
+    """The parts of ComfyUI's HTTP API the handler uses."""
+
+    def __init__(self):
+        self.uploads = []
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def upload_image(self, request):
+        form = await request.post()
+        self.uploads.append(form["image"].filename)
+        return web.json_response({"name": form["image"].filename})
+
+    async def prompt(self, request):
+        body = await request.json()
+        if "bad" in body["prompt"]:
+            return web.Response(status=400, text=json.dumps({"error": {"message": "Prompt outputs failed validation"}}))
+        self.prompts.append(body)
+        return web.json_response({"prompt_id": body["prompt_id"], "number": 0})
+
+    async def history(self, request):
+        prompt_id = request.match_info["prompt_id"]
+        images = [{"filename": f"out_{i}.png", "subfolder": "", "type": "output"} for i in range(4)]
+        return web.json_response({prompt_id: {"outputs": {"9": {"images": images}}, "status": {"status_str": "success"}}})
+
+    async def view(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return web.Response(body=request.query["filename"].encode())
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/upload/image", self.upload_image)
+        app.router.add_post("/prompt", self.prompt)
+        app.router.add_get("/history/{prompt_id}", self.history)
+        app.router.add_get("/view", self.view)
+        return app
+
+
+@pytest_asyncio.fixture
+async def comfy(aiohttp_server, monkeypatch):
+    fake = FakeComfy()
+    server = await aiohttp_server(fake.app())
+    monkeypatch.setattr(handler, "COMFY_HOST", f"{server.host}:{server.port}")
+    monkeypatch.setattr(handler, "COLOCATED_OUTPUTS", False)
+    monkeypatch.setattr(handler, "COMFY_HTTP_CONCURRENCY", 2)
+    monkeypatch.setattr(handler, "_http_session", None)
+    monkeypatch.delenv("BUCKET_ENDPOINT_URL", raising=False)
+    connection = FakeConnection()
+    monkeypatch.setattr(handler, "get_comfy_connection", lambda: connection)
+    yield fake
+    if handler._http_session is not None:
+        await handler._http_session.close()
+
+
+def _job(workflow=None, images=None):
+    job_input = {"workflow": workflow or {"1": {"class_type": "SaveImage", "inputs": {}}}}
+    if images is not None:
+        job_input["images"] = images
+    return {"id": "job1", "input": job_input}
+
+
+async def test_runs_job_through_pooled_session(comfy):
+    images = [{"name": f"in_{i}.png", "image": "data:image/png;base64," + base64.b64encode(b"png").decode()} for i in range(3)]
+
+    result = await handler.async_handler(_job(images=images))
+
+    assert sorted(comfy.uploads) == ["in_0.png", "in_1.png", "in_2.png"]
+    assert comfy.prompts[0]["client_id"] == "worker-client"
+    assert [entry["filename"] for entry in result["images"]] == [f"out_{i}.png" for i in range(4)]
+    assert base64.b64decode(result["images"][0]["data"]) == b"out_0.png"
+    assert "errors" not in result
+    # Outputs are fetched concurrently, bounded by COMFY_HTTP_CONCURRENCY
+    assert comfy.max_in_flight == 2
+
+
+async def test_session_is_reused_between_jobs(comfy):
+    await handler.async_handler(_job())
+    session = handler._http_session
+    await handler.async_handler(_job())
+    assert handler._http_session is session
+    assert not session.closed
+
+
+async def test_validation_error_is_returned(comfy, monkeypatch):
+    monkeypatch.setattr(handler, "get_available_models", lambda: {})
+    result = await handler.async_handler(_job(workflow={"bad": {}}))
+    assert "Prompt outputs failed validation" in result["error"]
+    assert comfy.prompts == []
+
+
+async def test_invalid_image_is_not_queued(comfy):
+    result = await handler.async_handler(_job(images=[{"name": "x.png", "image": "not base64!"}]))
+    assert result["error"] == "Failed to upload one or more input images"
+    assert comfy.prompts == []
+
+
+async def test_not_ready_connection(comfy, monkeypatch):
+    connection = handler.get_comfy_connection()
+    monkeypatch.setattr(connection, "ready", False)
+    monkeypatch.setattr(connection, "wait_ready", lambda timeout: False, raising=False)
+    result = await handler.async_handler(_job())
+    assert "not reachable" in result["error"]
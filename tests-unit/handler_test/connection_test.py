@@ -0,0 +1,133 @@
+import json
+import threading
+
+import pytest
+import websocket
+
+import handler
+
+
+def message(event_type, **data):
+    return json.dumps({"type": event_type, "data": data})
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    monkeypatch.setattr(handler, "WEBSOCKET_RECONNECT_ATTEMPTS", 1)
+    monkeypatch.setattr(handler, "WEBSOCKET_RECONNECT_DELAY_S", 0.05)
+    monkeypatch.setattr(handler, "_comfy_server_status", lambda: {"reachable": True, "status_code": 200})
+    return handler.ComfyConnection("127.0.0.1:8188")
+
+
+def wait_in_thread(connection, prompt_id, **kwargs):
+    result = {"errors": []}
+
+    def run():
+        try:
+            result["done"] = connection.wait_for_prompt(prompt_id, result["errors"], **kwargs)
+        except Exception as e:
+            result["exception"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def test_ready_from_status_event(connection):
+    assert not connection.ready
+    assert not connection.wait_ready(0.01)
+    connection._on_message(None, message("status", status={"exec_info": {"queue_remaining": 2}}))
+    assert connection.ready
+    assert connection.wait_ready(0)
+    assert connection.last_status == {"exec_info": {"queue_remaining": 2}}
+    assert connection.ws_url.endswith("clientId=" + connection.client_id)
+
+
+def test_close_marks_unavailable(connection):
+    connection._on_message(None, message("status", status={}))
+    connection._on_close(None, 1006, "gone")
+    assert not connection.ready
+
+
+def test_ignores_invalid_messages(connection):
+    connection._on_message(None, b"\x00binary preview")
+    connection._on_message(None, "{not json")
+    assert not connection.ready
+    assert connection.last_message_time is not None
+
+
+def test_prompt_completed_while_disconnected(connection, monkeypatch):
+    monkeypatch.setattr(handler, "get_history", lambda prompt_id: {prompt_id: {"status": {"status_str": "success"}}})
+    connection.register_prompt("p1")
+    thread, result = wait_in_thread(connection, "p1")
+    connection._on_close(None, 1006, "gone")
+    connection._on_message(None, message("status", status={}))
+    thread.join(5)
+    assert result["done"] is True
+
+
+def test_prompt_failed_while_disconnected(connection, monkeypatch):
+    monkeypatch.setattr(handler, "get_history", lambda prompt_id: {prompt_id: {"status": {"status_str": "error"}}})
+    connection.register_prompt("p1")
+    connection._on_close(None, 1006, "gone")
+    connection._on_message(None, message("status", status={}))
+    errors = []
+    assert connection.wait_for_prompt("p1", errors) is False
+    assert "failed while the websocket was disconnected" in errors[0]
+
+
+def test_prompt_still_running_after_reconnect(connection, monkeypatch):
+    monkeypatch.setattr(handler, "get_history", lambda prompt_id: {})
+    connection.register_prompt("p1")
+    thread, result = wait_in_thread(connection, "p1")
+    connection._on_close(None, 1006, "gone")
+    connection._on_message(None, message("status", status={}))
+    connection._on_message(None, message("executing", prompt_id="p1", node=None))
+    thread.join(5)
+    assert result["done"] is True
+
+
+def test_reconnect_timeout(connection):
+    connection.register_prompt("p1")
+    connection._on_close(None, 1006, "gone")
+    with pytest.raises(websocket.WebSocketConnectionClosedException):
+        connection.wait_for_prompt("p1", [])
+
+
+def test_comfy_down(connection, monkeypatch):
+    monkeypatch.setattr(handler, "_comfy_server_status", lambda: {"reachable": False, "error": "refused"})
+    connection.register_prompt("p1")
+    connection._on_close(None, 1006, "gone")
+    with pytest.raises(websocket.WebSocketConnectionClosedException, match="unreachable"):
+        connection.wait_for_prompt("p1", [])
+
+
+def test_events_are_routed_by_prompt(connection):
+    connection.register_prompt("p1")
+    connection.register_prompt("p2")
+    outputs = {"p1": [], "p2": []}
+    thread1, result1 = wait_in_thread(connection, "p1", on_executed=outputs["p1"].append)
+    thread2, result2 = wait_in_thread(connection, "p2", on_executed=outputs["p2"].append)
+
+    connection._on_message(None, message("executed", prompt_id="p2", node="9", output={"images": ["b.png"]}))
+    connection._on_message(None, message("executed", prompt_id="p1", node="9", output={"images": ["a.png"]}))
+    connection._on_message(None, message("executing", prompt_id="other", node=None))
+    connection._on_message(None, message("execution_error", prompt_id="p2", node_id="3", node_type="KSampler", exception_message="oom"))
+    thread2.join(5)
+    assert result2["done"] is False
+    assert "KSampler" in result2["errors"][0]
+    assert thread1.is_alive()
+
+    connection._on_message(None, message("executing", prompt_id="p1", node="9"))
+    connection._on_message(None, message("executing", prompt_id="p1", node=None))
+    thread1.join(5)
+    assert result1 == {"errors": [], "done": True}
+    assert outputs == {"p1": [{"images": ["a.png"]}], "p2": [{"images": ["b.png"]}]}
+
+
+def test_unregistered_prompt_events_are_dropped(connection):
+    connection.register_prompt("p1")
+    connection.unregister_prompt("p1")
+    connection._on_message(None, message("executing", prompt_id="p1", node=None))
+    assert connection._prompt_events == {}
+    connection.unregister_prompt("p1")
@@ -0,0 +1,65 @@
+import pytest
+
+import folder_paths
+import handler
+
+
+@pytest.fixture
+def output_dir(monkeypatch, tmp_path):
+    output = tmp_path / "output"
+    (output / "sub").mkdir(parents=True)
+    (output / "image.png").write_bytes(b"png")
+    (output / "sub" / "nested.png").write_bytes(b"png")
+    # A sibling whose name starts with the output directory's name
+    (tmp_path / "output_secret").mkdir()
+    (tmp_path / "output_secret" / "key.png").write_bytes(b"secret")
+    (tmp_path / "secret.png").write_bytes(b"secret")
+    monkeypatch.setattr(folder_paths, "output_directory", str(output))
+    return output
+
+
+def test_resolves_outputs(output_dir):
+    assert handler._resolve_local_output_path("image.png", "", "output") == str(output_dir / "image.png")
+    assert handler._resolve_local_output_path("nested.png", "sub", "output") == str(output_dir / "sub" / "nested.png")
+    assert handler._resolve_local_output_path("image.png", "", None) == str(output_dir / "image.png")
+
+
+@pytest.mark.parametrize("filename, subfolder", [
+    ("../secret.png", ""),
+    ("/etc/passwd", ""),
+    ("", ""),
+    ("secret.png", ".."),
+    ("secret.png", "sub/../.."),
+    ("key.png", "../output_secret"),
+    ("passwd", "/etc"),
+])
+def test_rejects_paths_outside_the_output_directory(output_dir, filename, subfolder):
+    assert handler._resolve_local_output_path(filename, subfolder, "output") is None
+
+
+def test_directory_part_of_filename_is_ignored(output_dir):
+    assert handler._resolve_local_output_path("sub/image.png", "", "output") == str(output_dir / "image.png")
+
+
+def test_missing_or_unknown(output_dir, monkeypatch):
+    assert handler._resolve_local_output_path("missing.png", "", "output") is None
+    assert handler._resolve_local_output_path("sub", "", "output") is None
+    assert handler._resolve_local_output_path("image.png", "", "models") is None
+    monkeypatch.setattr(handler, "folder_paths", None)
+    assert handler._resolve_local_output_path("image.png", "", "output") is None
+
+
+def test_deliver_output_falls_back_to_view(output_dir, monkeypatch):
+    monkeypatch.setattr(handler, "COLOCATED_OUTPUTS", True)
+    fetched = []
+
+    def get_image_data(filename, subfolder, image_type):
+        fetched.append(filename)
+        return b"remote"
+
+    monkeypatch.setattr(handler, "get_image_data", get_image_data)
+    entry, error = handler._deliver_output("job1", "image.png", "", "output")
+    assert error is None and entry["data"] == "cG5n"
+    entry, error = handler._deliver_output("job1", "../secret.png", "", "output")
+    assert entry["data"] == "cmVtb3Rl"
+    assert fetched == ["../secret.png"]
@@ -0,0 +1,108 @@
+import os
+import pytest
+from urllib.parse import urlparse
+
+import folder_paths
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+import handler  # noqa: E402
+
+BUCKET = "test-outputs"
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    monkeypatch.setenv("BUCKET_ENDPOINT_URL", "https://s3.us-east-1.amazonaws.com")
+    monkeypatch.setenv("BUCKET_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("BUCKET_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("BUCKET_NAME", BUCKET)
+    # Small multipart threshold so a few MB exercise the multipart path (S3 parts are >= 5 MB)
+    monkeypatch.setattr(handler, "S3_MULTIPART_THRESHOLD_MB", 5)
+    monkeypatch.setattr(handler, "S3_MULTIPART_CHUNK_MB", 5)
+    monkeypatch.setattr(handler, "_s3_client", None)
+    monkeypatch.setattr(handler, "_s3_transfer_config", None)
+    monkeypatch.setattr(handler, "COLOCATED_OUTPUTS", True)
+    monkeypatch.setattr(folder_paths, "output_directory", str(tmp_path))
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _object_for_url(url):
+    # Presigned URLs look like https://<host>/<bucket>/<job_id>/<name>?...
+    path = urlparse(url).path.lstrip("/")
+    if path.startswith(BUCKET + "/"):
+        path = path[len(BUCKET) + 1:]
+    return path
+
+
+def test_small_output_is_uploaded_in_one_put(s3, tmp_path):
+    (tmp_path / "image.png").write_bytes(b"png" * 100)
+
+    url = handler.upload_output_to_s3("job1", "image.png", file_path=str(tmp_path / "image.png"))
+
+    key = _object_for_url(url)
+    assert key.startswith("job1/") and key.endswith(".png")
+    obj = s3.get_object(Bucket=BUCKET, Key=key)
+    assert obj["Body"].read() == b"png" * 100
+    assert obj["ContentType"] == "image/png"
+    assert "-" not in obj["ETag"]
+
+
+def test_large_output_uses_multipart_upload(s3, tmp_path):
+    data = os.urandom(12 * 1024 * 1024)
+    (tmp_path / "clip.mp4").write_bytes(data)
+
+    url = handler.upload_output_to_s3("job1", "clip.mp4", file_path=str(tmp_path / "clip.mp4"))
+
+    obj = s3.get_object(Bucket=BUCKET, Key=_object_for_url(url))
+    assert obj["Body"].read() == data
+    assert obj["ContentType"] == "video/mp4"
+    # Multipart ETags carry the part count as a suffix
+    assert obj["ETag"].strip('"').endswith("-3")
+
+
+def test_in_memory_output_is_uploaded(s3):
+    url = handler.upload_output_to_s3("job1", "image.webp", data=b"webp-bytes")
+
+    obj = s3.get_object(Bucket=BUCKET, Key=_object_for_url(url))
+    assert obj["Body"].read() == b"webp-bytes"
+
+
+def test_pipeline_uploads_outputs_announced_by_executed_events(s3, tmp_path):
+    for i in range(3):
+        (tmp_path / f"out_{i}.png").write_bytes(b"%d" % i)
+    pipeline = handler.OutputUploadPipeline("job2")
+
+    pipeline.on_executed({"images": [
+        {"filename": "out_0.png", "subfolder": "", "type": "output"},
+        {"filename": "preview.png", "subfolder": "", "type": "temp"},
+    ]})
+    early = pipeline.submit("out_0.png", "", "output")
+
+    images = [(f"out_{i}.png", "", "output") for i in range(3)]
+    results = pipeline.results(images)
+
+    # The output announced early is not uploaded a second time
+    assert pipeline.submit("out_0.png", "", "output") is early
+    assert len(pipeline._futures) == 3
+    assert [entry["filename"] for entry, _ in results] == ["out_0.png", "out_1.png", "out_2.png"]
+    for i, (entry, error) in enumerate(results):
+        assert error is None
+        assert entry["type"] == "s3_url"
+        body = s3.get_object(Bucket=BUCKET, Key=_object_for_url(entry["data"]))["Body"].read()
+        assert body == b"%d" % i
+
+
+def test_pipeline_reports_missing_outputs(s3, monkeypatch):
+    monkeypatch.setattr(handler, "get_image_data", lambda *args: None)
+    pipeline = handler.OutputUploadPipeline("job3")
+
+    [(entry, error)] = pipeline.results([("missing.png", "", "output")])
+
+    assert entry is None
+    assert "missing.png" in error
@@ -0,0 +1,73 @@
+"""Tests for middleware latency metrics"""
+
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from middleware.metrics_middleware import (
+    LatencyHistogram,
+    MiddlewareMetrics,
+    instrument_middleware,
+)
+
+pytestmark = pytest.mark.asyncio  # Apply asyncio mark to all tests
+
+
+@web.middleware
+async def fast_middleware(request, handler):
+    return await handler(request)
+
+
+@web.middleware
+async def slow_middleware(request, handler):
+    await asyncio.sleep(0.02)
+    return await handler(request)
+
+
+async def test_records_own_time_only():
+    metrics = MiddlewareMetrics()
+    outer = instrument_middleware(fast_middleware, metrics)
+    inner = instrument_middleware(slow_middleware, metrics)
+
+    async def handler(request):
+        await asyncio.sleep(0.05)
+        return web.Response(text="ok")
+
+    async def chain(request):
+        return await inner(request, handler)
+
+    response = await outer(make_mocked_request("GET", "/api/test"), chain)
+    assert response.status == 200
+
+    stats = metrics.to_dict()
+    assert stats["fast_middleware"]["count"] == 1
+    assert stats["slow_middleware"]["count"] == 1
+    # The handler's and the inner middleware's time is not attributed to the outer one
+    assert stats["fast_middleware"]["max_ms"] < 10
+    assert 15 < stats["slow_middleware"]["max_ms"] < 45
+
+
+async def test_records_when_handler_raises():
+    metrics = MiddlewareMetrics()
+    timed = instrument_middleware(fast_middleware, metrics, name="fast")
+
+    async def handler(request):
+        raise web.HTTPNotFound()
+
+    with pytest.raises(web.HTTPNotFound):
+        await timed(make_mocked_request("GET", "/missing"), handler)
+    assert metrics.to_dict()["fast"]["count"] == 1
+
+
+async def test_histogram_quantiles():
+    histogram = LatencyHistogram()
+    for _ in range(98):
+        histogram.observe(0.03)
+    histogram.observe(0.7)
+    histogram.observe(30)
+
+    assert histogram.quantile(0.5) == 0.05
+    assert histogram.quantile(0.99) == 1
+    assert histogram.quantile(1.0) == 30
+    assert histogram.to_dict()["count"] == 100
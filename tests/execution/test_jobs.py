@@ -1,12 +1,20 @@
 """Unit tests for comfy_execution/jobs.py"""
 
+import random
+
+import pytest
+
 from comfy_execution.jobs import (
+    HistoryStore,
     JobStatus,
     is_previewable,
     normalize_queue_item,
     normalize_history_item,
     get_outputs_summary,
     apply_sorting,
+    encode_cursor,
+    get_all_jobs,
+    job_sort_key,
 )
 
 
@@ -359,3 +367,120 @@ class TestNormalizeHistoryItem:
             'prompt': {'nodes': {'1': {}}},
             'extra_data': {'create_time': 1234567890, 'client_id': 'abc'},
         }
+
+
+def make_history_item(prompt_id, create_time, status_str='success', workflow_id=None):
+    extra_data = {'create_time': create_time}
+    if workflow_id is not None:
+        extra_data['extra_pnginfo'] = {'workflow': {'id': workflow_id}}
+    return {
+        'prompt': (0, prompt_id, {}, extra_data, []),
+        'status': {'status_str': status_str, 'completed': status_str == 'success', 'messages': []},
+        'outputs': {},
+    }
+
+
+class TestHistoryStore:
+    """Unit tests for HistoryStore"""
+
+    def test_bounded_oldest_first(self):
+        """Oldest items should be evicted and removed from the indexes."""
+        store = HistoryStore(max_size=3)
+        for i in range(5):
+            store.add(f'p{i}', make_history_item(f'p{i}', i, workflow_id='w' if i == 0 else None))
+        assert list(store) == ['p2', 'p3', 'p4']
+        assert store.page(1, 1) == ['p3']
+        assert [k[1] for k in store.sorted_keys(JobStatus.ALL)] == ['p2', 'p3', 'p4']
+        assert store.sorted_keys(JobStatus.ALL, 'w') == []
+        assert 'w' not in store.sorted_by_workflow
+
+    def test_items_are_not_copied(self):
+        """Readers should get the stored item itself."""
+        item = make_history_item('p', 1)
+        store = HistoryStore()
+        store.add('p', item)
+        assert store['p'] is item
+
+    def test_remove_and_clear(self):
+        store = HistoryStore()
+        store.add('a', make_history_item('a', 1, 'error', 'w'))
+        store.add('b', make_history_item('b', 1, 'success', 'w'))
+        store.remove('a')
+        store.remove('missing')
+        assert [k[1] for k in store.sorted_keys([JobStatus.FAILED])] == []
+        assert [k[1] for k in store.sorted_keys(JobStatus.ALL, 'w')] == ['b']
+        store.clear()
+        assert len(store) == 0
+        assert store.sorted_keys(JobStatus.ALL) == []
+
+
+class TestGetAllJobs:
+    """get_all_jobs() should match filtering and sorting everything."""
+
+    @pytest.fixture
+    def data(self):
+        rng = random.Random(0)
+        history = {}
+        for i in range(200):
+            prompt_id = f'h{i:03d}'
+            history[prompt_id] = make_history_item(
+                prompt_id, rng.randrange(50), rng.choice(['success', 'error']), rng.choice(['w1', 'w2', None]))
+        queued = [(i, f'q{i}', {}, {'create_time': rng.randrange(60)}, []) for i in range(5)]
+        running = [(0, 'r0', {}, {'create_time': 55, 'extra_pnginfo': {'workflow': {'id': 'w1'}}}, [])]
+        return running, queued, history
+
+    def reference(self, running, queued, history, status_filter, workflow_id, sort_order):
+        jobs = [normalize_queue_item(i, JobStatus.IN_PROGRESS) for i in running]
+        jobs += [normalize_queue_item(i, JobStatus.PENDING) for i in queued]
+        jobs += [normalize_history_item(k, v) for k, v in history.items()]
+        jobs = [j for j in jobs if j['status'] in status_filter]
+        if workflow_id:
+            jobs = [j for j in jobs if j.get('workflow_id') == workflow_id]
+        return sorted(jobs, key=job_sort_key, reverse=sort_order == 'desc')
+
+    @pytest.mark.parametrize('status_filter', [JobStatus.ALL, [JobStatus.FAILED], [JobStatus.PENDING, JobStatus.COMPLETED]])
+    @pytest.mark.parametrize('workflow_id', [None, 'w1'])
+    @pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+    def test_matches_reference(self, data, status_filter, workflow_id, sort_order):
+        running, queued, history = data
+        store = HistoryStore.from_items(history)
+        expected = self.reference(running, queued, history, status_filter, workflow_id, sort_order)
+        for offset, limit in [(0, None), (0, 10), (7, 13), (len(expected) - 3, 10), (len(expected) + 5, 10)]:
+            jobs, total, _ = get_all_jobs(running, queued, store, status_filter, workflow_id,
+                                          sort_order=sort_order, limit=limit, offset=offset)
+            assert total == len(expected)
+            end = None if limit is None else offset + limit
+            assert jobs == expected[offset:end]
+
+    @pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+    def test_cursor_walks_all_jobs(self, data, sort_order):
+        running, queued, history = data
+        store = HistoryStore.from_items(history)
+        expected = self.reference(running, queued, history, JobStatus.ALL, None, sort_order)
+        seen = []
+        cursor = None
+        while True:
+            jobs, total, offset = get_all_jobs(running, queued, store, sort_order=sort_order, limit=17, cursor=cursor)
+            assert offset == len(seen)
+            seen += jobs
+            if offset + len(jobs) >= total:
+                break
+            cursor = encode_cursor(jobs[-1])
+        assert seen == expected
+
+    def test_accepts_plain_dict(self, data):
+        running, queued, history = data
+        jobs, total, _ = get_all_jobs(running, queued, history, limit=5)
+        assert total == len(history) + len(queued) + len(running)
+        assert len(jobs) == 5
+
+    def test_execution_duration_sort(self, data):
+        running, queued, history = data
+        jobs, total, _ = get_all_jobs(running, queued, history, sort_by='execution_duration', limit=4, offset=2)
+        assert total == len(history) + len(queued) + len(running)
+        assert len(jobs) == 4
+
+    def test_invalid_cursor(self, data):
+        running, queued, history = data
+        with pytest.raises(ValueError):
+            get_all_jobs(running, queued, history, cursor='not-a-cursor')